@@ -0,0 +1,39 @@
+"""
+Бенчмарк пакетного инференса Facenet: лиц в секунду для разных размеров пакета.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_batch_embedding --faces 256
+"""
+import argparse
+import time
+
+import numpy as np
+
+from logic.batching import embed_faces
+from logic.model_registry import get_registry
+
+BATCH_SIZES = (1, 8, 32, 64)
+
+
+def run(faces_count, batch_sizes=BATCH_SIZES):
+    registry = get_registry()
+    registry.warm_up()
+
+    rng = np.random.default_rng(0)
+    faces = [rng.random((160, 160, 3), dtype=np.float32) for _ in range(faces_count)]
+
+    results = {}
+    for batch_size in batch_sizes:
+        started = time.perf_counter()
+        embed_faces(registry.model, faces, batch_size)
+        elapsed = time.perf_counter() - started
+        results[batch_size] = faces_count / elapsed
+        print(f"batch_size={batch_size:>3}: {results[batch_size]:8.1f} лиц/сек ({elapsed:.2f} сек на {faces_count} лиц)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, default=256, help="Количество лиц в прогоне")
+    args = parser.parse_args()
+    run(args.faces)
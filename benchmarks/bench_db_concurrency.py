@@ -0,0 +1,145 @@
+"""
+Бенчмарк доступа к SQLite под конкурентной нагрузкой: get_task_with_user_check
+через новое соединение на каждый вызов (журнал отката, как было раньше) против
+пула соединений в режиме WAL.
+
+Читатели в потоках опрашивают задачи, параллельно один поток-писатель обновляет
+статусы, как это делают воркеры. Выводится число запросов в секунду и число ошибок
+"database is locked".
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_db_concurrency --readers 16 --seconds 5
+"""
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from uuid import uuid4
+
+import database.database as db
+from database.connection import ConnectionPool
+
+
+def legacy_get_task_with_user_check(path, user_key, user_id):
+    """Прежняя реализация: соединение открывается и закрывается на каждый запрос"""
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT id, status, result_path
+            FROM recognition_tasks
+            WHERE user_key = ? AND (user_id = ? OR user_id IS NULL)
+        ''', (user_key, user_id))
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def legacy_update(path, user_key, status):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('UPDATE recognition_tasks SET status = ? WHERE user_key = ?', (status, user_key))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def pooled_update(user_key, status):
+    with db.session() as conn:
+        conn.execute('UPDATE recognition_tasks SET status = ? WHERE user_key = ?', (status, user_key))
+
+
+def seed(tasks):
+    """Заполняет текущую базу задачами одного пользователя"""
+    user_id = str(uuid4())
+    keys = [str(uuid4()) for _ in range(tasks)]
+    with db.session() as conn:
+        conn.executemany(
+            'INSERT INTO recognition_tasks (id, user_key, user_id, status, created_at) VALUES (?, ?, ?, ?, ?)',
+            [(str(uuid4()), key, user_id, "queued", datetime.now()) for key in keys],
+        )
+    return user_id, keys
+
+
+def run_load(read, write, keys, user_id, readers, seconds):
+    stop = threading.Event()
+    counts = [0] * readers
+    errors = [0] * (readers + 1)
+
+    def reader(n):
+        rnd = random.Random(n)
+        while not stop.is_set():
+            try:
+                read(rnd.choice(keys), user_id)
+                counts[n] += 1
+            except sqlite3.OperationalError:
+                errors[n] += 1
+
+    def writer():
+        rnd = random.Random(-1)
+        while not stop.is_set():
+            try:
+                write(rnd.choice(keys), rnd.choice(("in_progress", "done")))
+            except sqlite3.OperationalError:
+                errors[readers] += 1
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds, sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=16, help="Количество потоков-читателей")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Длительность каждого прогона")
+    parser.add_argument("--tasks", type=int, default=1000, help="Количество задач в базе")
+    args = parser.parse_args()
+
+    # Логирование каждого запроса исказило бы замер
+    logging.getLogger(db.__name__).setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        pooled_path = os.path.join(tmp, "pooled.db")
+
+        # Схема для прежнего варианта создается без WAL: режим журнала хранится в файле базы
+        db.pool = ConnectionPool(legacy_path, size=1)
+        db.init_db()
+        user_id, keys = seed(args.tasks)
+        db.pool.close()
+        sqlite3.connect(legacy_path).execute("PRAGMA journal_mode=DELETE").fetchone()
+
+        qps, errors = run_load(
+            lambda key, user: legacy_get_task_with_user_check(legacy_path, key, user),
+            lambda key, status: legacy_update(legacy_path, key, status),
+            keys, user_id, args.readers, args.seconds,
+        )
+        print(f"Соединение на запрос (DELETE): {qps:10.0f} запросов/с, ошибок блокировки: {errors}")
+
+        db.pool = ConnectionPool(pooled_path, size=max(db.DB_POOL_SIZE, args.readers + 1))
+        db.init_db()
+        user_id, keys = seed(args.tasks)
+
+        qps_pooled, errors = run_load(
+            db.get_task_with_user_check, pooled_update,
+            keys, user_id, args.readers, args.seconds,
+        )
+        db.pool.close()
+        print(f"Пул соединений (WAL):         {qps_pooled:10.0f} запросов/с, ошибок блокировки: {errors}")
+        print(f"Ускорение: x{qps_pooled / qps:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Бенчмарк задержки выборок задач на заполненной базе (по умолчанию 1 млн задач):
+без индексов (схема версии 0) и после миграций с индексами.
+
+Замеряются запросы, которые выполняются на горячих путях приложения: /status и /download
+(get_task_with_user_check), список задач пользователя (get_user_tasks), изображения задачи
+(get_task_images) и обновление статуса (update_task_by_user_key).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_db_indexes --tasks 1000000 --queries 200
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import database.database as db
+from database.connection import ConnectionPool
+
+SEED_BATCH = 50000
+
+
+def seed(tasks, users):
+    """Заполняет базу задачами (по одному изображению на задачу), возвращает выборку ключей"""
+    rnd = random.Random(0)
+    user_ids = [str(uuid4()) for _ in range(users)]
+    started = datetime(2024, 1, 1)
+    sample = []
+
+    with db.session() as conn:
+        for offset in range(0, tasks, SEED_BATCH):
+            task_rows = []
+            image_rows = []
+            for n in range(offset, min(tasks, offset + SEED_BATCH)):
+                task_id = str(uuid4())
+                user_key = str(uuid4())
+                user_id = rnd.choice(user_ids)
+                task_rows.append((task_id, "done", started + timedelta(seconds=n), None, user_key, user_id))
+                image_rows.append((str(uuid4()), task_id, f"temp/{task_id}.jpg", None))
+                if rnd.random() < 0.001:
+                    sample.append((task_id, user_key, user_id))
+            conn.executemany('INSERT INTO recognition_tasks VALUES (?, ?, ?, ?, ?, ?)', task_rows)
+            conn.executemany('INSERT INTO task_images VALUES (?, ?, ?, ?)', image_rows)
+        conn.commit()
+    return sample
+
+
+def measure(sample, queries):
+    """Задержки запросов в миллисекундах: {название: (p50, p95)}"""
+    rnd = random.Random(1)
+    cases = {
+        "get_task_with_user_check": lambda t: db.get_task_with_user_check(t[1], t[2]),
+        "get_user_tasks": lambda t: db.get_user_tasks(t[2]),
+        "get_task_images": lambda t: db.get_task_images(t[0]),
+        "update_task_by_user_key": lambda t: db.update_task_by_user_key(t[1], "done"),
+    }
+    result = {}
+    for name, call in cases.items():
+        timings = []
+        for _ in range(queries):
+            task = rnd.choice(sample)
+            started = time.perf_counter()
+            call(task)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        result[name] = (statistics.median(timings), timings[int(len(timings) * 0.95) - 1])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000000, help="Количество задач в базе")
+    parser.add_argument("--users", type=int, default=10000, help="Количество пользователей")
+    parser.add_argument("--queries", type=int, default=200, help="Количество запросов каждого вида")
+    args = parser.parse_args()
+
+    logging.getLogger(db.__name__).setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.pool = ConnectionPool(os.path.join(tmp, "bench.db"), size=2)
+
+        # Базовая схема без миграций
+        migrations = db.MIGRATIONS
+        db.MIGRATIONS = []
+        db.init_db()
+        db.MIGRATIONS = migrations
+
+        started = time.perf_counter()
+        sample = seed(args.tasks, args.users)
+        print(f"Заполнено {args.tasks} задач за {time.perf_counter() - started:.1f} с")
+
+        without_indexes = measure(sample, args.queries)
+
+        started = time.perf_counter()
+        with db.session() as conn:
+            db.apply_migrations(conn)
+            version = db.get_schema_version(conn.cursor())
+        print(f"Миграции до версии {version} применены за {time.perf_counter() - started:.1f} с")
+
+        with_indexes = measure(sample, args.queries)
+        db.pool.close()
+
+    print(f"\n{'Запрос':<28}{'без индексов p50/p95, мс':>28}{'с индексами p50/p95, мс':>28}")
+    for name in without_indexes:
+        before = without_indexes[name]
+        after = with_indexes[name]
+        print(f"{name:<28}{before[0]:>14.3f} / {before[1]:<11.3f}{after[0]:>14.3f} / {after[1]:<11.3f}")
+
+
+if __name__ == "__main__":
+    main()
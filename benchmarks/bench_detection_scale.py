@@ -0,0 +1,75 @@
+"""
+Бенчмарк разрешения детекции: кадров в секунду и полнота (recall) найденных лиц при детекции
+на уменьшенном кадре с уточнением лиц в исходном разрешении, для нескольких масштабов и auto.
+Время детекции на уменьшенном кадре и время повторных детекций в исходном разрешении (по одному
+вызову RetinaFace на уточняемое лицо) выводятся отдельно для каждого режима уточнения.
+
+Эталонная разметка - файл --labels (JSON {номер кадра: [[x, y, w, h], ...]}), без него эталоном
+считается детекция в исходном разрешении. Лицо найдено, если IoU с рамкой разметки не меньше 0.5.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_detection_scale --video clip_4k.mp4 --scales 1,0.5,0.25,auto --min-face 64 \
+        --refine auto,always,never
+"""
+import argparse
+import json
+import time
+
+from benchmarks.bench_detector_cascade import count_matches, load_frames
+from logic.detection_scale import REFINE_MODES, ScaledDetector
+from logic.face_recognition_logic import FaceRecognitionLogic
+
+
+def run(video_path, labels_path, stride, max_frames, scales, min_face, refine_modes=("auto",)):
+    frames = load_frames(video_path, stride, max_frames)
+    if not frames:
+        print("В видео нет кадров")
+        return
+    height, width = frames[0][1].shape[:2]
+    print(f"Кадров выборки: {len(frames)}, разрешение {width}x{height}")
+    recognizer = FaceRecognitionLogic(embedding_cache=False)
+
+    labels = None
+    if labels_path:
+        with open(labels_path, encoding="utf-8") as f:
+            labels = {int(frame): boxes for frame, boxes in json.load(f).items()}
+
+    for scale in scales:
+        for refine in refine_modes:
+            detector = ScaledDetector(recognizer._detect_faces, scale, min_face, refine)
+            started = time.perf_counter()
+            found = [[box for _, box in detector(frame)] for _, frame in frames]
+            elapsed = time.perf_counter() - started
+
+            if labels is None and detector.scale >= 1.0:
+                labels = {frame_number: boxes for (frame_number, _), boxes in zip(frames, found)}
+            expected = [labels.get(frame_number, []) for frame_number, _ in frames] if labels is not None else None
+            total = sum(len(boxes) for boxes in expected) if expected else 0
+            matched = sum(count_matches(e, f) for e, f in zip(expected, found)) if expected else 0
+            recall = f"{matched / total:.3f}" if total else "н/д"
+            detect_size = f"{int(width * detector.scale)}x{int(height * detector.scale)}"
+            line = f"масштаб {scale:<5} ({detect_size:>9}): {len(frames) / elapsed:7.2f} кадров/сек, " \
+                   f"recall {recall} ({matched}/{total})"
+            if detector.scale < 1.0:
+                refines = detector.faces_refined + detector.faces_unaligned
+                line += f", уточнение {refine:<6}: детекция {detector.detect_seconds:.2f} с, " \
+                        f"уточнение {detector.refine_seconds:.2f} с ({refines} вызовов), " \
+                        f"лиц с первого прохода {detector.faces_reused}, без выравнивания {detector.faces_unaligned}"
+            print(line)
+            if detector.scale >= 1.0:
+                break  # В исходном разрешении уточнения нет, режимы не отличаются
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", required=True, help="Локальный ролик (лучше 1080p или 4K)")
+    parser.add_argument("--labels", help="Разметка лиц JSON; по умолчанию эталон - детекция в исходном разрешении")
+    parser.add_argument("--stride", type=int, default=5, help="Шаг выборки кадров")
+    parser.add_argument("--max-frames", type=int, default=100, help="Сколько кадров выборки декодировать")
+    parser.add_argument("--scales", default="1,0.75,0.5,0.33,0.25,auto", help="Масштабы через запятую")
+    parser.add_argument("--min-face", type=int, default=48, help="Самое маленькое нужное лицо для auto, пикселей")
+    parser.add_argument("--refine", default="auto,always,never",
+                        help=f"Режимы повторной детекции в исходном разрешении через запятую ({', '.join(REFINE_MODES)})")
+    args = parser.parse_args()
+    run(args.video, args.labels, args.stride, args.max_frames, args.scales.split(","), args.min_face,
+        args.refine.split(","))
@@ -0,0 +1,96 @@
+"""
+Бенчмарк каскада детекторов: кадров в секунду и полнота (recall) найденных лиц для предфильтров
+haar, ssd и yunet в режимах frame и roi по сравнению с одним RetinaFace.
+
+Кадры выборки декодируются заранее, замеряется только детекция. Эталонная разметка - файл
+--labels (JSON {номер кадра: [[x, y, w, h], ...]}), без него эталоном считается результат RetinaFace.
+Лицо найдено, если IoU с рамкой разметки не меньше 0.5.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_detector_cascade --video clip.mp4 --labels clip_labels.json --stride 5
+"""
+import argparse
+import json
+import time
+
+import cv2
+
+from logic.detector_cascade import DetectorCascade
+from logic.face_recognition_logic import FaceRecognitionLogic
+from logic.face_tracking import box_iou
+from logic.frame_sampling import FrameSampler
+
+MATCH_IOU = 0.5
+DEFAULT_CONFIGS = "none,haar/frame,haar/roi,ssd/frame,ssd/roi,yunet/frame,yunet/roi"
+
+
+def load_frames(video_path, stride, max_frames):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    for frame_number, _, frame in FrameSampler(stride=stride).frames(cap):
+        frames.append((frame_number, frame))
+        if len(frames) >= max_frames:
+            break
+    cap.release()
+    return frames
+
+
+def count_matches(expected, found):
+    """Количество рамок разметки, которым жадно сопоставлена найденная рамка с IoU >= MATCH_IOU"""
+    used = set()
+    matched = 0
+    for box in expected:
+        best, best_iou = None, MATCH_IOU
+        for i, other in enumerate(found):
+            iou = box_iou(box, other)
+            if i not in used and iou >= best_iou:
+                best, best_iou = i, iou
+        if best is not None:
+            used.add(best)
+            matched += 1
+    return matched
+
+
+def run(video_path, labels_path, stride, max_frames, configs):
+    frames = load_frames(video_path, stride, max_frames)
+    recognizer = FaceRecognitionLogic(embedding_cache=False)
+    print(f"Кадров выборки: {len(frames)}")
+
+    labels = None
+    if labels_path:
+        with open(labels_path, encoding="utf-8") as f:
+            labels = {int(frame): boxes for frame, boxes in json.load(f).items()}
+
+    results = {}
+    for config in configs:
+        backend, _, mode = config.partition("/")
+        try:
+            detect = recognizer._detect_faces if backend == "none" else \
+                DetectorCascade(recognizer._detect_faces, backend, mode or "frame")
+        except ValueError as e:
+            print(f"{config:<12}: пропущен ({e})")
+            continue
+
+        started = time.perf_counter()
+        results[config] = [[box for _, box in detect(frame)] for _, frame in frames]
+        elapsed = time.perf_counter() - started
+
+        if labels is None and config == "none":
+            labels = {frame_number: boxes for (frame_number, _), boxes in zip(frames, results[config])}
+        expected = [labels.get(frame_number, []) for frame_number, _ in frames] if labels is not None else None
+        total = sum(len(boxes) for boxes in expected) if expected else 0
+        matched = sum(count_matches(e, f) for e, f in zip(expected, results[config])) if expected else 0
+        recall = f"{matched / total:.3f}" if total else "н/д"
+        skipped = f", без RetinaFace: {detect.frames_skipped} кадров" if isinstance(detect, DetectorCascade) else ""
+        print(f"{config:<12}: {len(frames) / elapsed:7.2f} кадров/сек, recall {recall} ({matched}/{total}){skipped}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", required=True, help="Размеченный локальный ролик")
+    parser.add_argument("--labels", help="Разметка лиц JSON; по умолчанию эталон - RetinaFace")
+    parser.add_argument("--stride", type=int, default=5, help="Шаг выборки кадров")
+    parser.add_argument("--max-frames", type=int, default=200, help="Сколько кадров выборки декодировать")
+    parser.add_argument("--configs", default=DEFAULT_CONFIGS, help="Варианты предфильтр/режим через запятую")
+    args = parser.parse_args()
+    run(args.video, args.labels, args.stride, args.max_frames, args.configs.split(","))
@@ -0,0 +1,76 @@
+"""
+Бенчмарк выборки кадров: чтение всех кадров через cap.read() против пропуска через cap.grab()
+и позиционирования на синтетическом видео.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_frame_sampling --frames 1500 --stride 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from logic.frame_sampling import FrameSampler
+
+
+def make_synthetic_video(path, frames, size=(1280, 720), fps=25):
+    """Создает видео со случайным шумом и движущимся прямоугольником"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    rng = np.random.default_rng(0)
+    for i in range(frames):
+        frame = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+        x = (i * 7) % (size[0] - 100)
+        frame[100:200, x:x + 100] = 255
+        writer.write(frame)
+    writer.release()
+
+
+def read_everything(path, stride):
+    """Исходный способ: декодируем каждый кадр и отбрасываем лишние"""
+    cap = cv2.VideoCapture(path)
+    counter = 0
+    sampled = 0
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        counter += 1
+        if counter % stride == 0:
+            sampled += 1
+    cap.release()
+    return sampled
+
+
+def sample(path, sampler):
+    cap = cv2.VideoCapture(path)
+    sampled = sum(1 for _ in sampler.frames(cap))
+    cap.release()
+    return sampled
+
+
+def run(frames, stride):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.mp4")
+        make_synthetic_video(path, frames)
+
+        variants = [
+            ("read() всех кадров", lambda: read_everything(path, stride)),
+            ("grab() + retrieve()", lambda: sample(path, FrameSampler(stride=stride))),
+            ("позиционирование", lambda: sample(path, FrameSampler(stride=stride, seek=True))),
+        ]
+        for title, func in variants:
+            started = time.perf_counter()
+            sampled = func()
+            elapsed = time.perf_counter() - started
+            print(f"{title:<22}: {elapsed:6.2f} сек, выбрано кадров: {sampled}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=1500, help="Длина синтетического видео в кадрах")
+    parser.add_argument("--stride", type=int, default=5, help="Шаг выборки кадров")
+    args = parser.parse_args()
+    run(args.frames, args.stride)
@@ -0,0 +1,84 @@
+"""
+Бенчмарк индексов эталонов: полнота (recall@1 относительно точного поиска) против задержки
+поиска для галерей из 1k, 10k и 100k эталонов.
+
+Эмбеддинги синтетические: эталоны сгруппированы вокруг случайных центров, запросы - зашумленные
+эталоны, как лица из видео. HNSW замеряется, только если установлен hnswlib.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_gallery_index --sizes 1000 10000 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from logic.gallery_index import ExactIndex, HnswIndex, IvfIndex, hnswlib, normalize
+
+
+def make_gallery(size, dim, rng):
+    centers = normalize(rng.standard_normal((max(1, size // 50), dim)))
+    gallery = centers[rng.integers(0, len(centers), size)] + 1.0 * rng.standard_normal((size, dim)) / np.sqrt(dim)
+    return normalize(gallery)
+
+
+def make_queries(gallery, count, rng):
+    dim = gallery.shape[1]
+    picked = rng.integers(0, len(gallery), count)
+    return normalize(gallery[picked] + 0.5 * rng.standard_normal((count, dim)) / np.sqrt(dim))
+
+
+def measure(index, queries, batch_size):
+    """Средняя задержка на пакет (мс) и найденные ID"""
+    found = []
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch_size):
+        ids, _ = index.search(queries[start:start + batch_size])
+        found.extend(ids)
+    batches = (len(queries) + batch_size - 1) // batch_size
+    return (time.perf_counter() - started) * 1000 / batches, found
+
+
+def build(factory, ids, gallery):
+    started = time.perf_counter()
+    index = factory()
+    index.add(ids, gallery)
+    return index, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Размеры галерей")
+    parser.add_argument("--dim", type=int, default=128, help="Размерность эмбеддингов (Facenet - 128)")
+    parser.add_argument("--queries", type=int, default=2000, help="Количество запросов")
+    parser.add_argument("--batch-size", type=int, default=32, help="Запросов в одном вызове search (пакет лиц)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        gallery = make_gallery(size, args.dim, rng)
+        queries = make_queries(gallery, args.queries, rng)
+        ids = [f"id_{i}" for i in range(size)]
+
+        candidates = [("exact", lambda: ExactIndex(args.dim))]
+        for nprobe in (4, 8, 16, 32):
+            candidates.append((f"ivf nprobe={nprobe}",
+                               lambda nprobe=nprobe: IvfIndex(args.dim, nprobe=nprobe, train_size=size)))
+        if hnswlib is not None:
+            for ef in (32, 64, 128):
+                candidates.append((f"hnsw ef={ef}", lambda ef=ef: HnswIndex(args.dim, ef=ef)))
+
+        print(f"\nГалерея {size} эталонов, {args.queries} запросов пакетами по {args.batch_size}")
+        print(f"{'Индекс':<18}{'построение, с':>15}{'мс на пакет':>14}{'recall@1':>10}")
+        truth = None
+        for name, factory in candidates:
+            index, build_seconds = build(factory, ids, gallery)
+            latency, found = measure(index, queries, args.batch_size)
+            if truth is None:
+                truth = found
+            recall = np.mean([a == b for a, b in zip(found, truth)])
+            print(f"{name:<18}{build_seconds:>15.2f}{latency:>14.3f}{recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
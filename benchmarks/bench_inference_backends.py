@@ -0,0 +1,135 @@
+"""
+Бенчмарк бэкендов инференса Facenet на CPU: эмбеддингов в секунду, время загрузки и пиковая
+память процесса (RSS) для Keras (tf) и ONNX Runtime в точности fp32, fp16 и int8.
+
+Каждый вариант запускается в отдельном процессе, поэтому RSS не смешивается между вариантами;
+детектор в процессах не загружается, память и время относятся только к модели эмбеддингов.
+Модели ONNX, которых еще нет, предварительно экспортируются (нужны tf2onnx, onnxconverter-common
+и onnxruntime).
+
+С --faces-dir (каталог с фотографиями лиц) дополнительно проверяется точность относительно tf:
+косинусное сходство эмбеддингов каждого лица с эмбеддингом tf и доля пар лиц, для которых
+решение "тот же человек" при пороге --threshold совпадает с решением на эмбеддингах tf.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_inference_backends --faces-dir faces/ --configs tf,onnx/fp32,onnx/int8 --threads 4
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+
+import numpy as np
+
+from logic.batching import FACE_SIZE, embed_faces, prepare_face
+from logic.inference_backends import OnnxEmbedder, load_onnx_embedder, onnx_model_path
+
+DEFAULT_CONFIGS = "tf,onnx/fp32,onnx/fp16,onnx/int8"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_face_set(faces_dir):
+    """Выровненные лица из фотографий каталога (детекция RetinaFace, как для эталонов)"""
+    from logic.face_recognition_logic import FaceRecognitionLogic
+
+    recognizer = FaceRecognitionLogic(embedding_cache=False, inference_backend="tf")
+    faces = []
+    for root, _, files in os.walk(faces_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                try:
+                    faces.append(prepare_face(recognizer._detect_reference_face(f.read(), path)))
+                except ValueError as e:
+                    print(f"Пропущено: {e}")
+    return faces
+
+
+def measure(config, model_name, faces_count, face_set, batch_size, threads):
+    """
+    Выполняется в отдельном процессе: загрузка модели, замер пропускной способности и эмбеддинги
+    набора лиц. TensorFlow импортируется только для варианта tf. Случайные лица для замера
+    создаются здесь же, чтобы их передача между процессами не попадала в RSS.
+    """
+    rng = np.random.default_rng(0)
+    faces = [rng.random((*FACE_SIZE, 3), dtype=np.float32) for _ in range(faces_count)]
+    backend, _, precision = config.partition("/")
+    started = time.perf_counter()
+    if backend == "onnx":
+        model = OnnxEmbedder(onnx_model_path(model_name, precision or "fp32"), intra_op_threads=threads)
+    else:
+        import tensorflow as tf
+        from deepface.DeepFace import build_model
+
+        if threads:
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+        model = build_model(model_name)
+    model.predict(np.zeros((1, *FACE_SIZE, 3), dtype=np.float32))
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    embed_faces(model, faces, batch_size)
+    elapsed = time.perf_counter() - started
+
+    embeddings = embed_faces(model, face_set, batch_size) if face_set else None
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss в Linux - в КБ
+    return load_seconds, len(faces) / elapsed, rss_mb, embeddings
+
+
+def normalize(embeddings):
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def compare(reference, embeddings, threshold):
+    """(средний и минимальный косинус с эталонными эмбеддингами, доля пар с тем же решением)"""
+    reference, embeddings = normalize(reference), normalize(embeddings)
+    cosine = np.sum(reference * embeddings, axis=1)
+    pairs = np.triu_indices(len(reference), k=1)
+    same_reference = (reference @ reference.T)[pairs] > threshold
+    same = (embeddings @ embeddings.T)[pairs] > threshold
+    agreement = float(np.mean(same == same_reference)) if len(same) else 1.0
+    return float(cosine.mean()), float(cosine.min()), agreement
+
+
+def run(configs, faces_dir, faces_count, batch_size, threads, threshold):
+    face_set = load_face_set(faces_dir) if faces_dir else []
+    if faces_dir:
+        print(f"Лиц в наборе для проверки точности: {len(face_set)}")
+
+    # Экспорт недостающих моделей ONNX выполняется до замеров, в основном процессе
+    from logic.model_registry import MODEL_NAME, get_registry
+
+    for config in configs:
+        backend, _, precision = config.partition("/")
+        if backend == "onnx":
+            load_onnx_embedder(MODEL_NAME, precision or "fp32", build_keras_model=lambda: get_registry("tf").model)
+
+    context = multiprocessing.get_context("spawn")
+    reference = None
+    print(f"{'вариант':<10} | {'загрузка, сек':>13} | {'эмб./сек':>9} | {'RSS, МБ':>8} | косинус с tf (средн./мин.) | решения как у tf")
+    for config in configs:
+        with context.Pool(1) as pool:
+            load_seconds, per_second, rss_mb, embeddings = pool.apply(
+                measure, (config, MODEL_NAME, faces_count, face_set, batch_size, threads))
+        if config == "tf":
+            reference = embeddings
+        accuracy = "н/д"
+        if embeddings is not None and reference is not None:
+            mean_cosine, min_cosine, agreement = compare(reference, embeddings, threshold)
+            accuracy = f"{mean_cosine:.5f} / {min_cosine:.5f} | {agreement * 100:.2f}%"
+        print(f"{config:<10} | {load_seconds:>13.2f} | {per_second:>9.1f} | {rss_mb:>8.0f} | {accuracy}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", default=DEFAULT_CONFIGS, help="Варианты бэкенд/точность через запятую (tf первым)")
+    parser.add_argument("--faces-dir", help="Локальный набор фотографий лиц для проверки точности")
+    parser.add_argument("--faces", type=int, default=512, help="Количество лиц в замере пропускной способности")
+    parser.add_argument("--batch-size", type=int, default=32, help="Размер пакета")
+    parser.add_argument("--threads", type=int, default=0, help="Потоков внутри оператора (0 - по количеству ядер)")
+    parser.add_argument("--threshold", type=float, default=0.6, help="Порог сходства для решения о совпадении")
+    args = parser.parse_args()
+    run(args.configs.split(","), args.faces_dir, args.faces, args.batch_size, args.threads, args.threshold)
@@ -0,0 +1,126 @@
+"""
+Бенчмарк запуска веб-процесса: время импорта main со сводкой python -X importtime по пакетам,
+время от запуска uvicorn до первого HTTP-ответа и RSS веб-процесса.
+
+Веб-процесс не должен импортировать модули распознавания: если среди импортов main есть
+пакеты из HEAVY_MODULES (или импорт дольше --max-import-ms), бенчмарк завершается с кодом 1,
+поэтому его можно запускать как проверку при изменениях.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_startup --path /login --top 15
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+HEAVY_MODULES = ("tensorflow", "keras", "deepface", "retinaface", "cv2", "onnxruntime")
+RESPONSE_TIMEOUT = 120.0
+
+
+def import_times(env):
+    """[(модуль, собственное время мкс, накопленное время мкс)] из вывода python -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr[-3000:])
+        raise SystemExit("Не удалось импортировать main")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid):
+    """Текущий RSS процесса из /proc (Linux); None, если недоступен"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def first_response(env, path):
+    """(секунд до первого ответа, HTTP-статус, RSS веб-процесса в МБ)"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{path}"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < RESPONSE_TIMEOUT:
+            if process.poll() is not None:
+                raise SystemExit(f"uvicorn завершился с кодом {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    status = response.status
+                break
+            except urllib.error.HTTPError as e:
+                status = e.code  # Ответ с ошибкой - тоже ответ, сервер уже принимает запросы
+                break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.05)
+        else:
+            raise SystemExit(f"Нет ответа от {url} за {RESPONSE_TIMEOUT:.0f} сек")
+        return time.perf_counter() - started, status, rss_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(path, top, embedded_workers, max_import_ms):
+    env = dict(os.environ, EMBEDDED_WORKERS="1" if embedded_workers else "0")
+
+    modules = import_times(env)
+    total_ms = next((cumulative for name, _, cumulative in modules if name == "main"), 0) / 1000
+    by_package = defaultdict(int)
+    for name, self_us, _ in modules:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"Импорт main: {total_ms:.1f} мс, модулей: {len(modules)}")
+    print("Самые долгие пакеты (собственное время модулей пакета):")
+    for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {package:<24} {self_us / 1000:8.1f} мс")
+
+    heavy = sorted({name.split(".")[0] for name, _, _ in modules} & set(HEAVY_MODULES))
+    seconds, status, rss = first_response(env, path)
+    rss_text = f"{rss:.0f} МБ" if rss is not None else "н/д"
+    print(f"Первый ответ {path}: {seconds:.2f} сек (HTTP {status}), RSS веб-процесса: {rss_text}")
+
+    failed = False
+    if heavy:
+        print(f"ОШИБКА: веб-процесс импортирует модули распознавания: {', '.join(heavy)}")
+        failed = True
+    if max_import_ms and total_ms > max_import_ms:
+        print(f"ОШИБКА: импорт main дольше {max_import_ms} мс")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="/login", help="Страница для замера первого ответа")
+    parser.add_argument("--top", type=int, default=15, help="Сколько пакетов показать в сводке импорта")
+    parser.add_argument("--embedded-workers", action="store_true",
+                        help="Запускать пул воркеров вместе с приложением (EMBEDDED_WORKERS=1)")
+    parser.add_argument("--max-import-ms", type=float, default=0, help="Допустимое время импорта main, 0 - без ограничения")
+    args = parser.parse_args()
+    run(args.path, args.top, args.embedded_workers, args.max_import_ms)
@@ -0,0 +1,119 @@
+"""
+Нагрузочный тест /status/{task_id}: много одновременных клиентов опрашивают статус задачи,
+выводятся задержки p50/p95/p99 и число запросов в секунду.
+
+По умолчанию поднимает приложение через uvicorn на свободном порту (без встроенных воркеров,
+задача остается в очереди), регистрирует пользователя и создает задачу через /recognize/.
+Для сравнения с другой версией кода достаточно запустить тест на ней же.
+
+Запуск из корня проекта (нужен httpx):
+    python -m benchmarks.bench_status_load --clients 200 --seconds 20
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port):
+    env = dict(os.environ, EMBEDDED_WORKERS="0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/login", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Сервер не запустился за 60 секунд")
+
+
+async def create_task(client):
+    """Регистрирует пользователя и создает задачу, возвращает ее ключ"""
+    name = f"bench_{uuid.uuid4().hex[:8]}"
+    await client.post("/register", data={
+        "username": name, "email": f"{name}@example.com",
+        "password": "bench", "confirm_password": "bench",
+    })
+    response = await client.post("/recognize/", files=[
+        ("video", ("bench.mp4", b"\0" * 1024, "video/mp4")),
+        ("images", ("face.jpg", b"\0" * 1024, "image/jpeg")),
+    ])
+    return parse_qs(urlparse(response.headers["location"]).query)["task_id"][0]
+
+
+async def poll(client, task_id, deadline, timings, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(f"/status/{task_id}")
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        timings.append((time.perf_counter() - started) * 1000)
+
+
+async def run(base_url, clients, seconds):
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        task_id = await create_task(client)
+
+        timings = []
+        errors = []
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(poll(client, task_id, deadline, timings, errors) for _ in range(clients)))
+
+    timings.sort()
+    quantile = lambda q: timings[min(len(timings) - 1, int(len(timings) * q))]
+    print(f"Клиентов: {clients}, длительность: {seconds} с")
+    print(f"Запросов: {len(timings)} ({len(timings) / seconds:.0f} в секунду), ошибок: {len(errors)}")
+    if timings:
+        print(f"Задержка, мс: p50 {statistics.median(timings):.1f}, p95 {quantile(0.95):.1f}, "
+              f"p99 {quantile(0.99):.1f}, max {timings[-1]:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200, help="Количество одновременных клиентов")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Длительность нагрузки")
+    parser.add_argument("--url", help="Адрес уже запущенного приложения (иначе запускается uvicorn)")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        port = free_port()
+        server = start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        asyncio.run(run(base_url, args.clients, args.seconds))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Бенчмарк масштабирования распознавания одного видео по отрезкам: видео делится на столько
+отрезков, сколько процессов, каждый процесс с прогретыми моделями обрабатывает свой отрезок.
+Время прогрева моделей в замер не входит, как и у постоянно запущенных воркеров.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_video_segments --video long.mp4 --reference face.jpg --processes 1,2,4,8
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmarks.bench_frame_sampling import make_synthetic_video
+from logic.batching import FACE_SIZE, embed_faces, prepare_face
+from logic.face_recognition_logic import FaceRecognitionLogic
+from logic.frame_sampling import FrameSampler
+from logic.model_registry import get_registry
+from logic.result_writer import StreamingResultLog
+from logic.video_segments import SEGMENT_TRACK_IDS, plan_segments
+
+
+def warm_up():
+    get_registry().warm_up()
+
+
+def recognize_segment(video_path, reference_path, segment, start_frame, end_frame, stride, output_dir):
+    """Обработка одного отрезка в процессе пула; возвращает (кадров пройдено, совпадений)"""
+    recognizer = FaceRecognitionLogic(embedding_cache=False)
+    if reference_path:
+        recognizer.add_target_image(reference_path, "reference", "Эталон")
+    else:
+        # Без эталона ищем лицо из шума: совпадений не будет, но детекция и инференс выполняются полностью
+        face = prepare_face(np.random.default_rng(0).random((*FACE_SIZE, 3)))
+        recognizer.add_target_embeddings([{"id": "reference", "name": "Эталон"}], embed_faces(recognizer.model, [face]))
+
+    sampler = FrameSampler(stride=stride, start_frame=start_frame, end_frame=end_frame)
+    with StreamingResultLog(os.path.join(output_dir, f"part{segment}.txt")) as result_log:
+        recognizer.recognize_in_video(video_path, sampler, result_log, summary=False,
+                                      first_track_id=segment * SEGMENT_TRACK_IDS + 1)
+        return sampler.frames_seen - start_frame, result_log.lines_written
+
+
+def run(video_path, reference_path, processes, stride):
+    context = multiprocessing.get_context("spawn")
+    baseline = None
+    print(f"{'процессов':>9} | {'отрезков':>8} | {'время, сек':>10} | {'кадров/сек':>10} | {'ускорение':>9} | совпадений")
+    for count in processes:
+        segments = plan_segments(video_path, count, min_seconds=0) or [(0, None)]
+        with ProcessPoolExecutor(max_workers=count, mp_context=context, initializer=warm_up) as executor, \
+                tempfile.TemporaryDirectory() as output_dir:
+            # Дожидаемся запуска и прогрева всех процессов пула
+            list(executor.map(time.sleep, [0.5] * count))
+
+            started = time.perf_counter()
+            futures = [
+                executor.submit(recognize_segment, video_path, reference_path, i, start, end, stride, output_dir)
+                for i, (start, end) in enumerate(segments)
+            ]
+            results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - started
+
+        frames = sum(frames for frames, _ in results)
+        matches = sum(lines for _, lines in results)
+        baseline = baseline or elapsed
+        print(f"{count:>9} | {len(segments):>8} | {elapsed:>10.2f} | {frames / elapsed:>10.1f} | "
+              f"{baseline / elapsed:>8.2f}x | {matches}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Видео для распознавания, по умолчанию синтетическое")
+    parser.add_argument("--reference", help="Эталонное изображение, по умолчанию случайный эмбеддинг")
+    parser.add_argument("--processes", default="1,2,4,8", help="Количество процессов через запятую")
+    parser.add_argument("--stride", type=int, default=5, help="Шаг выборки кадров")
+    parser.add_argument("--frames", type=int, default=3000, help="Длина синтетического видео в кадрах")
+    args = parser.parse_args()
+
+    counts = [int(value) for value in args.processes.split(",")]
+    if args.video:
+        run(args.video, args.reference, counts, args.stride)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "synthetic.mp4")
+            make_synthetic_video(path, args.frames)
+            run(path, args.reference, counts, args.stride)
@@ -0,0 +1,71 @@
+"""
+Асинхронный доступ к базе для обработчиков FastAPI.
+
+Функции повторяют database.database, но выполняются в отдельном ограниченном пуле потоков,
+поэтому медленный запрос не блокирует цикл событий и остальных клиентов. Размер пула
+по умолчанию равен размеру пула соединений: каждый поток получает соединение без ожидания.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from database import database as db
+
+DB_EXECUTOR_THREADS = int(os.environ.get("DB_EXECUTOR_THREADS", db.DB_POOL_SIZE))
+
+executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_THREADS, thread_name_prefix="db")
+
+
+async def run(func, *args, **kwargs):
+    """Выполняет блокирующую функцию базы в пуле потоков базы"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def _async(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+
+register_user = _async(db.register_user)
+authenticate_user = _async(db.authenticate_user)
+get_user_by_id = _async(db.get_user_by_id)
+add_task = _async(db.add_task)
+get_user_tasks = _async(db.get_user_tasks)
+add_task_image = _async(db.add_task_image)
+submit_task = _async(db.submit_task)
+get_task_images = _async(db.get_task_images)
+update_task_by_user_key = _async(db.update_task_by_user_key)
+update_task = _async(db.update_task)
+get_task = _async(db.get_task)
+get_task_by_id = _async(db.get_task_by_id)
+get_task_by_id_with_user_check = _async(db.get_task_by_id_with_user_check)
+get_task_with_user_check = _async(db.get_task_with_user_check)
+get_cached_embedding = _async(db.get_cached_embedding)
+put_cached_embedding = _async(db.put_cached_embedding)
+count_cached_embeddings = _async(db.count_cached_embeddings)
+enqueue_job = _async(db.enqueue_job)
+claim_job = _async(db.claim_job)
+heartbeat_job = _async(db.heartbeat_job)
+finish_job = _async(db.finish_job)
+fail_exhausted_jobs = _async(db.fail_exhausted_jobs)
+count_jobs = _async(db.count_jobs)
+save_worker_metrics = _async(db.save_worker_metrics)
+get_worker_metrics = _async(db.get_worker_metrics)
+save_task_progress = _async(db.save_task_progress)
+get_task_state = _async(db.get_task_state)
+create_upload = _async(db.create_upload)
+get_upload = _async(db.get_upload)
+update_upload_received = _async(db.update_upload_received)
+delete_upload = _async(db.delete_upload)
+delete_expired_uploads = _async(db.delete_expired_uploads)
+create_gallery = _async(db.create_gallery)
+get_user_galleries = _async(db.get_user_galleries)
+get_gallery = _async(db.get_gallery)
+delete_gallery = _async(db.delete_gallery)
+add_gallery_items = _async(db.add_gallery_items)
+get_gallery_items = _async(db.get_gallery_items)
+delete_gallery_item = _async(db.delete_gallery_item)
@@ -1,13 +1,17 @@
 from uuid import uuid4
 from datetime import datetime
-import sqlite3
 import json
 import hashlib
 import os
+import time
 
 
+from database.connection import ConnectionPool
+
 # Путь к базе данных
-DB_PATH = "database/recognition.db"
+DB_PATH = os.environ.get("DB_PATH", "database/recognition.db")
+LOG_FILE = os.environ.get("LOG_FILE", "server.log")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
 
 import logging
 # Настройка логгера
@@ -15,54 +19,241 @@ logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
     handlers=[
-        logging.FileHandler("server.log", encoding="utf-8"),
+        logging.FileHandler(LOG_FILE, encoding="utf-8"),
         logging.StreamHandler()  # Также выводим в консоль
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Общий пул соединений процесса
+pool = ConnectionPool(DB_PATH, size=DB_POOL_SIZE)
+
+def session():
+    """Сессия работы с базой из пула соединений (контекстный менеджер)."""
+    return pool.session()
+
+# Версионированные миграции схемы: (версия, описание, выражения).
+# Примененная версия хранится в PRAGMA user_version; новые миграции добавляются в конец списка.
+MIGRATIONS = [
+    (1, "индексы для выборок задач и изображений", [
+        'CREATE INDEX IF NOT EXISTS idx_recognition_tasks_user_key ON recognition_tasks (user_key)',
+        'CREATE INDEX IF NOT EXISTS idx_recognition_tasks_user_created ON recognition_tasks (user_id, created_at DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_task_images_task_id ON task_images (task_id)',
+    ]),
+    (2, "возобновляемые загрузки видео", [
+        '''
+        CREATE TABLE IF NOT EXISTS uploads (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            filename TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            received INTEGER NOT NULL DEFAULT 0,
+            sha256 TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        ''',
+    ]),
+    (3, "кэш результатов распознавания целых видео", [
+        '''
+        CREATE TABLE IF NOT EXISTS result_cache (
+            cache_key TEXT PRIMARY KEY,
+            result_path TEXT NOT NULL,
+            detections_path TEXT,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_result_cache_last_used ON result_cache (last_used_at)',
+    ]),
+    (4, "индексы лиц обработанных видео", [
+        '''
+        CREATE TABLE IF NOT EXISTS video_indexes (
+            index_key TEXT PRIMARY KEY,
+            video_sha256 TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            path TEXT NOT NULL,
+            embeddings INTEGER NOT NULL,
+            detections INTEGER NOT NULL,
+            dim INTEGER NOT NULL,
+            frames_seen INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        )
+        ''',
+    ]),
+    (5, "именованные галереи эталонных лиц пользователей", [
+        '''
+        CREATE TABLE IF NOT EXISTS galleries (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            UNIQUE (user_id, name),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS gallery_items (
+            id TEXT PRIMARY KEY,
+            gallery_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            embedding BLOB,
+            model_key TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            FOREIGN KEY (gallery_id) REFERENCES galleries (id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_gallery_items_gallery ON gallery_items (gallery_id, status)',
+    ]),
+    (6, "отрезки видео, обрабатываемые параллельно", [
+        '''
+        CREATE TABLE IF NOT EXISTS task_segments (
+            task_key TEXT NOT NULL,
+            segment INTEGER NOT NULL,
+            start_frame INTEGER NOT NULL,
+            end_frame INTEGER,
+            status TEXT NOT NULL,
+            frames_processed INTEGER NOT NULL DEFAULT 0,
+            total_frames INTEGER NOT NULL DEFAULT 0,
+            detections INTEGER NOT NULL DEFAULT 0,
+            eta_seconds REAL,
+            frames_seen INTEGER,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (task_key, segment)
+        )
+        ''',
+    ]),
+    (7, "кадры отрезков, отсеянные без детекции", [
+        'ALTER TABLE task_segments ADD COLUMN frames_gated INTEGER NOT NULL DEFAULT 0',
+    ]),
+    # Таблицы ниже раньше создавались в init_db, поэтому в существующих базах они уже есть
+    (8, "кэш эмбеддингов эталонов, очередь заданий, ход задач и метрики воркеров", [
+        # Кэш эмбеддингов эталонных изображений по хешу содержимого
+        '''
+        CREATE TABLE IF NOT EXISTS reference_embeddings (
+            cache_key TEXT PRIMARY KEY,
+            embedding BLOB NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            last_used_at TIMESTAMP NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_reference_embeddings_last_used ON reference_embeddings (last_used_at)',
+        # Очередь заданий для воркеров распознавания (время аренды - unix time)
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            task_key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            worker_id TEXT,
+            lease_until REAL,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, priority DESC, created_at)',
+        # Ход выполнения задач распознавания
+        '''
+        CREATE TABLE IF NOT EXISTS task_progress (
+            task_key TEXT PRIMARY KEY,
+            frames_processed INTEGER NOT NULL,
+            total_frames INTEGER NOT NULL,
+            detections INTEGER NOT NULL,
+            eta_seconds REAL,
+            updated_at REAL NOT NULL
+        )
+        ''',
+        # Последние метрики воркеров
+        '''
+        CREATE TABLE IF NOT EXISTS worker_metrics (
+            worker_id TEXT PRIMARY KEY,
+            stats TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        ''',
+    ]),
+]
+
+def get_schema_version(cursor):
+    """Текущая версия схемы базы."""
+    cursor.execute('PRAGMA user_version')
+    return cursor.fetchone()[0]
+
+def apply_migrations(conn):
+    """
+    Применение миграций, которых еще нет в базе.
+
+    Каждая миграция выполняется в своей транзакции BEGIN IMMEDIATE вместе с записью
+    новой версии, поэтому процессы, одновременно вызвавшие init_db, не применят ее дважды.
+    """
+    cursor = conn.cursor()
+    for version, description, statements in MIGRATIONS:
+        if get_schema_version(cursor) >= version:
+            continue
+
+        cursor.execute('BEGIN IMMEDIATE')
+        # Версию перечитываем под блокировкой: миграцию мог применить другой процесс
+        if get_schema_version(cursor) >= version:
+            conn.commit()
+            continue
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute(f'PRAGMA user_version = {int(version)}')
+        conn.commit()
+        logger.info(f"Применена миграция схемы {version}: {description}")
+
 def init_db():
     """Создание таблиц, если не существуют."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    with session() as conn:
+        cursor = conn.cursor()
+        # Таблица пользователей
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL
+        )
+        ''')
+
+        # Таблица для задач распознавания
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recognition_tasks (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            result_path TEXT,
+            user_key TEXT NOT NULL,
+            user_id TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+
+        # Таблица для хранения информации о загруженных изображениях
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_images (
+            id TEXT PRIMARY KEY,
+            task_id TEXT NOT NULL,
+            image_path TEXT NOT NULL,
+            name TEXT,
+            FOREIGN KEY (task_id) REFERENCES recognition_tasks (id)
+        )
+        ''')
 
-    # Таблица пользователей
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id TEXT PRIMARY KEY,
-        username TEXT UNIQUE NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        created_at TIMESTAMP NOT NULL
-    )
-    ''')
-
-    # Таблица для задач распознавания
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS recognition_tasks (
-        id TEXT PRIMARY KEY,
-        status TEXT NOT NULL,
-        created_at TIMESTAMP NOT NULL,
-        result_path TEXT,
-        user_key TEXT NOT NULL,
-        user_id TEXT,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    ''')
-
-    # Таблица для хранения информации о загруженных изображениях
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS task_images (
-        id TEXT PRIMARY KEY,
-        task_id TEXT NOT NULL,
-        image_path TEXT NOT NULL,
-        name TEXT,
-        FOREIGN KEY (task_id) REFERENCES recognition_tasks (id)
-    )
-    ''')
-
-    conn.commit()
-    conn.close()
+        conn.commit()
+        apply_migrations(conn)
 
 def hash_password(password):
     """Хеширование пароля с использованием SHA-256."""
@@ -70,307 +261,1214 @@ def hash_password(password):
 
 def register_user(username, email, password):
     """Регистрация нового пользователя."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     try:
-        # Проверка существования пользователя
-        cursor.execute('SELECT id FROM users WHERE username = ? OR email = ?', (username, email))
-        if cursor.fetchone():
-            conn.close()
-            return False, "Пользователь с таким именем или email уже существует"
+        with session() as conn:
+            cursor = conn.cursor()
 
-        user_id = str(uuid4())
-        created_at = datetime.now()
-        password_hash = hash_password(password)
+            # Проверка существования пользователя
+            cursor.execute('SELECT id FROM users WHERE username = ? OR email = ?', (username, email))
+            if cursor.fetchone():
+                return False, "Пользователь с таким именем или email уже существует"
 
-        cursor.execute('''
-            INSERT INTO users (id, username, email, password_hash, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, username, email, password_hash, created_at))
+            user_id = str(uuid4())
+            created_at = datetime.now()
+            password_hash = hash_password(password)
 
-        conn.commit()
-        conn.close()
+            cursor.execute('''
+                INSERT INTO users (id, username, email, password_hash, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, username, email, password_hash, created_at))
 
-        logger.info(f"Зарегистрирован новый пользователь: {username}, email: {email}")
-        return True, user_id
+            conn.commit()
+
+            logger.info(f"Зарегистрирован новый пользователь: {username}, email: {email}")
+            return True, user_id
 
     except Exception as e:
         logger.error(f"Ошибка при регистрации пользователя {username}: {e}")
-        conn.close()
         return False, str(e)
 
 def authenticate_user(username, password):
     """Аутентификация пользователя."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     try:
-        password_hash = hash_password(password)
-        cursor.execute('SELECT id FROM users WHERE username = ? AND password_hash = ?',
-                       (username, password_hash))
-        result = cursor.fetchone()
-        conn.close()
-
-        if result:
-            logger.info(f"Успешная аутентификация пользователя: {username}")
-            return True, result[0]  # Возвращаем user_id
-        else:
-            logger.info(f"Неудачная попытка аутентификации: {username}")
-            return False, "Неверное имя пользователя или пароль"
+        with session() as conn:
+            cursor = conn.cursor()
+
+            password_hash = hash_password(password)
+            cursor.execute('SELECT id FROM users WHERE username = ? AND password_hash = ?',
+                           (username, password_hash))
+            result = cursor.fetchone()
+
+            if result:
+                logger.info(f"Успешная аутентификация пользователя: {username}")
+                return True, result[0]  # Возвращаем user_id
+            else:
+                logger.info(f"Неудачная попытка аутентификации: {username}")
+                return False, "Неверное имя пользователя или пароль"
     except Exception as e:
         logger.error(f"Ошибка при аутентификации пользователя {username}: {e}")
-        conn.close()
         return False, str(e)
 
 def get_user_by_id(user_id):
     """Получение информации о пользователе по ID."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute('SELECT id, username, email, created_at FROM users WHERE id = ?', (user_id,))
-        row = cursor.fetchone()
-        conn.close()
-
-        if row:
-            return {
-                "id": row[0],
-                "username": row[1],
-                "email": row[2],
-                "created_at": row[3]
-            }
-        return None
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT id, username, email, created_at FROM users WHERE id = ?', (user_id,))
+            row = cursor.fetchone()
+
+            if row:
+                return {
+                    "id": row[0],
+                    "username": row[1],
+                    "email": row[2],
+                    "created_at": row[3]
+                }
+            return None
     except Exception as e:
         logger.error(f"Ошибка при получении пользователя с ID {user_id}: {e}")
-        conn.close()
         return None
 
 def add_task(user_key: str, user_id: str = None):
     """Добавление новой задачи в базу."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    task_id = str(uuid4())
-    created_at = datetime.now()
+    with session() as conn:
+        cursor = conn.cursor()
+        task_id = str(uuid4())
+        created_at = datetime.now()
 
-    logger.info(f"Добавляем задачу: task_id={task_id}, user_key={user_key}, user_id={user_id}, created_at={created_at}")
+        logger.info(f"Добавляем задачу: task_id={task_id}, user_key={user_key}, user_id={user_id}, created_at={created_at}")
 
-    cursor.execute('''
-        INSERT INTO recognition_tasks (id, status, created_at, user_key, user_id)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (task_id, 'in_progress', created_at, user_key, user_id))
+        cursor.execute('''
+            INSERT INTO recognition_tasks (id, status, created_at, user_key, user_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (task_id, 'in_progress', created_at, user_key, user_id))
 
-    conn.commit()
-    conn.close()
+        conn.commit()
 
-    logger.info(f"Задача добавлена с ID: {task_id}")
+        logger.info(f"Задача добавлена с ID: {task_id}")
 
-    return task_id
+        return task_id
 
 #################
 def get_user_tasks(user_id: str):
     """Получение всех задач пользователя."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute('''
-            SELECT id, status, created_at, result_path, user_key
-            FROM recognition_tasks
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-        ''', (user_id,))
-
-        rows = cursor.fetchall()
-        tasks = []
-
-        for row in rows:
-            tasks.append({
-                "id": row[0],
-                "status": row[1],
-                "created_at": row[2],
-                "result_path": row[3],
-                "user_key": row[4]
-            })
-
-        conn.close()
-        return tasks
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                SELECT id, status, created_at, result_path, user_key
+                FROM recognition_tasks
+                WHERE user_id = ?
+                ORDER BY created_at DESC
+            ''', (user_id,))
+
+            rows = cursor.fetchall()
+            tasks = []
+
+            for row in rows:
+                tasks.append({
+                    "id": row[0],
+                    "status": row[1],
+                    "created_at": row[2],
+                    "result_path": row[3],
+                    "user_key": row[4]
+                })
+
+            return tasks
 
     except Exception as e:
         logger.error(f"Ошибка при получении задач пользователя {user_id}: {e}")
-        conn.close()
         return []
 
 def add_task_image(task_id: str, image_path: str, name: str = None):
     """Добавляет информацию о загруженном изображении для задачи."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    image_id = str(uuid4())
+    with session() as conn:
+        cursor = conn.cursor()
+        image_id = str(uuid4())
 
-    logger.info(f"Добавляем изображение к задаче: task_id={task_id}, image_path={image_path}, name={name}")
+        logger.info(f"Добавляем изображение к задаче: task_id={task_id}, image_path={image_path}, name={name}")
+
+        cursor.execute('''
+            INSERT INTO task_images (id, task_id, image_path, name)
+            VALUES (?, ?, ?, ?)
+        ''', (image_id, task_id, image_path, name))
 
-    cursor.execute('''
-        INSERT INTO task_images (id, task_id, image_path, name)
-        VALUES (?, ?, ?, ?)
-    ''', (image_id, task_id, image_path, name))
+        conn.commit()
 
-    conn.commit()
-    conn.close()
+        logger.info(f"Добавлено изображение с ID: {image_id} к задаче {task_id}")
 
-    logger.info(f"Добавлено изображение с ID: {image_id} к задаче {task_id}")
+        return image_id
 
-    return image_id
+def submit_task(user_key: str, user_id: str, images: list, payload: dict, priority: int = 0, max_attempts: int = 3):
+    """
+    Создание задачи распознавания вместе с ее изображениями и заданием в очереди.
 
-def get_task_images(task_id: str):
-    """Получает список изображений, связанных с задачей."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    Все записи добавляются в одной транзакции: задача in_progress без задания не видна
+    другим соединениям, поэтому проверка зависших задач (fail_exhausted_jobs) не переведет
+    в error задачу, запрос на которую еще обрабатывается.
 
-    try:
-        logger.info(f"Запрос изображений для задачи: {task_id}")
-        cursor.execute('SELECT id, image_path, name FROM task_images WHERE task_id = ?', (task_id,))
-        rows = cursor.fetchall()
+    Args:
+        user_key (str): Ключ задачи
+        user_id (str): ID пользователя или None
+        images (list): [(путь к изображению, имя)]
+        payload (dict): Параметры задания воркера
 
-        images = []
-        for row in rows:
-            images.append({
-                "id": row[0],
-                "image_path": row[1],
-                "name": row[2]
-            })
+    Returns:
+        str: ID задачи
+    """
+    with session() as conn:
+        cursor = conn.cursor()
+        task_id = str(uuid4())
+        job_id = str(uuid4())
+        now = time.time()
 
-        logger.info(f"Найдено {len(images)} изображений для задачи {task_id}")
-        return images
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            INSERT INTO recognition_tasks (id, status, created_at, user_key, user_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (task_id, 'in_progress', datetime.now(), user_key, user_id))
+        cursor.executemany('''
+            INSERT INTO task_images (id, task_id, image_path, name)
+            VALUES (?, ?, ?, ?)
+        ''', [(str(uuid4()), user_key, image_path, name) for image_path, name in images])
+        cursor.execute('''
+            INSERT INTO jobs (id, task_key, payload, status, priority, attempts, max_attempts, created_at, updated_at)
+            VALUES (?, ?, ?, 'queued', ?, 0, ?, ?, ?)
+        ''', (job_id, user_key, json.dumps(payload), priority, max_attempts, now, now))
+        conn.commit()
+
+        logger.info(f"Задача {user_key} (ID {task_id}) с {len(images)} изображениями поставлена в очередь заданием {job_id}")
+        return task_id
+
+def get_task_images(task_id: str):
+    """Получает список изображений, связанных с задачей."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            logger.info(f"Запрос изображений для задачи: {task_id}")
+            cursor.execute('SELECT id, image_path, name FROM task_images WHERE task_id = ?', (task_id,))
+            rows = cursor.fetchall()
+
+            images = []
+            for row in rows:
+                images.append({
+                    "id": row[0],
+                    "image_path": row[1],
+                    "name": row[2]
+                })
+
+            logger.info(f"Найдено {len(images)} изображений для задачи {task_id}")
+            return images
     except Exception as e:
         logger.error(f"Ошибка при запросе изображений для задачи {task_id}: {e}")
         return []
-    finally:
-        conn.close()
 
 def update_task_by_user_key(user_key: str, status: str, result_path: str = None):
     """Обновление статуса задачи по ключу пользователя."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            # Одно выражение: обновление и ID задачи для лога без отдельных SELECT
+            cursor.execute('''
+                UPDATE recognition_tasks
+                SET status = ?, result_path = ?
+                WHERE user_key = ?
+                RETURNING id
+            ''', (status, result_path, user_key))
+            rows = cursor.fetchall()
+
+            if not rows:
+                logger.error(f"Задача с ключом {user_key} не найдена при обновлении статуса")
+                return False
+
+            logger.info(f"Обновлен статус задачи: user_key={user_key}, task_id={rows[0][0]}, новый статус={status}")
+            return True
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении статуса задачи с ключом {user_key}: {e}")
+        return False
 
+def update_task(task_id: str, status: str, result_path: str = None):
+    """Обновление статуса задачи по ID."""
     try:
-        # Получим ID задачи по user_key
-        cursor.execute('SELECT id FROM recognition_tasks WHERE user_key = ?', (user_key,))
-        row = cursor.fetchone()
+        with session() as conn:
+            cursor = conn.cursor()
 
-        if not row:
-            logger.error(f"Задача с ключом {user_key} не найдена при обновлении статуса")
-            conn.close()
-            return False
+            cursor.execute('''
+                UPDATE recognition_tasks
+                SET status = ?, result_path = ?
+                WHERE id = ?
+            ''', (status, result_path, task_id))
 
-        task_id = row[0]
-        logger.info(f"Обновление статуса задачи: user_key={user_key}, task_id={task_id}, новый статус={status}")
+            if cursor.rowcount == 0:
+                logger.error(f"Задача с ID {task_id} не найдена при обновлении статуса")
+                return False
 
-        cursor.execute('''
-            UPDATE recognition_tasks
-            SET status = ?, result_path = ?
-            WHERE user_key = ?
-        ''', (status, result_path, user_key))
+            logger.info(f"Обновлен статус задачи: task_id={task_id}, новый статус={status}")
+            return True
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении статуса задачи {task_id}: {e}")
+        return False
 
-        conn.commit()
+def get_task(user_key: str):
+    """Получение информации о задаче по ключу пользователя."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
 
-        # Проверим, что обновление прошло успешно
-        cursor.execute('SELECT status FROM recognition_tasks WHERE user_key = ?', (user_key,))
-        updated_row = cursor.fetchone()
-        logger.info(f"После обновления статус задачи с ключом {user_key}: {updated_row[0] if updated_row else 'не найдено'}")
+            logger.info(f"Запрос информации о задаче по ключу: {user_key}")
+            cursor.execute('SELECT id, status, result_path FROM recognition_tasks WHERE user_key = ?', (user_key,))
+            row = cursor.fetchone()
 
-        return True
+            if row:
+                logger.info(f"Найдена задача: id={row[0]}, status={row[1]}")
+            else:
+                logger.info(f"Задача с ключом {user_key} не найдена")
+
+            return row
     except Exception as e:
-        logger.error(f"Ошибка при обновлении статуса задачи с ключом {user_key}: {e}")
-        return False
-    finally:
-        conn.close()
+        logger.error(f"Ошибка при запросе задачи по ключу {user_key}: {e}")
+        return None
 
-def update_task(task_id: str, status: str, result_path: str = None):
-    """Обновление статуса задачи по ID."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def get_task_by_id(task_id: str):
+    """Получение информации о задаче по ID."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            logger.info(f"Запрос информации о задаче по ID: {task_id}")
+            cursor.execute('SELECT id, status, result_path, user_key, user_id FROM recognition_tasks WHERE id = ?', (task_id,))
+            row = cursor.fetchone()
+
+            if row:
+                logger.info(f"Найдена задача: id={row[0]}, status={row[1]}")
+                return {
+                    "id": row[0],
+                    "status": row[1],
+                    "result_path": row[2],
+                    "user_key": row[3],
+                    "user_id": row[4]
+                }
+            else:
+                logger.info(f"Задача с ID {task_id} не найдена")
+                return None
+    except Exception as e:
+        logger.error(f"Ошибка при запросе задачи по ID {task_id}: {e}")
+        return None
 
+def get_task_by_id_with_user_check(task_id: str, user_id: str):
+    """Получение информации о задаче по ID с проверкой принадлежности пользователю."""
     try:
-        # Проверим существование задачи
-        cursor.execute('SELECT user_key FROM recognition_tasks WHERE id = ?', (task_id,))
-        row = cursor.fetchone()
+        with session() as conn:
+            cursor = conn.cursor()
+
+            logger.info(f"Запрос информации о задаче по ID: {task_id} для пользователя: {user_id}")
+            cursor.execute('''
+                SELECT id, status, result_path, user_key, user_id 
+                FROM recognition_tasks 
+                WHERE id = ? AND (user_id = ? OR user_id IS NULL)
+            ''', (task_id, user_id))
+            row = cursor.fetchone()
+
+            if row:
+                logger.info(f"Найдена задача: id={row[0]}, status={row[1]}, принадлежит пользователю: {row[4] == user_id}")
+                return {
+                    "id": row[0],
+                    "status": row[1],
+                    "result_path": row[2],
+                    "user_key": row[3],
+                    "user_id": row[4]
+                }
+            else:
+                logger.info(f"Задача с ID {task_id} не найдена или не принадлежит пользователю {user_id}")
+                return None
+    except Exception as e:
+        logger.error(f"Ошибка при запросе задачи по ID {task_id}: {e}")
+        return None
 
-        if not row:
-            logger.error(f"Задача с ID {task_id} не найдена при обновлении статуса")
-            conn.close()
-            return False
+def get_task_with_user_check(user_key: str, user_id: str):
+    """Получение информации о задаче по ключу пользователя с проверкой принадлежности."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            logger.info(f"Запрос информации о задаче по ключу: {user_key} для пользователя: {user_id}")
+            cursor.execute('''
+                SELECT id, status, result_path 
+                FROM recognition_tasks 
+                WHERE user_key = ? AND (user_id = ? OR user_id IS NULL)
+            ''', (user_key, user_id))
+            row = cursor.fetchone()
+
+            if row:
+                logger.info(f"Найдена задача: id={row[0]}, status={row[1]}")
+            else:
+                logger.info(f"Задача с ключом {user_key} не найдена или не принадлежит пользователю {user_id}")
+
+            return row
+    except Exception as e:
+        logger.error(f"Ошибка при запросе задачи по ключу {user_key}: {e}")
+        return None
 
-        user_key = row[0]
-        logger.info(f"Обновление статуса задачи: task_id={task_id}, user_key={user_key}, новый статус={status}")
+def get_cached_embedding(cache_key: str):
+    """Получение эмбеддинга из кэша по ключу с обновлением времени последнего использования."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT embedding FROM reference_embeddings WHERE cache_key = ?', (cache_key,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            cursor.execute('UPDATE reference_embeddings SET last_used_at = ? WHERE cache_key = ?',
+                           (datetime.now(), cache_key))
+            conn.commit()
+            return row[0]
+    except Exception as e:
+        logger.error(f"Ошибка при чтении кэша эмбеддингов {cache_key}: {e}")
+        return None
+
+def put_cached_embedding(cache_key: str, embedding: bytes, max_entries: int):
+    """Сохранение эмбеддинга в кэш с вытеснением давно не использованных записей сверх max_entries."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            now = datetime.now()
+            cursor.execute('''
+                INSERT OR REPLACE INTO reference_embeddings (cache_key, embedding, created_at, last_used_at)
+                VALUES (?, ?, ?, ?)
+            ''', (cache_key, embedding, now, now))
+
+            cursor.execute('''
+                DELETE FROM reference_embeddings
+                WHERE cache_key NOT IN (
+                    SELECT cache_key FROM reference_embeddings ORDER BY last_used_at DESC LIMIT ?
+                )
+            ''', (max_entries,))
+            evicted = cursor.rowcount
+
+            conn.commit()
+            return evicted
+    except Exception as e:
+        logger.error(f"Ошибка при записи в кэш эмбеддингов {cache_key}: {e}")
+        return 0
+
+def count_cached_embeddings():
+    """Количество записей в кэше эмбеддингов."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT COUNT(*) FROM reference_embeddings')
+            return cursor.fetchone()[0]
+    except Exception as e:
+        logger.error(f"Ошибка при подсчете записей кэша эмбеддингов: {e}")
+        return 0
+
+def enqueue_job(task_key: str, payload: dict, priority: int = 0, max_attempts: int = 3):
+    """Постановка задания распознавания в очередь."""
+    with session() as conn:
+        cursor = conn.cursor()
+        job_id = str(uuid4())
+        now = time.time()
 
         cursor.execute('''
-            UPDATE recognition_tasks
-            SET status = ?, result_path = ?
-            WHERE id = ?
-        ''', (status, result_path, task_id))
+            INSERT INTO jobs (id, task_key, payload, status, priority, attempts, max_attempts, created_at, updated_at)
+            VALUES (?, ?, ?, 'queued', ?, 0, ?, ?, ?)
+        ''', (job_id, task_key, json.dumps(payload), priority, max_attempts, now, now))
 
         conn.commit()
 
-        # Проверим, что обновление прошло успешно
-        cursor.execute('SELECT status FROM recognition_tasks WHERE id = ?', (task_id,))
-        updated_row = cursor.fetchone()
-        logger.info(f"После обновления статус задачи {task_id}: {updated_row[0] if updated_row else 'не найдено'}")
+        logger.info(f"Задание {job_id} для задачи {task_key} поставлено в очередь, приоритет {priority}")
+        return job_id
 
-        return True
+def claim_job(worker_id: str, lease_seconds: float):
+    """
+    Захват следующего задания воркером.
+
+    Берется задание из очереди с наибольшим приоритетом либо задание, аренда которого истекла
+    (воркер упал, не закончив его). Захват выполняется в транзакции BEGIN IMMEDIATE,
+    поэтому два воркера не получат одно задание.
+    """
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            now = time.time()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                SELECT id, task_key, payload, attempts
+                FROM jobs
+                WHERE (status = 'queued' OR (status = 'running' AND lease_until < ?))
+                  AND attempts < max_attempts
+                ORDER BY priority DESC, created_at
+                LIMIT 1
+            ''', (now,))
+            row = cursor.fetchone()
+
+            if not row:
+                conn.commit()
+                return None
+
+            cursor.execute('''
+                UPDATE jobs
+                SET status = 'running', worker_id = ?, lease_until = ?, attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+            ''', (worker_id, now + lease_seconds, now, row[0]))
+            conn.commit()
+
+            if row[3] > 0:
+                logger.info(f"Задание {row[0]} повторно захвачено воркером {worker_id}, попытка {row[3] + 1}")
+            return {"id": row[0], "task_key": row[1], "payload": json.loads(row[2]), "attempt": row[3] + 1}
     except Exception as e:
-        logger.error(f"Ошибка при обновлении статуса задачи {task_id}: {e}")
+        logger.error(f"Ошибка при захвате задания воркером {worker_id}: {e}")
+        return None
+
+def heartbeat_job(job_id: str, worker_id: str, lease_seconds: float):
+    """Продление аренды задания воркером."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            now = time.time()
+            cursor.execute('''
+                UPDATE jobs SET lease_until = ?, updated_at = ?
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+            ''', (now + lease_seconds, now, job_id, worker_id))
+            conn.commit()
+            return cursor.rowcount == 1
+    except Exception as e:
+        logger.error(f"Ошибка при продлении аренды задания {job_id}: {e}")
         return False
-    finally:
-        conn.close()
 
-def get_task(user_key: str):
-    """Получение информации о задаче по ключу пользователя."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def finish_job(job_id: str, worker_id: str, error: str = None):
+    """Завершение задания воркером: done при успехе, failed при ошибке."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ?
+                WHERE id = ? AND worker_id = ?
+            ''', ('failed' if error else 'done', error, time.time(), job_id, worker_id))
+            conn.commit()
+            return cursor.rowcount == 1
+    except Exception as e:
+        logger.error(f"Ошибка при завершении задания {job_id}: {e}")
+        return False
 
+def fail_exhausted_jobs():
+    """
+    Перевод в failed заданий с истекшей арендой, исчерпавших попытки,
+    и в error задач распознавания без активного задания. Эталоны галерей из таких заданий,
+    оставшиеся в pending, переводятся в error. Возвращает ключи задач.
+    """
     try:
-        logger.info(f"Запрос информации о задаче по ключу: {user_key}")
-        cursor.execute('SELECT id, status, result_path FROM recognition_tasks WHERE user_key = ?', (user_key,))
-        row = cursor.fetchone()
+        with session() as conn:
+            cursor = conn.cursor()
+
+            now = time.time()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                SELECT id, payload FROM jobs
+                WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts
+            ''', (now,))
+            exhausted = cursor.fetchall()
+            cursor.executemany('''
+                UPDATE jobs SET status = 'failed', error = 'Превышено число попыток', updated_at = ?
+                WHERE id = ?
+            ''', [(now, job_id) for job_id, _ in exhausted])
+
+            item_ids = []
+            for _, payload in exhausted:
+                payload = json.loads(payload)
+                if payload.get("kind") == "gallery":
+                    item_ids.extend(item["id"] for item in payload["items"])
+            cursor.executemany('''
+                UPDATE gallery_items SET status = 'error', error = 'Превышено число попыток', updated_at = ?
+                WHERE id = ? AND status = 'pending'
+            ''', [(now, item_id) for item_id in item_ids])
+
+            cursor.execute('''
+                SELECT user_key FROM recognition_tasks
+                WHERE status = 'in_progress' AND user_key NOT IN (
+                    SELECT task_key FROM jobs WHERE status IN ('queued', 'running')
+                )
+            ''')
+            task_keys = [row[0] for row in cursor.fetchall()]
+
+            cursor.executemany('UPDATE recognition_tasks SET status = ? WHERE user_key = ?',
+                               [('error', task_key) for task_key in task_keys])
+            conn.commit()
+
+            if task_keys:
+                logger.error(f"Задачи без активного задания переведены в error: {task_keys}")
+            return task_keys
+    except Exception as e:
+        logger.error(f"Ошибка при обработке зависших заданий: {e}")
+        return []
 
-        if row:
-            logger.info(f"Найдена задача: id={row[0]}, status={row[1]}")
-        else:
-            logger.info(f"Задача с ключом {user_key} не найдена")
+def count_jobs():
+    """Количество заданий в очереди по статусам."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
 
-        return row
+            cursor.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status')
+            return dict(cursor.fetchall())
     except Exception as e:
-        logger.error(f"Ошибка при запросе задачи по ключу {user_key}: {e}")
-        return None
-    finally:
-        conn.close()
+        logger.error(f"Ошибка при подсчете заданий: {e}")
+        return {}
 
-def get_task_by_id(task_id: str):
-    """Получение информации о задаче по ID."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def save_worker_metrics(worker_id: str, stats: dict):
+    """Сохранение метрик воркера."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                INSERT OR REPLACE INTO worker_metrics (worker_id, stats, updated_at)
+                VALUES (?, ?, ?)
+            ''', (worker_id, json.dumps(stats), time.time()))
+            conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении метрик воркера {worker_id}: {e}")
+
+def get_worker_metrics():
+    """Последние метрики всех воркеров."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT worker_id, stats FROM worker_metrics')
+            return {row[0]: json.loads(row[1]) for row in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"Ошибка при чтении метрик воркеров: {e}")
+        return {}
 
+def save_task_progress(task_key: str, progress: dict):
+    """Сохранение хода выполнения задачи."""
     try:
-        logger.info(f"Запрос информации о задаче по ID: {task_id}")
-        cursor.execute('SELECT id, status, result_path, user_key, user_id FROM recognition_tasks WHERE id = ?', (task_id,))
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                INSERT OR REPLACE INTO task_progress (task_key, frames_processed, total_frames, detections, eta_seconds, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (task_key, progress["frames_processed"], progress["total_frames"], progress["detections"],
+                  progress["eta_seconds"], time.time()))
+            conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении прогресса задачи {task_key}: {e}")
+
+def get_task_state(user_key: str):
+    """
+    Статус и ход выполнения задачи одним запросом (принадлежность проверяется вызывающим кодом).
+
+    Returns:
+        dict: Состояние задачи или None, если задачи нет. Ошибка базы не перехватывается:
+        подписчики хода выполнения отличают ее от удаленной задачи и повторяют запрос.
+    """
+    with session() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT t.status, p.frames_processed, p.total_frames, p.detections, p.eta_seconds
+            FROM recognition_tasks t
+            LEFT JOIN task_progress p ON p.task_key = t.user_key
+            WHERE t.user_key = ?
+        ''', (user_key,))
         row = cursor.fetchone()
+        if not row:
+            return None
+
+        return {
+            "status": row[0],
+            "frames_processed": row[1] or 0,
+            "total_frames": row[2] or 0,
+            "detections": row[3] or 0,
+            "eta_seconds": row[4]
+        }
+
+def create_upload(user_id: str, filename: str, path: str, size: int, upload_id: str = None):
+    """Создание записи возобновляемой загрузки."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            upload_id = upload_id or str(uuid4())
+            now = time.time()
+            cursor.execute('''
+                INSERT INTO uploads (id, user_id, filename, path, size, received, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+            ''', (upload_id, user_id, filename, path, size, now, now))
+
+            logger.info(f"Создана загрузка {upload_id}: {filename}, {size} байт")
+            return upload_id
+    except Exception as e:
+        logger.error(f"Ошибка при создании загрузки {filename}: {e}")
+        return None
+
+def get_upload(upload_id: str):
+    """Получение записи загрузки по ID."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                SELECT id, user_id, filename, path, size, received, sha256
+                FROM uploads WHERE id = ?
+            ''', (upload_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
 
-        if row:
-            logger.info(f"Найдена задача: id={row[0]}, status={row[1]}")
             return {
                 "id": row[0],
-                "status": row[1],
-                "result_path": row[2],
-                "user_key": row[3],
-                "user_id": row[4]
+                "user_id": row[1],
+                "filename": row[2],
+                "path": row[3],
+                "size": row[4],
+                "received": row[5],
+                "sha256": row[6]
             }
-        else:
-            logger.info(f"Задача с ID {task_id} не найдена")
-            return None
     except Exception as e:
-        logger.error(f"Ошибка при запросе задачи по ID {task_id}: {e}")
+        logger.error(f"Ошибка при запросе загрузки {upload_id}: {e}")
+        return None
+
+def update_upload_received(upload_id: str, received: int, sha256: str = None):
+    """Сохранение количества принятых байт загрузки (и хеша по завершении)."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                UPDATE uploads SET received = ?, sha256 = ?, updated_at = ?
+                WHERE id = ?
+            ''', (received, sha256, time.time(), upload_id))
+            return cursor.rowcount > 0
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении загрузки {upload_id}: {e}")
+        return False
+
+def delete_upload(upload_id: str):
+    """Удаление записи загрузки после того, как файл передан задаче."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('DELETE FROM uploads WHERE id = ?', (upload_id,))
+    except Exception as e:
+        logger.error(f"Ошибка при удалении загрузки {upload_id}: {e}")
+
+def delete_expired_uploads(max_age_seconds: float):
+    """
+    Удаление записей загрузок, которые не обновлялись дольше max_age_seconds.
+
+    Returns:
+        list: Удаленные загрузки [{"id", "path"}]; файлы удаляет вызывающий код
+    """
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT id, path FROM uploads WHERE updated_at < ?', (time.time() - max_age_seconds,))
+            expired = [{"id": row[0], "path": row[1]} for row in cursor.fetchall()]
+            cursor.executemany('DELETE FROM uploads WHERE id = ?', [(upload["id"],) for upload in expired])
+            conn.commit()
+
+            if expired:
+                logger.info(f"Удалено просроченных загрузок: {len(expired)}")
+            return expired
+    except Exception as e:
+        logger.error(f"Ошибка при удалении просроченных загрузок: {e}")
+        return []
+
+def get_result_cache_entry(cache_key: str):
+    """Получение записи кэша результатов с обновлением времени последнего использования."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                UPDATE result_cache SET last_used_at = ?
+                WHERE cache_key = ?
+                RETURNING result_path, detections_path, size
+            ''', (time.time(), cache_key))
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            return {"result_path": row[0], "detections_path": row[1], "size": row[2]}
+    except Exception as e:
+        logger.error(f"Ошибка при чтении кэша результатов {cache_key}: {e}")
+        return None
+
+def put_result_cache_entry(cache_key: str, result_path: str, detections_path: str, size: int, max_bytes: int):
+    """
+    Сохранение записи кэша результатов с вытеснением давно не использованных записей,
+    пока суммарный размер не уложится в max_bytes. Возвращает вытесненные записи,
+    чтобы вызывающий код удалил их файлы.
+    """
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            now = time.time()
+            cursor.execute('''
+                INSERT OR REPLACE INTO result_cache (cache_key, result_path, detections_path, size, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (cache_key, result_path, detections_path, size, now, now))
+
+            cursor.execute('''
+                DELETE FROM result_cache
+                WHERE cache_key IN (
+                    SELECT cache_key FROM (
+                        SELECT cache_key, SUM(size) OVER (ORDER BY last_used_at DESC, cache_key) AS total
+                        FROM result_cache
+                    ) WHERE total > ?
+                )
+                RETURNING cache_key, result_path, detections_path
+            ''', (max_bytes,))
+            evicted = [{"cache_key": row[0], "result_path": row[1], "detections_path": row[2]}
+                       for row in cursor.fetchall()]
+            return evicted
+    except Exception as e:
+        logger.error(f"Ошибка при записи в кэш результатов {cache_key}: {e}")
+        return []
+
+def delete_result_cache_entry(cache_key: str):
+    """Удаление записи кэша результатов (например, если ее файлы пропали)."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('DELETE FROM result_cache WHERE cache_key = ?', (cache_key,))
+    except Exception as e:
+        logger.error(f"Ошибка при удалении записи кэша результатов {cache_key}: {e}")
+
+def get_result_cache_usage():
+    """Количество записей и суммарный размер кэша результатов в байтах."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache')
+            return cursor.fetchone()
+    except Exception as e:
+        logger.error(f"Ошибка при подсчете размера кэша результатов: {e}")
+        return 0, 0
+
+def get_video_index(index_key: str):
+    """Получение записи индекса лиц видео с обновлением времени последнего использования."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                UPDATE video_indexes SET last_used_at = ?
+                WHERE index_key = ?
+                RETURNING path, embeddings, detections, dim, frames_seen, task_id
+            ''', (time.time(), index_key))
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            return {
+                "path": row[0],
+                "embeddings": row[1],
+                "detections": row[2],
+                "dim": row[3],
+                "frames_seen": row[4],
+                "task_id": row[5]
+            }
+    except Exception as e:
+        logger.error(f"Ошибка при чтении индекса лиц видео {index_key}: {e}")
+        return None
+
+def put_video_index(index_key: str, video_sha256: str, task_id: str, index: dict):
+    """Сохранение записи индекса лиц видео, построенного задачей task_id."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            now = time.time()
+            cursor.execute('''
+                INSERT OR REPLACE INTO video_indexes
+                    (index_key, video_sha256, task_id, path, embeddings, detections, dim, frames_seen, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (index_key, video_sha256, task_id, index["path"], index["embeddings"], index["detections"],
+                  index["dim"], index["frames_seen"], now, now))
+
+            logger.info(f"Сохранен индекс лиц видео {video_sha256} задачи {task_id}: "
+                        f"{index['embeddings']} эмбеддингов, {index['detections']} лиц")
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении индекса лиц видео {index_key}: {e}")
+
+def delete_video_index(index_key: str):
+    """Удаление записи индекса лиц видео (например, если его файлы пропали)."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('DELETE FROM video_indexes WHERE index_key = ?', (index_key,))
+    except Exception as e:
+        logger.error(f"Ошибка при удалении индекса лиц видео {index_key}: {e}")
+
+def create_gallery(user_id: str, name: str):
+    """Создание именованной галереи эталонов пользователя."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT id FROM galleries WHERE user_id = ? AND name = ?', (user_id, name))
+            if cursor.fetchone():
+                return False, "Галерея с таким именем уже существует"
+
+            gallery_id = str(uuid4())
+            now = time.time()
+            cursor.execute('''
+                INSERT INTO galleries (id, user_id, name, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (gallery_id, user_id, name, now, now))
+
+            logger.info(f"Создана галерея {gallery_id} '{name}' пользователя {user_id}")
+            return True, gallery_id
+    except Exception as e:
+        logger.error(f"Ошибка при создании галереи '{name}' пользователя {user_id}: {e}")
+        return False, str(e)
+
+def get_user_galleries(user_id: str):
+    """Галереи пользователя с количеством эталонов (всего и с готовыми эмбеддингами)."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                SELECT g.id, g.name, g.created_at, COUNT(i.id), COALESCE(SUM(i.status = 'ready'), 0)
+                FROM galleries g
+                LEFT JOIN gallery_items i ON i.gallery_id = g.id
+                WHERE g.user_id = ?
+                GROUP BY g.id
+                ORDER BY g.name
+            ''', (user_id,))
+
+            return [{
+                "id": row[0],
+                "name": row[1],
+                "created_at": row[2],
+                "items": row[3],
+                "ready": row[4]
+            } for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка при получении галерей пользователя {user_id}: {e}")
+        return []
+
+def get_gallery(gallery_id: str, user_id: str):
+    """Получение галереи с проверкой принадлежности пользователю."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT id, name, created_at, updated_at FROM galleries WHERE id = ? AND user_id = ?',
+                           (gallery_id, user_id))
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            return {"id": row[0], "name": row[1], "created_at": row[2], "updated_at": row[3]}
+    except Exception as e:
+        logger.error(f"Ошибка при получении галереи {gallery_id}: {e}")
         return None
-    finally:
-        conn.close()
+
+def delete_gallery(gallery_id: str, user_id: str):
+    """Удаление галереи пользователя вместе с ее эталонами."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('DELETE FROM galleries WHERE id = ? AND user_id = ?', (gallery_id, user_id))
+            if cursor.rowcount != 1:
+                return False
+            cursor.execute('DELETE FROM gallery_items WHERE gallery_id = ?', (gallery_id,))
+
+            logger.info(f"Удалена галерея {gallery_id} пользователя {user_id}")
+            return True
+    except Exception as e:
+        logger.error(f"Ошибка при удалении галереи {gallery_id}: {e}")
+        return False
+
+def add_gallery_items(gallery_id: str, items: list):
+    """
+    Добавление эталонов в галерею.
+
+    Эталоны создаются в статусе pending, эмбеддинги считает воркер.
+
+    Args:
+        gallery_id (str): ID галереи
+        items (list): [(id эталона, имя)]
+    """
+    with session() as conn:
+        cursor = conn.cursor()
+
+        now = time.time()
+        cursor.executemany('''
+            INSERT INTO gallery_items (id, gallery_id, name, status, created_at, updated_at)
+            VALUES (?, ?, ?, 'pending', ?, ?)
+        ''', [(item_id, gallery_id, name, now, now) for item_id, name in items])
+        cursor.execute('UPDATE galleries SET updated_at = ? WHERE id = ?', (now, gallery_id))
+
+        logger.info(f"В галерею {gallery_id} добавлено эталонов: {len(items)}")
+
+def update_gallery_item(item_id: str, status: str, embedding: bytes = None, model_key: str = None,
+                        error: str = None):
+    """Сохранение эмбеддинга эталона галереи (status = ready) или ошибки его расчета (status = error)."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            now = time.time()
+            cursor.execute('''
+                UPDATE gallery_items SET status = ?, embedding = ?, model_key = ?, error = ?, updated_at = ?
+                WHERE id = ?
+            ''', (status, embedding, model_key, error, now, item_id))
+            # Эталон могли удалить, пока воркер считал эмбеддинг
+            if cursor.rowcount != 1:
+                return False
+            # Набор готовых эталонов изменился: сохраненный индекс галереи устарел
+            cursor.execute('''
+                UPDATE galleries SET updated_at = ?
+                WHERE id = (SELECT gallery_id FROM gallery_items WHERE id = ?)
+            ''', (now, item_id))
+            return True
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении эталона галереи {item_id}: {e}")
+        return False
+
+def fail_pending_gallery_items(item_ids: list, error: str):
+    """Перевод в error эталонов галереи, которые остались в pending после ошибки задания."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            now = time.time()
+            cursor.executemany('''
+                UPDATE gallery_items SET status = 'error', error = ?, updated_at = ?
+                WHERE id = ? AND status = 'pending'
+            ''', [(error, now, item_id) for item_id in item_ids])
+            return cursor.rowcount
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении эталонов галереи: {e}")
+        return 0
+
+def get_gallery_items(gallery_id: str):
+    """Список эталонов галереи без эмбеддингов."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                SELECT id, name, status, error, created_at
+                FROM gallery_items
+                WHERE gallery_id = ?
+                ORDER BY created_at, id
+            ''', (gallery_id,))
+
+            return [{
+                "id": row[0],
+                "name": row[1],
+                "status": row[2],
+                "error": row[3],
+                "created_at": row[4]
+            } for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка при получении эталонов галереи {gallery_id}: {e}")
+        return []
+
+def delete_gallery_item(gallery_id: str, item_id: str):
+    """Удаление эталона из галереи."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('DELETE FROM gallery_items WHERE id = ? AND gallery_id = ?', (item_id, gallery_id))
+            if cursor.rowcount != 1:
+                return False
+            cursor.execute('UPDATE galleries SET updated_at = ? WHERE id = ?', (time.time(), gallery_id))
+            return True
+    except Exception as e:
+        logger.error(f"Ошибка при удалении эталона {item_id} галереи {gallery_id}: {e}")
+        return False
+
+def get_gallery_updated_at(gallery_id: str):
+    """Время последнего изменения галереи (версия ее сохраненного индекса) или None, если галереи нет."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT updated_at FROM galleries WHERE id = ?', (gallery_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Ошибка при получении галереи {gallery_id}: {e}")
+        return None
+
+def get_gallery_embeddings(gallery_id: str, model_key: str):
+    """
+    Готовые эмбеддинги эталонов галереи, посчитанные той же моделью.
+
+    Returns:
+        list: [(id эталона, имя, эмбеддинг в байтах float32)]
+    """
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                SELECT id, name, embedding
+                FROM gallery_items
+                WHERE gallery_id = ? AND status = 'ready' AND model_key = ?
+                ORDER BY created_at, id
+            ''', (gallery_id, model_key))
+            return cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Ошибка при чтении эмбеддингов галереи {gallery_id}: {e}")
+        return []
+
+def create_task_segments(task_key: str, segments: list, payloads: list = None, max_attempts: int = 3):
+    """
+    Создание отрезков видео задачи вместе с их заданиями.
+
+    Отрезки и задания вставляются одной транзакцией: если воркер упадет посередине,
+    повторное задание разбиения не найдет отрезков без заданий.
+
+    Args:
+        task_key (str): Ключ задачи
+        segments (list): [(первый кадр, кадр после последнего или None)]
+        payloads (list, optional): Данные заданий отрезков в том же порядке
+        max_attempts (int): Количество попыток задания отрезка
+
+    Returns:
+        bool: False, если отрезки задачи уже созданы (задание разбиения выполняется повторно)
+    """
+    with session() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT 1 FROM task_segments WHERE task_key = ? LIMIT 1', (task_key,))
+        if cursor.fetchone():
+            conn.commit()
+            return False
+
+        now = time.time()
+        cursor.executemany('''
+            INSERT INTO task_segments (task_key, segment, start_frame, end_frame, status, updated_at)
+            VALUES (?, ?, ?, ?, 'queued', ?)
+        ''', [(task_key, i, start, end, now) for i, (start, end) in enumerate(segments)])
+        cursor.executemany('''
+            INSERT INTO jobs (id, task_key, payload, status, priority, attempts, max_attempts, created_at, updated_at)
+            VALUES (?, ?, ?, 'queued', 0, 0, ?, ?, ?)
+        ''', [(str(uuid4()), task_key, json.dumps(payload), max_attempts, now, now) for payload in payloads or []])
+        conn.commit()
+
+        logger.info(f"Задача {task_key} разбита на {len(segments)} отрезков видео")
+        return True
+
+def save_segment_progress(task_key: str, segment: int, progress: dict):
+    """Сохранение хода обработки отрезка и суммарного хода выполнения задачи по всем отрезкам."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            now = time.time()
+            cursor.execute('''
+                UPDATE task_segments
+                SET status = 'running', frames_processed = ?, total_frames = ?, detections = ?, eta_seconds = ?,
+                    updated_at = ?
+                WHERE task_key = ? AND segment = ?
+            ''', (progress["frames_processed"], progress["total_frames"], progress["detections"],
+                  progress["eta_seconds"], now, task_key, segment))
+
+            # Отрезки обрабатываются одновременно: задача закончится вместе с самым долгим отрезком
+            cursor.execute('''
+                INSERT OR REPLACE INTO task_progress (task_key, frames_processed, total_frames, detections, eta_seconds, updated_at)
+                SELECT task_key, SUM(frames_processed), SUM(total_frames), SUM(detections), MAX(eta_seconds), ?
+                FROM task_segments
+                WHERE task_key = ?
+                GROUP BY task_key
+            ''', (now, task_key))
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении прогресса отрезка {segment} задачи {task_key}: {e}")
+
+def finish_task_segment(task_key: str, segment: int, status: str, frames_seen: int = None, frames_gated: int = 0):
+    """
+    Завершение отрезка (status = done или error); frames_gated - кадры, отсеянные без детекции.
+
+    Returns:
+        int: Сколько отрезков задачи еще не завершено. Обновление и подсчет выполняются
+        в одной транзакции, поэтому ноль получит ровно один воркер - он и собирает результат.
+        None, если отрезок уже был завершен или отрезки задачи удалены после сборки
+        (задание отрезка выполнено повторно после истечения аренды).
+    """
+    with session() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            UPDATE task_segments SET status = ?, frames_seen = ?, frames_gated = ?, eta_seconds = 0, updated_at = ?
+            WHERE task_key = ? AND segment = ? AND status NOT IN ('done', 'error')
+        ''', (status, frames_seen, frames_gated, time.time(), task_key, segment))
+        if cursor.rowcount == 0:
+            conn.commit()
+            return None
+        cursor.execute('''
+            SELECT COUNT(*) FROM task_segments
+            WHERE task_key = ? AND status NOT IN ('done', 'error')
+        ''', (task_key,))
+        remaining = cursor.fetchone()[0]
+        conn.commit()
+        return remaining
+
+def get_task_segments(task_key: str):
+    """Отрезки видео задачи по порядку."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                SELECT segment, start_frame, end_frame, status, detections, frames_seen, frames_gated
+                FROM task_segments
+                WHERE task_key = ?
+                ORDER BY segment
+            ''', (task_key,))
+
+            return [{
+                "segment": row[0],
+                "start_frame": row[1],
+                "end_frame": row[2],
+                "status": row[3],
+                "detections": row[4],
+                "frames_seen": row[5],
+                "frames_gated": row[6]
+            } for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка при получении отрезков задачи {task_key}: {e}")
+        return []
+
+def delete_task_segments(task_key: str):
+    """Удаление отрезков задачи после сборки результата."""
+    try:
+        with session() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('DELETE FROM task_segments WHERE task_key = ?', (task_key,))
+    except Exception as e:
+        logger.error(f"Ошибка при удалении отрезков задачи {task_key}: {e}")
 
 init_db()
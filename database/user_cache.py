@@ -0,0 +1,58 @@
+import os
+import time
+from collections import OrderedDict
+
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 60))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 1024))
+
+
+class UserCache:
+    """
+    Кэш записей пользователей в памяти процесса с ограничением по времени жизни и размеру (LRU).
+
+    Запись пользователя почти не меняется, поэтому проверка сессии на каждом запросе
+    (в том числе при опросе статуса) не должна ходить в базу. Устаревание ограничено ttl
+    секундами; при регистрации или изменении профиля запись сбрасывается явно.
+    Используется из цикла событий, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_entries=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # {user_id: (срок действия, запись)}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Запись пользователя из кэша или None"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id, user):
+        self._entries[user_id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Сбрасывает запись пользователя после регистрации или изменения профиля"""
+        self._entries.pop(user_id, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+        }
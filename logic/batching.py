@@ -0,0 +1,83 @@
+import time
+
+import cv2
+import numpy as np
+
+FACE_SIZE = (160, 160)  # Размер входа Facenet
+DEFAULT_BATCH_SIZE = 32
+
+
+def prepare_face(face):
+    """Приводит выровненное лицо от детектора к входу Facenet (160x160, float32, 0..1)"""
+    face = face[0] if isinstance(face, tuple) else face
+    return cv2.resize(face, FACE_SIZE).astype("float32") / 255
+
+
+def embed_faces(model, faces, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Считает эмбеддинги для списка подготовленных лиц пакетами
+
+    Args:
+        model: Модель эмбеддингов
+        faces (list): Лица после prepare_face
+        batch_size (int): Максимальный размер пакета
+
+    Returns:
+        np.ndarray: Матрица эмбеддингов (len(faces), dim)
+    """
+    chunks = []
+    for start in range(0, len(faces), batch_size):
+        batch = np.stack(faces[start:start + batch_size])
+        chunks.append(model.predict(batch, batch_size=len(batch), verbose=0))
+    return np.concatenate(chunks)
+
+
+class EmbeddingBatcher:
+    """
+    Накопитель лиц для пакетного инференса.
+
+    Лица из разных кадров собираются в один тензор, и модель вызывается один раз
+    на пакет. Каждое лицо сопровождается метаданными (кадр, время, рамка),
+    которые возвращаются вместе с эмбеддингом в порядке добавления.
+    """
+
+    def __init__(self, model, batch_size=DEFAULT_BATCH_SIZE):
+        self.model = model
+        self.batch_size = batch_size
+        self.pending_faces = []
+        self.pending_meta = []
+        self.batches = 0        # Количество вызовов модели
+        self.faces_embedded = 0  # Количество обработанных лиц
+        self.embed_seconds = 0.0
+
+    def add(self, face, meta):
+        """Добавляет лицо с метаданными в пакет"""
+        self.pending_faces.append(prepare_face(face))
+        self.pending_meta.append(meta)
+
+    @property
+    def is_full(self):
+        return len(self.pending_faces) >= self.batch_size
+
+    def flush(self):
+        """Обрабатывает накопленные лица и возвращает [(meta, embedding)] в порядке добавления"""
+        if not self.pending_faces:
+            return []
+
+        faces, meta = self.pending_faces, self.pending_meta
+        self.pending_faces, self.pending_meta = [], []
+
+        started = time.perf_counter()
+        embeddings = embed_faces(self.model, faces, self.batch_size)
+        self.embed_seconds += time.perf_counter() - started
+        self.batches += -(-len(faces) // self.batch_size)
+        self.faces_embedded += len(faces)
+        return list(zip(meta, embeddings))
+
+    def stats(self):
+        """Пропускная способность стадии инференса"""
+        return {
+            "faces_embedded": self.faces_embedded,
+            "embed_batches": self.batches,
+            "embed_faces_per_second": round(self.faces_embedded / self.embed_seconds, 1) if self.embed_seconds else 0.0,
+        }
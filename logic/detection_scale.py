@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+
+import cv2
+
+from logic.batching import FACE_SIZE
+from logic.face_tracking import box_iou
+from logic.task_options import parse_scale
+
+# Масштаб кадра для детекции: 1 - исходное разрешение, 0.5 - вдвое меньше, auto - по DETECTION_MIN_FACE
+DETECTION_SCALE = os.environ.get("DETECTION_SCALE", "1")
+DETECTION_MIN_FACE = int(os.environ.get("DETECTION_MIN_FACE", 48))  # Самое маленькое нужное лицо, пикселей исходного кадра
+DETECTOR_MIN_FACE = 20     # Лица меньше этого RetinaFace находит ненадежно
+REFINE_MARGIN = 0.25       # Запас вокруг рамки при уточнении лица в исходном разрешении
+# Повторная детекция лица в исходном разрешении: auto - только для лиц, которые на уменьшенном кадре
+# меньше входа модели эмбеддингов, always - для всех лиц, never - лица берутся с уменьшенного кадра
+DETECTION_REFINE = os.environ.get("DETECTION_REFINE", "auto")
+REFINE_MODES = ("auto", "always", "never")
+
+
+def resolve_scale(scale, min_face=DETECTION_MIN_FACE):
+    """Масштаб кадра: для auto - такой, чтобы лицо размером min_face осталось не меньше DETECTOR_MIN_FACE"""
+    if scale == "auto":
+        return min(1.0, DETECTOR_MIN_FACE / float(min_face))
+    return float(scale)
+
+
+class ScaledDetector:
+    """
+    Детекция на уменьшенной копии кадра с уточнением мелких лиц в исходном разрешении.
+
+    Стоимость RetinaFace растет с количеством пикселей, а лица в 4K и 1080p обычно
+    крупнее, чем нужно детектору. Кадр уменьшается, найденные рамки переводятся
+    в координаты исходного кадра. Лицо, которое и на уменьшенном кадре не меньше входа
+    модели эмбеддингов, берется выровненным с первого прохода: модель все равно
+    уменьшит его до своего размера. Для более мелких лиц детектор повторно запускается
+    на небольшой области вокруг рамки в исходном разрешении (режим refine), чтобы лицо
+    попало в эмбеддинг без потери качества; каждое такое уточнение - отдельный вызов
+    RetinaFace. Если уточнение не нашло лица, берется невыровненный фрагмент исходного кадра.
+    """
+
+    def __init__(self, detect, scale=DETECTION_SCALE, min_face=DETECTION_MIN_FACE, refine=DETECTION_REFINE):
+        """
+        Args:
+            detect (callable): Детекция с выравниванием: кадр -> [(лицо, [x, y, w, h])]
+            scale (float или str): Масштаб кадра в (0, 1] или auto
+            min_face (int): Размер самого маленького нужного лица в пикселях исходного кадра (для auto)
+            refine (str): Повторная детекция в исходном разрешении: auto, always или never
+        """
+        if refine not in REFINE_MODES:
+            raise ValueError(f"Неизвестный режим уточнения лиц: {refine}")
+        self.detect = detect
+        self.scale = resolve_scale(parse_scale(scale), min_face)
+        self.refine_mode = refine
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.faces_reused = 0
+        self.faces_refined = 0
+        self.faces_unaligned = 0
+        self.detect_seconds = 0.0   # Детекция на уменьшенном кадре
+        self.refine_seconds = 0.0   # Повторные детекции в исходном разрешении
+
+    def needs_refine(self, small_box):
+        """Нужна ли повторная детекция для рамки в координатах уменьшенного кадра"""
+        if self.refine_mode == "auto":
+            return min(small_box[2], small_box[3]) < min(FACE_SIZE)
+        return self.refine_mode == "always"
+
+    def refine(self, frame, box):
+        """Выровненное лицо из исходного кадра для рамки в его координатах"""
+        height, width = frame.shape[:2]
+        x, y, w, h = box
+        margin = int(max(w, h) * REFINE_MARGIN) + 4
+        x1, y1 = max(0, x - margin), max(0, y - margin)
+        x2, y2 = min(width, x + w + margin), min(height, y + h + margin)
+
+        best, best_iou = None, 0.0
+        for face, (fx, fy, fw, fh) in self.detect(frame[y1:y2, x1:x2]):
+            iou = box_iou(box, [fx + x1, fy + y1, fw, fh])
+            if iou > best_iou:
+                best, best_iou = face, iou
+        if best is not None:
+            return best, True
+        return frame[max(0, y):y + h, max(0, x):x + w], False
+
+    def __call__(self, frame):
+        if self.scale >= 1.0:
+            return self.detect(frame)
+
+        started = time.perf_counter()
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (max(1, int(width * self.scale)), max(1, int(height * self.scale))),
+                           interpolation=cv2.INTER_AREA)
+        detected = self.detect(small)
+        refine_started = time.perf_counter()
+
+        faces = []
+        reused = refined = 0
+        for small_face, small_box in detected:
+            box = [int(round(v / self.scale)) for v in small_box]
+            if not self.needs_refine(small_box):
+                reused += 1
+                faces.append((small_face, box))
+                continue
+            face, aligned = self.refine(frame, box)
+            refined += aligned
+            faces.append((face, box))
+
+        finished = time.perf_counter()
+        with self._lock:
+            self.frames += 1
+            self.faces_reused += reused
+            self.faces_refined += refined
+            self.faces_unaligned += len(faces) - reused - refined
+            self.detect_seconds += refine_started - started
+            self.refine_seconds += finished - refine_started
+        return faces
+
+    def stats(self):
+        return {
+            "detection_scale": round(self.scale, 3),
+            "detection_refine": self.refine_mode,
+            "faces_reused": self.faces_reused,
+            "faces_refined": self.faces_refined,
+            "faces_unaligned": self.faces_unaligned,
+            "refine_seconds": round(self.refine_seconds, 2),
+        }
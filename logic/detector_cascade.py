@@ -0,0 +1,197 @@
+import os
+import threading
+
+import cv2
+
+from logic.face_tracking import box_iou
+from logic.task_options import PREFILTER_MODES
+
+# Быстрый предварительный детектор перед RetinaFace: none, haar, ssd или yunet
+PREFILTER_BACKEND = os.environ.get("PREFILTER_BACKEND", "none")
+# frame - RetinaFace на всем кадре, если есть кандидаты; roi - только на областях вокруг кандидатов
+PREFILTER_MODE = os.environ.get("PREFILTER_MODE", "frame")
+PREFILTER_WIDTH = int(os.environ.get("PREFILTER_WIDTH", 320))  # Ширина уменьшенного кадра для предфильтра
+# Каталог с весами SSD и YuNet; по умолчанию каталог весов deepface
+PREFILTER_MODEL_DIR = os.environ.get("PREFILTER_MODEL_DIR", os.path.join(os.path.expanduser("~"), ".deepface", "weights"))
+
+SSD_PROTOTXT = "deploy.prototxt"
+SSD_WEIGHTS = "res10_300x300_ssd_iter_140000.caffemodel"
+YUNET_WEIGHTS = "face_detection_yunet_2023mar.onnx"
+
+ROI_MARGIN = 0.5           # Запас вокруг кандидата с каждой стороны, в долях его размера
+ROI_MIN_SIZE = 64          # Минимальная сторона области для RetinaFace в пикселях исходного кадра
+DUPLICATE_IOU = 0.5        # Лица из пересекающихся областей с таким перекрытием считаются одним
+
+
+class HaarPrefilter:
+    """Каскад Хаара из поставки OpenCV: самый дешевый, но пропускает лица в профиль"""
+
+    def __init__(self, min_size=12):
+        self.min_size = min_size
+        if not hasattr(cv2, "CascadeClassifier"):
+            raise ValueError("Каскады Хаара недоступны в этой сборке OpenCV")
+        self._classifier = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+        if self._classifier.empty():
+            raise ValueError("Не удалось загрузить каскад Хаара из поставки OpenCV")
+
+    def candidates(self, small):
+        gray = cv2.equalizeHist(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+        boxes = self._classifier.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=3,
+                                                  minSize=(self.min_size, self.min_size))
+        return [list(box) for box in boxes]
+
+
+class SsdPrefilter:
+    """ResNet-10 SSD через cv2.dnn (те же веса, что у бэкенда ssd в deepface)"""
+
+    def __init__(self, model_dir=PREFILTER_MODEL_DIR, confidence=0.3):
+        prototxt = os.path.join(model_dir, SSD_PROTOTXT)
+        weights = os.path.join(model_dir, SSD_WEIGHTS)
+        if not os.path.exists(prototxt) or not os.path.exists(weights):
+            raise ValueError(f"Не найдены веса SSD в {model_dir}: {SSD_PROTOTXT}, {SSD_WEIGHTS}")
+        self.confidence = confidence
+        self._net = cv2.dnn.readNetFromCaffe(prototxt, weights)
+
+    def candidates(self, small):
+        height, width = small.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(small, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self._net.setInput(blob)
+        detections = self._net.forward()[0, 0]
+        boxes = []
+        for detection in detections[detections[:, 2] >= self.confidence]:
+            x1, y1, x2, y2 = detection[3:7] * [width, height, width, height]
+            boxes.append([int(x1), int(y1), int(x2 - x1), int(y2 - y1)])
+        return boxes
+
+
+class YunetPrefilter:
+    """YuNet через cv2.FaceDetectorYN (OpenCV 4.5.4+): быстрый и устойчивый к позе"""
+
+    def __init__(self, model_dir=PREFILTER_MODEL_DIR, confidence=0.5):
+        weights = os.path.join(model_dir, YUNET_WEIGHTS)
+        if not hasattr(cv2, "FaceDetectorYN"):
+            raise ValueError("YuNet требует OpenCV 4.5.4 или новее")
+        if not os.path.exists(weights):
+            raise ValueError(f"Не найдены веса YuNet: {weights}")
+        self._detector = cv2.FaceDetectorYN.create(weights, "", (320, 320), confidence)
+        self._input_size = None
+
+    def candidates(self, small):
+        height, width = small.shape[:2]
+        if self._input_size != (width, height):
+            self._detector.setInputSize((width, height))
+            self._input_size = (width, height)
+        _, faces = self._detector.detect(small)
+        if faces is None:
+            return []
+        return [[int(v) for v in face[:4]] for face in faces]
+
+
+PREFILTERS = {
+    "haar": HaarPrefilter,
+    "ssd": SsdPrefilter,
+    "yunet": YunetPrefilter,
+}
+
+
+def merge_regions(regions):
+    """Объединяет пересекающиеся области [x1, y1, x2, y2], чтобы одно лицо не искалось дважды"""
+    merged = []
+    for region in sorted(regions):
+        for other in merged:
+            if region[0] <= other[2] and region[2] >= other[0] and region[1] <= other[3] and region[3] >= other[1]:
+                other[:] = [min(region[0], other[0]), min(region[1], other[1]),
+                            max(region[2], other[2]), max(region[3], other[3])]
+                break
+        else:
+            merged.append(list(region))
+    return merged
+
+
+class DetectorCascade:
+    """
+    Каскад детекторов: дешевый предфильтр на уменьшенном кадре, затем RetinaFace.
+
+    Большинство кадров без людей (пустые коридоры, перебивки) отсекается предфильтром,
+    и RetinaFace на них не запускается. В режиме frame RetinaFace обрабатывает весь кадр,
+    если предфильтр нашел хотя бы одного кандидата, поэтому найденные лица совпадают с
+    обычной детекцией. В режиме roi RetinaFace запускается только на областях вокруг
+    кандидатов в исходном разрешении - быстрее, но лица, пропущенные предфильтром, теряются.
+
+    Вызывается из нескольких потоков детекции конвейера: у каждого потока свой экземпляр
+    предфильтра (объекты OpenCV не потокобезопасны).
+    """
+
+    def __init__(self, detect, backend=PREFILTER_BACKEND, mode=PREFILTER_MODE, width=PREFILTER_WIDTH):
+        """
+        Args:
+            detect (callable): Полная детекция (RetinaFace): кадр -> [(лицо, [x, y, w, h])]
+            backend (str): Предфильтр: haar, ssd или yunet
+            mode (str): frame или roi
+            width (int): Ширина кадра для предфильтра
+        """
+        if backend not in PREFILTERS:
+            raise ValueError(f"Неизвестный предфильтр детекции: {backend}")
+        if mode not in PREFILTER_MODES:
+            raise ValueError(f"Неизвестный режим предфильтра: {mode}")
+        self.detect_full = detect
+        self.backend = backend
+        self.mode = mode
+        self.width = width
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.frames_checked = 0
+        self.frames_skipped = 0
+        self.regions = 0
+        PREFILTERS[backend]()  # Проверяем наличие весов сразу, а не в потоке детекции
+
+    def _prefilter(self):
+        prefilter = getattr(self._local, "prefilter", None)
+        if prefilter is None:
+            prefilter = self._local.prefilter = PREFILTERS[self.backend]()
+        return prefilter
+
+    def candidates(self, frame):
+        """Кандидаты в лица в координатах исходного кадра"""
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.width / float(width))
+        small = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA) \
+            if scale < 1.0 else frame
+        return [[int(v / scale) for v in box] for box in self._prefilter().candidates(small)]
+
+    def __call__(self, frame):
+        boxes = self.candidates(frame)
+        with self._lock:
+            self.frames_checked += 1
+            if not boxes:
+                self.frames_skipped += 1
+        if not boxes:
+            return []
+        if self.mode == "frame":
+            return self.detect_full(frame)
+
+        height, width = frame.shape[:2]
+        regions = []
+        for x, y, w, h in boxes:
+            margin = max(int(max(w, h) * ROI_MARGIN), (ROI_MIN_SIZE - min(w, h)) // 2, 0)
+            regions.append([max(0, x - margin), max(0, y - margin), min(width, x + w + margin), min(height, y + h + margin)])
+        regions = merge_regions(regions)
+        with self._lock:
+            self.regions += len(regions)
+
+        faces = []
+        for x1, y1, x2, y2 in regions:
+            for face, (x, y, w, h) in self.detect_full(frame[y1:y2, x1:x2]):
+                box = [x + x1, y + y1, w, h]
+                if all(box_iou(box, other) < DUPLICATE_IOU for _, other in faces):
+                    faces.append((face, box))
+        return faces
+
+    def stats(self):
+        return {
+            "prefilter": self.backend,
+            "prefilter_mode": self.mode,
+            "frames_checked": self.frames_checked,
+            "frames_skipped": self.frames_skipped,
+            "regions": self.regions,
+        }
@@ -0,0 +1,82 @@
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+from database.database import count_cached_embeddings, get_cached_embedding, put_cached_embedding
+from logic.batching import FACE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Версия конвейера подготовки лица: при изменении выравнивания или препроцессинга
+# старые записи кэша перестают совпадать по ключу
+ALIGNMENT_VERSION = f"align=1;size={FACE_SIZE[0]}x{FACE_SIZE[1]};scale=1/255;v1"
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class EmbeddingCache:
+    """
+    Кэш эмбеддингов эталонных изображений в SQLite.
+
+    Ключ - SHA-256 от версии модели/детектора/выравнивания и байтов изображения,
+    поэтому повторная загрузка той же фотографии не требует ни детекции, ни инференса.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(image_bytes, model_name, detector_backend):
+        """Ключ кэша для содержимого изображения и версии моделей"""
+        digest = hashlib.sha256()
+        digest.update(f"{model_name}|{detector_backend}|{ALIGNMENT_VERSION}|".encode())
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    def get(self, cache_key):
+        """Возвращает эмбеддинг из кэша или None"""
+        blob = get_cached_embedding(cache_key)
+        with self._lock:
+            if blob is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return np.frombuffer(blob, dtype=np.float32).copy()
+
+    def put(self, cache_key, embedding):
+        """Сохраняет эмбеддинг в кэш"""
+        evicted = put_cached_embedding(cache_key, np.asarray(embedding, dtype=np.float32).tobytes(), self.max_entries)
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+            logger.info(f"Из кэша эмбеддингов вытеснено записей: {evicted}")
+
+    def stats(self):
+        """Метрики кэша: попадания, промахи и текущий размер"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": count_cached_embeddings(),
+            "max_entries": self.max_entries,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Возвращает кэш эмбеддингов текущего процесса"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
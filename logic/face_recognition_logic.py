@@ -1,19 +1,99 @@
+import logging
+
 import cv2
 import numpy as np
-from deepface.DeepFace import build_model
 from deepface.detectors import FaceDetector
 from datetime import datetime
 
+from logic.batching import DEFAULT_BATCH_SIZE, EmbeddingBatcher, embed_faces, prepare_face
+from logic.detection_scale import DETECTION_MIN_FACE, DETECTION_REFINE, DETECTION_SCALE, ScaledDetector, parse_scale
+from logic.detector_cascade import PREFILTER_BACKEND, PREFILTER_MODE, DetectorCascade
+from logic.embedding_cache import ALIGNMENT_VERSION, get_embedding_cache
+from logic.face_tracking import DEFAULT_REFRESH_INTERVAL, FaceTrack, FaceTracker
+from logic.frame_sampling import FrameSampler
+from logic.gallery_index import GALLERY_INDEX, create_gallery_index
+from logic.model_registry import get_registry
+from logic.motion_gate import MOTION_GATE, MOTION_THRESHOLD, MotionGate
+from logic.progress import ProgressReporter
+from logic.result_writer import ResultLog
+from logic.video_pipeline import DEFAULT_DETECT_WORKERS, DEFAULT_QUEUE_SIZE, FramePipeline
+
+logger = logging.getLogger(__name__)
+
 
 class FaceRecognitionLogic:
-    def __init__(self):
-        self.threshold = 0.6
+    def __init__(self, registry=None, threshold=0.6, batch_size=DEFAULT_BATCH_SIZE, embedding_cache=None,
+                 detect_workers=DEFAULT_DETECT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                 tracking=True, track_refresh_interval=DEFAULT_REFRESH_INTERVAL, gallery_kind=GALLERY_INDEX,
+                 prefilter=PREFILTER_BACKEND, prefilter_mode=PREFILTER_MODE,
+                 detection_scale=DETECTION_SCALE, min_face_size=DETECTION_MIN_FACE, detection_refine=DETECTION_REFINE,
+                 motion_gate=MOTION_GATE, motion_threshold=MOTION_THRESHOLD, inference_backend=None):
+        """
+        Легковесный распознаватель одной задачи: собственные эталоны, порог и счетчики,
+        модели берутся из общего реестра процесса
+
+        Args:
+            registry (ModelRegistry, optional): Реестр моделей, по умолчанию общий реестр процесса
+                для inference_backend
+            threshold (float, optional): Порог уверенности совпадения (0..1)
+            batch_size (int, optional): Максимальное количество лиц в одном вызове модели
+            embedding_cache (EmbeddingCache, optional): Кэш эмбеддингов эталонов, по умолчанию общий;
+                False отключает кэш
+            detect_workers (int, optional): Количество потоков детекции в конвейере; вызовы RetinaFace
+                сериализуются блокировкой реестра, параллельно идут только предфильтр и масштабирование
+            queue_size (int, optional): Ограничение очереди кадров между стадиями конвейера
+            tracking (bool, optional): Переиспользовать результат для лица, которое ведет трекер
+            track_refresh_interval (int, optional): Через сколько обработанных кадров пересчитывать эмбеддинг трека
+            gallery_kind (str, optional): Индекс эталонов: exact, ivf, hnsw или auto (по количеству эталонов)
+            prefilter (str, optional): Быстрый детектор перед RetinaFace: none, haar, ssd или yunet
+            prefilter_mode (str, optional): frame - RetinaFace на всем кадре с кандидатами,
+                roi - только на областях вокруг кандидатов
+            detection_scale (float или str, optional): Масштаб кадра для детекции в (0, 1] или auto
+                (по min_face_size); мелкие лица уточняются в исходном разрешении
+            min_face_size (int, optional): Самое маленькое нужное лицо в пикселях исходного кадра
+            detection_refine (str, optional): Повторная детекция лиц в исходном разрешении при масштабе < 1:
+                auto (только мелких лиц), always или never
+            motion_gate (str, optional): Отсев кадров без изменений сцены: none, diff, hist или phash
+            motion_threshold (float, optional): Порог изменения сцены, по умолчанию свой для метода
+            inference_backend (str, optional): Бэкенд эмбеддингов: tf или onnx (по умолчанию INFERENCE_BACKEND)
+        """
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.detect_workers = detect_workers
+        self.queue_size = queue_size
+        self.tracking = tracking
+        self.track_refresh_interval = track_refresh_interval
         self.frame_counter = 0
+        self.frames_gated = 0        # Сколько кадров выборки отсеяно без детекции
+        self.last_run_stats = {}
         self.target_embeddings = {}  # Словарь для хранения эмбеддингов лиц {image_id: embedding}
         self.target_names = {}       # Словарь для хранения имен лиц {image_id: name}
-        self.model = build_model("Facenet")
-        self.detector_backend = "retinaface"
-        self.detector_func = FaceDetector.build_model(self.detector_backend)
+        self.gallery_kind = gallery_kind
+        self.prefilter = prefilter or "none"
+        self.prefilter_mode = prefilter_mode or PREFILTER_MODE
+        self.detection_scale = parse_scale(detection_scale)
+        self.min_face_size = min_face_size
+        self.detection_refine = detection_refine
+        self.motion_gate = motion_gate or "none"
+        self.motion_threshold = float(motion_threshold) if motion_threshold not in (None, "") else None
+        self.gallery = None          # Индекс эталонов для поиска, строится лениво и дальше обновляется
+        self.registry = registry or get_registry(inference_backend)
+        self.model, self.detector_func = self.registry.acquire()
+        self.detector_backend = self.registry.detector_backend
+        self.embedding_cache = get_embedding_cache() if embedding_cache is None else embedding_cache
+
+    def _detect_reference_face(self, image_bytes, image_path):
+        """Находит лицо на эталонном изображении и возвращает его выровненный фрагмент"""
+        img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"Не удалось прочитать изображение: {image_path}")
+
+        with self.registry.detector_lock:
+            faces = FaceDetector.detect_faces(self.detector_func, self.detector_backend, img, align=True)
+        if not faces:
+            raise ValueError(f"Лицо не найдено в изображении: {image_path}")
+
+        return faces[0][0]
 
     def add_target_image(self, image_path, image_id, name=None):
         """
@@ -24,101 +104,402 @@ class FaceRecognitionLogic:
             image_id (str): Уникальный идентификатор изображения
             name (str, optional): Имя или метка для изображения
         """
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError(f"Не удалось прочитать изображение: {image_path}")
+        errors = self.add_target_images([{"path": image_path, "id": image_id, "name": name}])
+        if image_id in errors:
+            raise errors[image_id]
 
-        faces = FaceDetector.detect_faces(self.detector_func, self.detector_backend, img, align=True)
-        if not faces:
-            raise ValueError(f"Лицо не найдено в изображении: {image_path}")
+        return True
 
-        face_img = faces[0][0][0] if isinstance(faces[0][0], tuple) else faces[0][0]
-        face_img = cv2.resize(face_img, (160, 160)).astype("float32") / 255
-        face_img = np.expand_dims(face_img, axis=0)
-        embedding = self.model.predict(face_img)[0]
+    def add_target_images(self, images):
+        """
+        Добавляет несколько эталонных изображений
 
-        self.target_embeddings[image_id] = embedding
-        self.target_names[image_id] = name if name else f"Лицо {image_id}"
+        Эмбеддинги уже встречавшихся изображений берутся из кэша по хешу содержимого,
+        остальные считаются одним пакетом и сохраняются в кэш.
 
-        return True
+        Args:
+            images (list): Список словарей {"path": ..., "id": ..., "name": ...}
+
+        Returns:
+            dict: Ошибки по изображениям {image_id: исключение}
+        """
+        errors = {}
+        prepared = []
+        for image in images:
+            try:
+                with open(image["path"], "rb") as f:
+                    image_bytes = f.read()
+
+                cache_key = None
+                if self.embedding_cache:
+                    cache_key = self.embedding_cache.make_key(image_bytes, self.registry.model_key, self.detector_backend)
+                    embedding = self.embedding_cache.get(cache_key)
+                    if embedding is not None:
+                        self._set_target(image, embedding)
+                        continue
+
+                face = prepare_face(self._detect_reference_face(image_bytes, image["path"]))
+                prepared.append((image, cache_key, face))
+            except Exception as e:
+                errors[image["id"]] = e
+
+        if prepared:
+            embeddings = embed_faces(self.model, [face for _, _, face in prepared], self.batch_size)
+            for (image, cache_key, _), embedding in zip(prepared, embeddings):
+                self._set_target(image, embedding)
+                if cache_key:
+                    self.embedding_cache.put(cache_key, embedding)
+
+        return errors
+
+    def add_target_embeddings(self, targets, embeddings):
+        """
+        Добавляет эталоны с готовыми эмбеддингами (например, из сохраненной галереи) без детекции и инференса
+
+        Args:
+            targets (list): Список словарей {"id": ..., "name": ...}
+            embeddings (np.ndarray): Матрица эмбеддингов (len(targets), dim) в том же порядке
+        """
+        for target, embedding in zip(targets, embeddings):
+            self.target_embeddings[target["id"]] = embedding
+            self.target_names[target["id"]] = target.get("name") or f"Лицо {target['id']}"
+        if self.gallery is not None and len(targets):
+            self.gallery.add([target["id"] for target in targets], embeddings)
+
+    def _set_target(self, image, embedding):
+        self.target_embeddings[image["id"]] = embedding
+        self.target_names[image["id"]] = image.get("name") or f"Лицо {image['id']}"
+        if self.gallery is not None:
+            self.gallery.add([image["id"]], [embedding])
+
+    def remove_target(self, image_id):
+        """Удаляет эталон из набора и из индекса"""
+        self.target_embeddings.pop(image_id, None)
+        self.target_names.pop(image_id, None)
+        if self.gallery is not None:
+            self.gallery.remove([image_id])
 
     def clear_targets(self):
         """Очищает все целевые изображения"""
         self.target_embeddings = {}
         self.target_names = {}
+        self.gallery = None
+
+    def _get_gallery(self):
+        """Возвращает индекс эталонов; при первом обращении строит его по всем эталонам одним пакетом"""
+        if self.gallery is None:
+            ids = list(self.target_embeddings.keys())
+            embeddings = np.array([self.target_embeddings[i] for i in ids], dtype=np.float32)
+            self.gallery = create_gallery_index(embeddings.shape[1], self.gallery_kind, len(ids))
+            self.gallery.add(ids, embeddings)
+        return self.gallery
 
-    def recognize_in_video(self, video_path) -> str:
+    def set_gallery_index(self, index, indexed_ids):
+        """
+        Использует готовый индекс эталонов (например, сохраненный для галереи) вместо построения при первом поиске
+
+        Args:
+            index (GalleryIndex): Индекс; дальше он обновляется вместе с набором эталонов
+            indexed_ids (iterable): ID эталонов, уже находящихся в индексе; остальные эталоны добавляются в него
+        """
+        indexed_ids = set(indexed_ids)
+        missing = [i for i in self.target_embeddings if i not in indexed_ids]
+        if missing:
+            index.add(missing, np.array([self.target_embeddings[i] for i in missing], dtype=np.float32))
+        self.gallery = index
+
+    def match_embeddings(self, embeddings):
+        """
+        Сопоставляет пакет эмбеддингов с эталонами через индекс эталонов
+        (точный - одно матричное умножение, для больших наборов - приближенный поиск)
+
+        Args:
+            embeddings (np.ndarray): Матрица эмбеддингов (n, dim)
+
+        Returns:
+            list: [(image_id или None, уверенность в процентах)] для каждого эмбеддинга
+        """
+        if len(embeddings) == 0 or not self.target_embeddings:
+            return [(None, 0)] * len(embeddings)
+
+        ids, similarities = self._get_gallery().search(embeddings)
+
+        # Косинусное сходство; уверенность = 100 - расстояние * 100 = сходство * 100
+        return [
+            (image_id, float(similarity * 100)) if image_id is not None and similarity * 100 > self.threshold * 100
+            else (None, 0)
+            for image_id, similarity in zip(ids, similarities)
+        ]
+
+    def _write_match(self, result_log, frame_number, timestamp, area, track_id, match):
+        """Записывает совпадение в лог; возвращает 1, если лицо опознано, иначе 0"""
+        best_match_id, best_confidence = match
+        if not best_match_id:
+            return 0
+
+        name = self.target_names[best_match_id]
+        log_line = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]} - В момент {timestamp} сек: обнаружено лицо '{name}' с уверенностью {round(best_confidence, 2)}%"
+        print(log_line)
+        result_log.append(log_line)
+        result_log.add_detection({
+            "frame": frame_number,
+            "timestamp": timestamp,
+            "image_id": best_match_id,
+            "name": name,
+            "confidence": round(best_confidence, 2),
+            "box": [int(v) for v in area],
+            "track": track_id,
+        })
+        return 1
+
+    def _flush_batch(self, batcher, pending, result_log, frame_index=None):
+        """
+        Считает эмбеддинги накопленного пакета и записывает совпадения в лог
+
+        pending хранит все лица (и ошибки кадров) в порядке кадров: лица с новым эмбеддингом
+        сопоставляются с эталонами, для остальных берется последний результат их трека.
+        Если передан frame_index, эмбеддинги и лица дописываются в индекс видео
+        (у трека хранится строка его последнего эмбеддинга).
+        Возвращает количество записанных совпадений.
+        """
+        try:
+            results = batcher.flush()
+        except Exception as e:
+            error_msg = f"Ошибка обработки пакета лиц: {str(e)}"
+            print(error_msg)
+            result_log.append(error_msg)
+            results = None
+
+        embeddings = np.stack([embedding for _, embedding in results]) if results else None
+        matches = iter(self.match_embeddings(embeddings) if results else [])
+        rows = iter(())
+        if frame_index is not None:
+            if results is None or any(isinstance(entry, str) for entry in pending):
+                frame_index.failed = True
+            elif results and not frame_index.failed:
+                first = frame_index.add_embeddings(embeddings)
+                rows = iter(range(first, first + len(results)))
+
+        detections = 0
+        for entry in pending:
+            if isinstance(entry, str):
+                result_log.append(entry)
+                continue
+
+            frame_number, timestamp, area, track, needs_embedding = entry
+            track_id = track.track_id if track else None
+            if needs_embedding:
+                if results is None:
+                    continue
+                match = next(matches)
+                if track:
+                    track.match = match
+                row = next(rows, None)
+                if track and row is not None:
+                    track.index_row = row
+            else:
+                match = track.match
+                row = track.index_row
+
+            if frame_index is not None and row is not None:
+                frame_index.add_detection(frame_number, timestamp, area, track_id, row)
+
+            # Если найдено совпадение, записываем в лог
+            detections += self._write_match(result_log, frame_number, timestamp, area, track_id, match)
+
+        pending.clear()
+        return detections
+
+    def _detect_faces(self, frame):
+        with self.registry.detector_lock:
+            return FaceDetector.detect_faces(self.detector_func, self.detector_backend, frame, align=True)
+
+    def embedding_settings(self):
+        """Настройки, от которых зависят эмбеддинги эталонов (модель, детектор и выравнивание)"""
+        return {
+            "model": self.registry.model_key,
+            "detector": self.detector_backend,
+            "alignment": ALIGNMENT_VERSION,
+        }
+
+    def result_settings(self):
+        """Настройки распознавателя, от которых зависит отчет (входят в ключ кэша результатов)"""
+        return {
+            **self.embedding_settings(),
+            "threshold": self.threshold,
+            "gallery": self.gallery_kind,
+            "prefilter": [self.prefilter, self.prefilter_mode] if self.prefilter != "none" else None,
+            "detection_scale": [self.detection_scale, self.min_face_size, self.detection_refine]
+            if self.detection_scale != 1.0 else None,
+            "motion_gate": [self.motion_gate, self.motion_threshold] if self.motion_gate != "none" else None,
+            "tracking": self.tracking,
+            "track_refresh_interval": self.track_refresh_interval if self.tracking else None,
+        }
+
+    def write_report_header(self, result_log):
+        """Заголовок отчета с информацией о задаче"""
+        result_log.append(f"Отчет о распознавании лиц от {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        result_log.append(f"Количество искомых лиц: {len(self.target_embeddings)}")
+        result_log.append("-" * 50)
+
+    def write_report_footer(self, result_log):
+        """Итоговая информация отчета"""
+        result_log.append("-" * 50)
+        result_log.append(f"Обработка завершена. Всего обработано {self.frame_counter} кадров.")
+        if self.frames_gated:
+            result_log.append(f"Кадров без изменений сцены, пропущенных без детекции: {self.frames_gated}.")
+
+    def recognize_in_video(self, video_path, sampler=None, result_log=None, on_progress=None, frame_index=None,
+                           summary=True, first_track_id=1):
         """
         Распознает лица в видео и возвращает лог распознавания
 
+        Декодирование и детекция выполняются конвейером в отдельных потоках,
+        найденные лица накапливаются и прогоняются через модель пакетами по batch_size штук.
+        Лица, которые трекер связал с уже распознанным треком, повторно не эмбеддятся.
+        Для кадров, которые отсев отбросил как не изменившиеся, повторяется результат
+        последней детекции (при включенном трекинге - без нового эмбеддинга).
+        Статистика стадий сохраняется в last_run_stats. Если передан StreamingResultLog,
+        строки отчета пишутся в файл по мере обработки и в памяти не накапливаются.
+
         Args:
             video_path (str): Путь к видеофайлу
+            sampler (FrameSampler, optional): Выборка кадров, по умолчанию каждый 5-й кадр
+            result_log (ResultLog, optional): Куда писать отчет, по умолчанию в память
+            on_progress (callable, optional): Получает словарь с ходом обработки (кадры, совпадения, ETA)
+            frame_index (FrameIndexWriter, optional): Куда сохранить эмбеддинги всех найденных лиц
+                для повторных запросов с другими эталонами
+            summary (bool, optional): Писать заголовок и итог отчета; отрезки видео, которые потом
+                склеиваются в один отчет, пишут только совпадения
+            first_track_id (int, optional): Номер первого трека (у отрезков одного видео номера не пересекаются)
 
         Returns:
-            str: Лог распознавания
+            str: Лог распознавания (None при потоковой записи)
         """
+        result_log = result_log if result_log is not None else ResultLog()
         if not self.target_embeddings:
-            return "Ошибка: не добавлено ни одного эталонного лица"
+            result_log.append("Ошибка: не добавлено ни одного эталонного лица")
+            return result_log.getvalue()
 
+        sampler = sampler or FrameSampler()
         cap = cv2.VideoCapture(video_path)
-        log_lines = []
+        # Детекция на уменьшенном кадре, мелкие лица уточняются в исходном разрешении
+        scaled = ScaledDetector(self._detect_faces, self.detection_scale, self.min_face_size, self.detection_refine) \
+            if self.detection_scale != 1.0 else None
+        detect = scaled or self._detect_faces
+        # Каскад: RetinaFace запускается только на кадрах (или областях), где предфильтр нашел кандидатов
+        cascade = DetectorCascade(detect, self.prefilter, self.prefilter_mode) if self.prefilter != "none" else None
+        pipeline = FramePipeline(cascade or detect, self.detect_workers, self.queue_size)
+        # Отсев кадров без изменений сцены: такие кадры не идут на детекцию
+        gate = MotionGate(self.motion_gate, self.motion_threshold) if self.motion_gate != "none" else None
+        frames = gate.frames(sampler.frames(cap)) if gate else sampler.frames(cap)
+        batcher = EmbeddingBatcher(self.model, self.batch_size)
+        tracker = FaceTracker(refresh_interval=self.track_refresh_interval, first_id=first_track_id) \
+            if self.tracking else None
+        pending = []
+        faces_reused = 0
+        detections = 0
+        last_faces = []
+        last_tracked = []
+        # Для отрезка видео ход обработки считается в кадрах отрезка
+        first_frame = sampler.start_frame
+        last_frame = sampler.end_frame if sampler.end_frame is not None else cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        progress = ProgressReporter(on_progress, last_frame - first_frame) if on_progress else None
 
         # Добавляем заголовок с информацией о задаче
-        log_lines.append(f"Отчет о распознавании лиц от {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        log_lines.append(f"Количество искомых лиц: {len(self.target_embeddings)}")
-        log_lines.append("-" * 50)
+        if summary:
+            self.write_report_header(result_log)
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        stages = pipeline.run(frames)
+        try:
+            for frame_number, timestamp, faces in stages:
+                if isinstance(faces, Exception):
+                    error_msg = f"Ошибка обработки кадра {frame_number}: {str(faces)}"
+                    print(error_msg)
+                    pending.append(error_msg)
+                    continue
+                gated = faces is None
+                if gated:
+                    # Сцена не изменилась: лица те же, что в последнем кадре с детекцией
+                    faces = last_faces
+                last_faces = faces
 
-            self.frame_counter += 1
-            if self.frame_counter % 5 != 0:  # Обрабатываем каждый 5-й кадр для оптимизации
-                continue
+                if tracker:
+                    tracked = tracker.update([area for _, area in faces])
+                elif gated:
+                    # Без трекинга повторяется результат лиц последнего кадра с детекцией, без эмбеддинга
+                    tracked = [(face, False) for face, _ in last_tracked]
+                else:
+                    # Лицо без трека: FaceTrack без номера только хранит результат для отсеянных кадров
+                    tracked = [(FaceTrack(None, area, 0), True) for _, area in faces]
+                last_tracked = tracked
 
-            try:
-                # Получаем текущую позицию в секундах
-                timestamp = round(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, 2)
-
-                faces = FaceDetector.detect_faces(self.detector_func, self.detector_backend, frame, align=True)
-                for face, area in faces:
-                    face = face[0] if isinstance(face, tuple) else face
-                    resized = cv2.resize(face, (160, 160)).astype("float32") / 255
-                    resized = np.expand_dims(resized, axis=0)
-                    embedding = self.model.predict(resized)[0]
-
-                    # Сравниваем со всеми целевыми лицами
-                    best_match_id = None
-                    best_confidence = 0
-
-                    for image_id, target_embedding in self.target_embeddings.items():
-                        distance = self.cosine_distance(target_embedding, embedding)
-                        confidence = 100 - distance * 100
-
-                        # Если уверенность выше порога и лучше предыдущих совпадений
-                        if confidence > self.threshold * 100 and confidence > best_confidence:
-                            best_match_id = image_id
-                            best_confidence = confidence
-
-                    # Если найдено совпадение, записываем в лог
-                    if best_match_id:
-                        name = self.target_names[best_match_id]
-                        log_line = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]} - В момент {timestamp} сек: обнаружено лицо '{name}' с уверенностью {round(best_confidence, 2)}%"
-                        print(log_line)
-                        log_lines.append(log_line)
-            except Exception as e:
-                error_msg = f"Ошибка обработки кадра {self.frame_counter}: {str(e)}"
-                print(error_msg)
-                log_lines.append(error_msg)
+                for (face, area), (track, needs_embedding) in zip(faces, tracked):
+                    if needs_embedding:
+                        batcher.add(face, (frame_number, timestamp, area))
+                    else:
+                        faces_reused += 1
+                    pending.append((frame_number, timestamp, area, track, needs_embedding))
+
+                if batcher.is_full or len(pending) >= self.batch_size * 4:
+                    detections += self._flush_batch(batcher, pending, result_log, frame_index)
+                if progress:
+                    progress.update(frame_number - first_frame, detections)
+        finally:
+            # Сначала останавливается поток декодирования: он может быть внутри cap.grab()
+            stages.close()
+            cap.release()
+            self.frame_counter += sampler.frames_seen - first_frame
+            if gate:
+                self.frames_gated += gate.frames_gated
+        detections += self._flush_batch(batcher, pending, result_log, frame_index)
+        if progress:
+            progress.update(sampler.frames_seen - first_frame, detections, done=True)
 
-        cap.release()
+        self.last_run_stats = dict(pipeline.stats(), **batcher.stats(), faces_reused=faces_reused)
+        for stage in (scaled, cascade, gate):
+            if stage:
+                self.last_run_stats.update(stage.stats())
+        logger.info(f"Статистика конвейера распознавания: {self.last_run_stats}")
 
         # Добавляем итоговую информацию
-        log_lines.append("-" * 50)
-        log_lines.append(f"Обработка завершена. Всего обработано {self.frame_counter} кадров.")
+        if summary:
+            self.write_report_footer(result_log)
+
+        return result_log.getvalue()
+
+    def recognize_from_index(self, index, result_log=None):
+        """
+        Отвечает на задачу по сохраненному индексу лиц видео без декодирования и инференса
+
+        Все сохраненные эмбеддинги сопоставляются с эталонами матричным умножением,
+        затем лица перебираются в порядке кадров; отчет совпадает по формату с recognize_in_video.
+
+        Args:
+            index (FrameIndex): Индекс лиц видео
+            result_log (ResultLog, optional): Куда писать отчет, по умолчанию в память
+
+        Returns:
+            str: Лог распознавания (None при потоковой записи)
+        """
+        result_log = result_log if result_log is not None else ResultLog()
+        if not self.target_embeddings:
+            result_log.append("Ошибка: не добавлено ни одного эталонного лица")
+            return result_log.getvalue()
+
+        self.write_report_header(result_log)
+
+        matches = index.match(self.match_embeddings)
+        for detection in index.detections:
+            self._write_match(
+                result_log, int(detection["frame"]), float(detection["timestamp"]), detection["box"],
+                int(detection["track"]) or None, matches[detection["row"]]
+            )
+
+        self.frame_counter += index.frames_seen
+        self.write_report_footer(result_log)
 
-        return "\n".join(log_lines)
+        return result_log.getvalue()
 
     def cosine_distance(self, emb1, emb2):
         """Рассчитывает косинусное расстояние между двумя векторами признаков"""
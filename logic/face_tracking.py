@@ -0,0 +1,101 @@
+import itertools
+
+DEFAULT_IOU_THRESHOLD = 0.3     # Минимальное перекрытие рамок для продолжения трека
+DEFAULT_MOVE_IOU = 0.5          # Если рамка сместилась сильнее (IoU ниже), эмбеддинг пересчитывается
+DEFAULT_REFRESH_INTERVAL = 25   # Пересчитывать эмбеддинг трека раз в столько обработанных кадров
+DEFAULT_MAX_MISSED = 2          # Трек удаляется после стольких обработанных кадров без лица
+
+
+def box_iou(a, b):
+    """IoU двух рамок в формате [x, y, w, h]"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class FaceTrack:
+    """Трек одного лица между кадрами с последним результатом сопоставления"""
+
+    def __init__(self, track_id, box, step):
+        self.track_id = track_id
+        self.box = box
+        self.last_seen = step
+        self.embedded_box = box   # Рамка, по которой считался последний эмбеддинг
+        self.embedded_step = step
+        self.match = (None, 0)    # (image_id или None, уверенность)
+        self.index_row = None     # Строка последнего эмбеддинга в индексе лиц видео
+
+
+class FaceTracker:
+    """
+    Трекер лиц по перекрытию рамок (IoU) между обрабатываемыми кадрами.
+
+    Пока лицо остается в треке, эмбеддинг пересчитывается только для нового трека,
+    при заметном смещении рамки или раз в refresh_interval кадров; в остальных
+    кадрах используется последний результат сопоставления трека.
+    """
+
+    def __init__(self, iou_threshold=DEFAULT_IOU_THRESHOLD, move_iou=DEFAULT_MOVE_IOU,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL, max_missed=DEFAULT_MAX_MISSED, first_id=1):
+        self.iou_threshold = iou_threshold
+        self.move_iou = move_iou
+        self.refresh_interval = refresh_interval
+        self.max_missed = max_missed
+        self.tracks = []
+        self._ids = itertools.count(first_id)  # Отрезки одного видео нумеруют треки с разных значений
+        self._step = 0
+
+    def update(self, boxes):
+        """
+        Сопоставляет рамки очередного обрабатываемого кадра с треками
+
+        Args:
+            boxes (list): Рамки лиц [x, y, w, h]
+
+        Returns:
+            list: [(FaceTrack, нужен_ли_эмбеддинг)] в порядке рамок
+        """
+        self._step += 1
+        step = self._step
+
+        # Жадное сопоставление по убыванию IoU
+        pairs = sorted(
+            ((box_iou(track.box, box), t, b) for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True,
+        )
+        assigned = {}
+        used_tracks = set()
+        for overlap, t, b in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in used_tracks or b in assigned:
+                continue
+            used_tracks.add(t)
+            assigned[b] = self.tracks[t]
+
+        result = []
+        for b, box in enumerate(boxes):
+            track = assigned.get(b)
+            if track is None:
+                track = FaceTrack(next(self._ids), box, step)
+                self.tracks.append(track)
+                needs_embedding = True
+            else:
+                needs_embedding = (
+                    box_iou(track.embedded_box, box) < self.move_iou
+                    or step - track.embedded_step >= self.refresh_interval
+                )
+            track.box = box
+            track.last_seen = step
+            if needs_embedding:
+                track.embedded_box = box
+                track.embedded_step = step
+            result.append((track, needs_embedding))
+
+        self.tracks = [track for track in self.tracks if step - track.last_seen <= self.max_missed]
+        return result
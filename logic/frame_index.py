@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+FRAME_INDEX_DIR = os.environ.get("FRAME_INDEX_DIR", os.path.join("results", "index"))
+SEARCH_CHUNK_ROWS = 65536  # Поиск по индексу идет блоками, чтобы не поднимать в память весь memmap
+
+# Метаданные каждого найденного лица: кадр, время, рамка, трек и строка эмбеддинга в матрице.
+# Лица, для которых трекер переиспользовал результат, ссылаются на последний эмбеддинг своего трека.
+DETECTION_DTYPE = np.dtype([
+    ("frame", "<i4"),
+    ("timestamp", "<f8"),
+    ("box", "<i4", (4,)),
+    ("track", "<i4"),
+    ("row", "<i4"),
+])
+
+
+def make_index_key(video_sha256, settings):
+    """Ключ индекса: видео и настройки, от которых зависят найденные лица и их эмбеддинги"""
+    digest = hashlib.sha256()
+    digest.update(video_sha256.encode())
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class FrameIndexWriter:
+    """
+    Запись индекса лиц видео во время распознавания.
+
+    Эмбеддинги дописываются в файл float32 по мере расчета пакетов, метаданные лиц
+    копятся в памяти (несколько десятков байт на лицо) и сохраняются в finish().
+    Файлы пишутся под временными именами и переименовываются только после успешной
+    обработки всего видео.
+    """
+
+    def __init__(self, path_prefix):
+        self.path_prefix = path_prefix
+        self.embeddings_path = path_prefix + ".f32"
+        self.detections_path = path_prefix + ".meta.npy"
+        os.makedirs(os.path.dirname(path_prefix) or ".", exist_ok=True)
+        self._embeddings_file = open(self.embeddings_path + ".tmp", "wb")
+        self._detections = []
+        self.rows = 0
+        self.dim = None
+        self.failed = False  # Ошибки кадров или пакетов: индекс неполон и не сохраняется
+
+    def add_embeddings(self, embeddings):
+        """Дописывает пакет эмбеддингов, возвращает номер первой строки пакета"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.dim = embeddings.shape[1]
+        first = self.rows
+        self._embeddings_file.write(embeddings.tobytes())
+        self.rows += len(embeddings)
+        return first
+
+    def add_detection(self, frame_number, timestamp, box, track_id, row):
+        self._detections.append((frame_number, timestamp, [int(v) for v in box], track_id or 0, row))
+
+    def finish(self, frames_seen):
+        """
+        Сохраняет индекс
+
+        Returns:
+            dict: Описание индекса (путь, количество эмбеддингов и лиц, размерность) или None
+        """
+        self._embeddings_file.close()
+        if self.failed or self.dim is None:
+            self.abort()
+            return None
+
+        with open(self.detections_path + ".tmp", "wb") as f:
+            np.save(f, np.array(self._detections, dtype=DETECTION_DTYPE))
+        os.replace(self.embeddings_path + ".tmp", self.embeddings_path)
+        os.replace(self.detections_path + ".tmp", self.detections_path)
+        return {
+            "path": self.path_prefix,
+            "embeddings": self.rows,
+            "detections": len(self._detections),
+            "dim": self.dim,
+            "frames_seen": frames_seen,
+        }
+
+    def abort(self):
+        self._embeddings_file.close()
+        for path in (self.embeddings_path + ".tmp", self.detections_path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class FrameIndex:
+    """Сохраненный индекс лиц видео: эмбеддинги через memmap и метаданные лиц"""
+
+    def __init__(self, path_prefix, embeddings, dim, frames_seen):
+        self.path_prefix = path_prefix
+        self.frames_seen = frames_seen
+        self.embeddings = np.memmap(path_prefix + ".f32", dtype=np.float32, mode="r", shape=(embeddings, dim)) \
+            if embeddings else np.zeros((0, dim), dtype=np.float32)
+        self.detections = np.load(path_prefix + ".meta.npy")
+
+    @classmethod
+    def open(cls, entry):
+        """Открывает индекс по записи из базы; None, если файлы пропали"""
+        if not os.path.exists(entry["path"] + ".f32") or not os.path.exists(entry["path"] + ".meta.npy"):
+            return None
+        return cls(entry["path"], entry["embeddings"], entry["dim"], entry["frames_seen"])
+
+    def match(self, match_embeddings):
+        """
+        Сопоставляет все сохраненные эмбеддинги с эталонами
+
+        Args:
+            match_embeddings (callable): Сопоставление пакета эмбеддингов, как FaceRecognitionLogic.match_embeddings
+
+        Returns:
+            list: [(image_id или None, уверенность)] для каждой строки матрицы эмбеддингов
+        """
+        matches = []
+        for start in range(0, len(self.embeddings), SEARCH_CHUNK_ROWS):
+            matches.extend(match_embeddings(np.asarray(self.embeddings[start:start + SEARCH_CHUNK_ROWS])))
+        return matches
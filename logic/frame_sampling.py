@@ -0,0 +1,87 @@
+import cv2
+
+DEFAULT_FRAME_STRIDE = 5       # Обрабатываем каждый 5-й кадр
+SEEK_STRIDE_THRESHOLD = 50     # С такого шага выгоднее позиционирование, чем пропуск через grab()
+
+
+class FrameSampler:
+    """
+    Выборка кадров из видео по шагу в кадрах или по частоте в кадрах в секунду.
+
+    Пропускаемые кадры только захватываются через cap.grab() без декодирования в изображение,
+    cap.retrieve() вызывается лишь для кадров, которые пойдут на детекцию. При большом шаге
+    и seek=True используется позиционирование по номеру кадра.
+    """
+
+    def __init__(self, stride=None, fps=None, seek=False, start_frame=0, end_frame=None):
+        """
+        Args:
+            stride (int, optional): Обрабатывать каждый stride-й кадр
+            fps (float, optional): Обрабатывать столько кадров на секунду видео (приоритетнее stride)
+            seek (bool, optional): Разрешить позиционирование при большом шаге на длинных файлах
+            start_frame (int, optional): Начало обрабатываемого отрезка видео (индекс кадра с 0)
+            end_frame (int, optional): Конец отрезка (не включая), по умолчанию до конца видео
+        """
+        self.stride = stride or DEFAULT_FRAME_STRIDE
+        self.fps = fps
+        self.seek = seek
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.frames_seen = 0  # Сколько кадров видео пройдено
+
+    def resolve_stride(self, video_fps):
+        """Шаг выборки в кадрах для видео с частотой video_fps"""
+        if self.fps and video_fps:
+            return max(1, int(round(video_fps / self.fps)))
+        return max(1, int(self.stride))
+
+    def settings(self):
+        """Параметры выборки, от которых зависит результат"""
+        return {"stride": self.stride, "fps": self.fps, "seek": self.seek}
+
+    def frames(self, cap):
+        """
+        Выдает выбранные кадры
+
+        Для отрезка видео выбираются те же кадры, что и при обработке видео целиком
+        (номера кратны шагу), поэтому результаты отрезков совпадают с результатом всего видео.
+
+        Args:
+            cap (cv2.VideoCapture): Открытое видео
+
+        Yields:
+            tuple: (номер кадра с 1, время в секундах, кадр)
+        """
+        stride = self.resolve_stride(cap.get(cv2.CAP_PROP_FPS))
+        use_seek = self.seek and stride >= SEEK_STRIDE_THRESHOLD
+        index = self.start_frame - 1  # Индекс последнего захваченного кадра
+        if self.start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+            self.frames_seen = self.start_frame
+
+        while cap.isOpened():
+            # Следующий кадр с номером, кратным шагу
+            target = ((index + 1) // stride + 1) * stride - 1
+            if self.end_frame is not None and target >= self.end_frame:
+                self.frames_seen = max(self.frames_seen, self.end_frame)
+                break
+            if use_seek:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                if not cap.grab():
+                    break
+                index = target
+                self.frames_seen = index + 1
+            else:
+                while index < target:
+                    if not cap.grab():
+                        return
+                    index += 1
+                    self.frames_seen = index + 1
+
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+
+            # Получаем текущую позицию в секундах
+            timestamp = round(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, 2)
+            yield index + 1, timestamp, frame
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from database.database import get_gallery_embeddings, get_gallery_updated_at, update_gallery_item
+from logic.gallery_index import create_gallery_index, load_gallery_index
+
+logger = logging.getLogger(__name__)
+
+# Построенные индексы галерей (HNSW/IVF) сохраняются, чтобы задачи не перестраивали их заново
+GALLERY_INDEX_DIR = os.environ.get("GALLERY_INDEX_DIR", os.path.join("results", "galleries"))
+
+
+def model_key(recognizer):
+    """Версия эмбеддингов эталонов: эмбеддинги другой модели или детектора в галерее не используются"""
+    return json.dumps(recognizer.embedding_settings(), sort_keys=True)
+
+
+def embed_gallery_items(recognizer, gallery_id, items):
+    """
+    Считает эмбеддинги новых эталонов галереи и сохраняет их в базу
+
+    Эталоны считаются одним пакетом (уже встречавшиеся изображения берутся из кэша эмбеддингов),
+    остальные эталоны галереи не пересчитываются. Загруженные изображения удаляются.
+
+    Args:
+        recognizer (FaceRecognitionLogic): Распознаватель с моделями воркера
+        gallery_id (str): ID галереи
+        items (list): [{"id": ..., "path": ..., "name": ...}]
+
+    Returns:
+        int: Количество эталонов, для которых сохранен эмбеддинг
+    """
+    key = model_key(recognizer)
+    ready = 0
+    try:
+        errors = recognizer.add_target_images(items)
+        for item in items:
+            if item["id"] in errors:
+                logger.error(f"Ошибка при добавлении эталона {item['id']} в галерею {gallery_id}: {errors[item['id']]}")
+                update_gallery_item(item["id"], "error", error=str(errors[item["id"]]))
+                continue
+
+            embedding = np.asarray(recognizer.target_embeddings[item["id"]], dtype=np.float32)
+            if update_gallery_item(item["id"], "ready", embedding.tobytes(), key):
+                ready += 1
+    finally:
+        for item in items:
+            if os.path.exists(item["path"]):
+                os.remove(item["path"])
+
+    logger.info(f"Галерея {gallery_id}: посчитано эмбеддингов {ready} из {len(items)}")
+    return ready
+
+
+def gallery_index_path(gallery_id, updated_at, key, kind):
+    """Каталог сохраненного индекса версии галереи: меняется при любом изменении набора эталонов"""
+    digest = hashlib.sha256(json.dumps([updated_at, key, kind]).encode()).hexdigest()[:32]
+    return os.path.join(GALLERY_INDEX_DIR, gallery_id, digest)
+
+
+def save_gallery_index(index, path):
+    """
+    Сохраняет индекс галереи и удаляет ее прежние версии
+
+    Индекс пишется во временный каталог и переименовывается целиком, поэтому другой воркер
+    никогда не видит его частично записанным.
+    """
+    gallery_dir = os.path.dirname(path)
+    os.makedirs(gallery_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp", dir=gallery_dir)
+    try:
+        index.save(os.path.join(tmp_dir, "index"))
+        os.rename(tmp_dir, path)
+    except OSError:
+        # Тот же индекс уже сохранил другой воркер
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+
+    for name in os.listdir(gallery_dir):
+        if name != os.path.basename(path) and not name.startswith(".tmp"):
+            shutil.rmtree(os.path.join(gallery_dir, name), ignore_errors=True)
+
+
+def get_gallery_index(recognizer, gallery_id, ids, embeddings, updated_at):
+    """
+    Индекс эталонов галереи: сохраненный для этой версии галереи или построенный заново
+
+    Точный индекс строится одним копированием матрицы и не сохраняется.
+    """
+    index = create_gallery_index(embeddings.shape[1], recognizer.gallery_kind, len(ids))
+    if index.kind == "exact" or updated_at is None:
+        index.add(ids, embeddings)
+        return index
+
+    path = gallery_index_path(gallery_id, updated_at, model_key(recognizer), index.kind)
+    if os.path.isdir(path):
+        try:
+            return load_gallery_index(os.path.join(path, "index"))
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке индекса галереи {gallery_id}, индекс строится заново: {e}")
+
+    index.add(ids, embeddings)
+    try:
+        save_gallery_index(index, path)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении индекса галереи {gallery_id}: {e}")
+    return index
+
+
+def load_gallery(recognizer, gallery_id):
+    """
+    Добавляет в распознаватель все готовые эталоны галереи одной матрицей, без детекции и инференса
+
+    Индекс эталонов для поиска берется сохраненный для текущей версии галереи,
+    эталоны задачи добавляются в него.
+
+    Returns:
+        int: Количество загруженных эталонов
+    """
+    # Версия читается до эталонов: эталон, готовый между двумя запросами, поменяет версию, и индекс перестроится
+    updated_at = get_gallery_updated_at(gallery_id)
+    rows = get_gallery_embeddings(gallery_id, model_key(recognizer))
+    if not rows:
+        return 0
+
+    targets = [{"id": item_id, "name": name} for item_id, name, _ in rows]
+    embeddings = np.frombuffer(b"".join(blob for _, _, blob in rows), dtype=np.float32).reshape(len(rows), -1)
+    ids = [target["id"] for target in targets]
+    if recognizer.gallery is not None:
+        recognizer.add_target_embeddings(targets, embeddings)
+        return len(rows)
+
+    index = get_gallery_index(recognizer, gallery_id, ids, embeddings, updated_at)
+    recognizer.add_target_embeddings(targets, embeddings)
+    recognizer.set_gallery_index(index, ids)
+    return len(rows)
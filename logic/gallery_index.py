@@ -0,0 +1,376 @@
+import json
+import os
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # ANN через HNSW необязателен, без него используется IVF на NumPy
+    hnswlib = None
+
+GALLERY_INDEX = os.environ.get("GALLERY_INDEX", "auto")                     # auto, exact, ivf, hnsw
+GALLERY_ANN_THRESHOLD = int(os.environ.get("GALLERY_ANN_THRESHOLD", 20000))  # С какого размера auto выбирает ANN
+SEARCH_CHUNK_ROWS = 4096
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms)
+
+
+class GalleryIndex:
+    """
+    Индекс эталонных эмбеддингов для поиска ближайшего эталона по косинусному сходству.
+
+    Эталоны адресуются строковыми ID, поддерживаются добавление и удаление по одному,
+    сохранение на диск и загрузка. search возвращает для каждого запроса лучший ID и сходство.
+    """
+
+    kind = None
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def add(self, ids, embeddings):
+        raise NotImplementedError
+
+    def remove(self, ids):
+        raise NotImplementedError
+
+    def search(self, queries):
+        """
+        Args:
+            queries (np.ndarray): Эмбеддинги (n, dim), нормировка не требуется
+
+        Returns:
+            tuple: (список ID или None для каждого запроса, np.ndarray сходств)
+        """
+        raise NotImplementedError
+
+    def save(self, path):
+        raise NotImplementedError
+
+    @classmethod
+    def load(cls, path):
+        raise NotImplementedError
+
+
+class ExactIndex(GalleryIndex):
+    """Точный поиск: нормированная матрица эталонов и одно матричное умножение на пакет запросов"""
+
+    kind = "exact"
+
+    def __init__(self, dim):
+        super().__init__(dim)
+        self._matrix = np.zeros((16, dim), dtype=np.float32)  # Емкость растет удвоением
+        self._ids = []
+        self._rows = {}  # {id: строка}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, ids, embeddings):
+        vectors = normalize(embeddings)
+        self.remove([i for i in ids if i in self._rows])
+        needed = len(self._ids) + len(ids)
+        if needed > len(self._matrix):
+            grown = np.zeros((max(needed, len(self._matrix) * 2), self.dim), dtype=np.float32)
+            grown[:len(self._ids)] = self._matrix[:len(self._ids)]
+            self._matrix = grown
+        start = len(self._ids)
+        self._matrix[start:start + len(ids)] = vectors
+        for offset, image_id in enumerate(ids):
+            self._rows[image_id] = start + offset
+            self._ids.append(image_id)
+
+    def remove(self, ids):
+        # Удаленная строка заменяется последней, матрица остается плотной
+        for image_id in ids:
+            row = self._rows.pop(image_id, None)
+            if row is None:
+                continue
+            last = len(self._ids) - 1
+            if row != last:
+                moved = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+            self._ids.pop()
+
+    def search(self, queries):
+        queries = normalize(queries)
+        if not self._ids:
+            return [None] * len(queries), np.zeros(len(queries), dtype=np.float32)
+
+        matrix = self._matrix[:len(self._ids)]
+        best = np.empty(len(queries), dtype=np.int64)
+        scores = np.empty(len(queries), dtype=np.float32)
+        for start in range(0, len(queries), SEARCH_CHUNK_ROWS):
+            similarities = queries[start:start + SEARCH_CHUNK_ROWS] @ matrix.T
+            chunk_best = similarities.argmax(axis=1)
+            best[start:start + len(chunk_best)] = chunk_best
+            scores[start:start + len(chunk_best)] = similarities[np.arange(len(chunk_best)), chunk_best]
+        return [self._ids[i] for i in best], scores
+
+    def save(self, path):
+        np.save(path + ".npy", self._matrix[:len(self._ids)])
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump({"kind": self.kind, "dim": self.dim, "ids": self._ids}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["dim"])
+        if meta["ids"]:
+            index.add(meta["ids"], np.load(path + ".npy"))
+        return index
+
+
+class IvfIndex(GalleryIndex):
+    """
+    Приближенный поиск IVF на чистом NumPy.
+
+    Эталоны раскладываются по nlist кластерам (k-means по эталонам, накопленным к моменту
+    обучения), каждый кластер - отдельный точный индекс. Запрос сравнивается только
+    с эталонами nprobe ближайших кластеров. Пока эталонов меньше train_size, поиск точный.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, dim, nlist=None, nprobe=8, train_size=1000):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.centroids = None
+        self.trained_size = 0              # Сколько эталонов было при обучении
+        self._untrained = ExactIndex(dim)  # Эталоны до обучения
+        self._lists = []                   # [ExactIndex] по кластерам
+        self._cluster = {}                 # {id: кластер}
+
+    def __len__(self):
+        if self.centroids is None:
+            return len(self._untrained)
+        return len(self._cluster)
+
+    def _train(self):
+        """Обучает кластеры по всем эталонам (после обучения они раскладываются по спискам заново)"""
+        if self.centroids is not None:
+            ids, vectors = self._items()
+            self.centroids = None
+            self._untrained = ExactIndex(self.dim)
+            self._untrained.add(ids, vectors)
+
+        ids = list(self._untrained._ids)
+        vectors = self._untrained._matrix[:len(ids)].copy()
+        nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+        for _ in range(10):
+            assignment = (vectors @ centroids.T).argmax(axis=1)
+            for c in range(nlist):
+                members = vectors[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize(centroids)
+
+        self.centroids = centroids
+        self.trained_size = len(ids)
+        self._lists = [ExactIndex(self.dim) for _ in range(nlist)]
+        self._cluster = {}
+        self._untrained = ExactIndex(self.dim)
+        self._assign(ids, vectors)
+
+    def _assign(self, ids, vectors):
+        vectors = normalize(vectors)
+        assignment = (vectors @ self.centroids.T).argmax(axis=1)
+        for c in np.unique(assignment):
+            members = np.flatnonzero(assignment == c)
+            self._lists[c].add([ids[i] for i in members], vectors[members])
+            for i in members:
+                self._cluster[ids[i]] = int(c)
+
+    def add(self, ids, embeddings):
+        if self.centroids is None:
+            self._untrained.add(ids, embeddings)
+            if len(self._untrained) >= self.train_size:
+                self._train()
+            return
+
+        self.remove([i for i in ids if i in self._cluster])
+        self._assign(list(ids), embeddings)
+        # Набор вырос в разы с момента обучения: кластеры перестраиваются под новый размер
+        if len(self) > 4 * self.trained_size:
+            self._train()
+
+    def remove(self, ids):
+        if self.centroids is None:
+            self._untrained.remove(ids)
+            return
+        for image_id in ids:
+            cluster = self._cluster.pop(image_id, None)
+            if cluster is not None:
+                self._lists[cluster].remove([image_id])
+
+    def search(self, queries):
+        if self.centroids is None:
+            return self._untrained.search(queries)
+
+        queries = normalize(queries)
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        result_ids = [None] * len(queries)
+        scores = np.full(len(queries), -np.inf, dtype=np.float32)
+        # Запросы группируются по кластерам: один матричный поиск на кластер
+        for c in np.unique(probes):
+            if not len(self._lists[c]):
+                continue
+            members = np.flatnonzero((probes == c).any(axis=1))
+            ids, cluster_scores = self._lists[c].search(queries[members])
+            for q, image_id, score in zip(members, ids, cluster_scores):
+                if score > scores[q]:
+                    scores[q] = score
+                    result_ids[q] = image_id
+        scores[np.isinf(scores)] = 0.0
+        return result_ids, scores
+
+    def _items(self):
+        indexes = [self._untrained] if self.centroids is None else self._lists
+        ids = [image_id for index in indexes for image_id in index._ids]
+        vectors = [index._matrix[:len(index)] for index in indexes]
+        return ids, (np.concatenate(vectors) if vectors else np.zeros((0, self.dim), dtype=np.float32))
+
+    def save(self, path):
+        ids, vectors = self._items()
+        np.save(path + ".npy", vectors)
+        if self.centroids is not None:
+            np.save(path + ".centroids.npy", self.centroids)
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump({"kind": self.kind, "dim": self.dim, "ids": ids, "nlist": self.nlist, "nprobe": self.nprobe,
+                       "train_size": self.train_size, "trained": self.centroids is not None}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["dim"], meta["nlist"], meta["nprobe"], meta["train_size"])
+        vectors = np.load(path + ".npy")
+        if meta["trained"]:
+            index.centroids = np.load(path + ".centroids.npy")
+            index.trained_size = len(meta["ids"])
+            index._lists = [ExactIndex(index.dim) for _ in range(len(index.centroids))]
+            if meta["ids"]:
+                index._assign(meta["ids"], vectors)
+        elif meta["ids"]:
+            index._untrained.add(meta["ids"], vectors)
+        return index
+
+
+class HnswIndex(GalleryIndex):
+    """Приближенный поиск по графу HNSW (библиотека hnswlib), удаление через пометку"""
+
+    kind = "hnsw"
+
+    def __init__(self, dim, m=16, ef_construction=200, ef=64, capacity=1024):
+        if hnswlib is None:
+            raise RuntimeError("Для индекса HNSW нужна библиотека hnswlib")
+        super().__init__(dim)
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef = ef
+        self._index = hnswlib.Index(space="ip", dim=dim)
+        self._index.init_index(max_elements=capacity, ef_construction=ef_construction, M=m, allow_replace_deleted=True)
+        self._index.set_ef(ef)
+        self._labels = {}   # {id: метка}
+        self._ids = {}      # {метка: id}
+        self._next_label = 0
+
+    def __len__(self):
+        return len(self._labels)
+
+    def add(self, ids, embeddings):
+        self.remove([i for i in ids if i in self._labels])
+        needed = len(self._labels) + len(ids)
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, self._index.get_max_elements() * 2))
+
+        labels = np.arange(self._next_label, self._next_label + len(ids))
+        self._next_label += len(ids)
+        self._index.add_items(normalize(embeddings), labels, replace_deleted=True)
+        for image_id, label in zip(ids, labels):
+            self._labels[image_id] = int(label)
+            self._ids[int(label)] = image_id
+
+    def remove(self, ids):
+        for image_id in ids:
+            label = self._labels.pop(image_id, None)
+            if label is not None:
+                self._index.mark_deleted(label)
+                del self._ids[label]
+
+    def search(self, queries):
+        queries = normalize(queries)
+        if not self._labels:
+            return [None] * len(queries), np.zeros(len(queries), dtype=np.float32)
+
+        labels, distances = self._index.knn_query(queries, k=1)
+        # Для пространства ip расстояние = 1 - скалярное произведение
+        return [self._ids[int(label)] for label in labels[:, 0]], (1.0 - distances[:, 0]).astype(np.float32)
+
+    def save(self, path):
+        self._index.save_index(path + ".hnsw")
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump({"kind": self.kind, "dim": self.dim, "m": self.m, "ef_construction": self.ef_construction,
+                       "ef": self.ef, "labels": self._labels, "next_label": self._next_label}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["dim"], meta["m"], meta["ef_construction"], meta["ef"], capacity=1)
+        index._index = hnswlib.Index(space="ip", dim=meta["dim"])
+        index._index.load_index(path + ".hnsw", allow_replace_deleted=True)
+        index._index.set_ef(meta["ef"])
+        index._labels = meta["labels"]
+        index._ids = {label: image_id for image_id, label in index._labels.items()}
+        index._next_label = meta["next_label"]
+        return index
+
+
+INDEX_TYPES = {index_type.kind: index_type for index_type in (ExactIndex, IvfIndex, HnswIndex)}
+
+
+def create_gallery_index(dim, kind=GALLERY_INDEX, expected_size=0):
+    """
+    Создает индекс эталонов
+
+    Args:
+        dim (int): Размерность эмбеддингов
+        kind (str): exact, ivf, hnsw или auto (точный для небольших наборов, иначе HNSW
+            при наличии hnswlib, без него IVF на NumPy)
+        expected_size (int): Ожидаемое количество эталонов (для auto)
+    """
+    if kind == "auto":
+        if expected_size < GALLERY_ANN_THRESHOLD:
+            kind = "exact"
+        else:
+            kind = "hnsw" if hnswlib is not None else "ivf"
+    if kind == "hnsw" and hnswlib is None:
+        kind = "ivf"
+    return INDEX_TYPES[kind](dim)
+
+
+def load_gallery_index(path):
+    """Загружает индекс, сохраненный методом save, определяя его тип по метаданным"""
+    with open(path + ".json", encoding="utf-8") as f:
+        kind = json.load(f)["kind"]
+    return INDEX_TYPES[kind].load(path)
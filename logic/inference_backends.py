@@ -0,0 +1,143 @@
+import logging
+import os
+import time
+
+import numpy as np
+
+from logic.batching import FACE_SIZE
+
+try:
+    import onnxruntime
+except ImportError:  # ONNX Runtime необязателен, без него доступен только бэкенд tf
+    onnxruntime = None
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "tf")   # tf (Keras) или onnx (ONNX Runtime)
+ONNX_PRECISION = os.environ.get("ONNX_PRECISION", "fp32")       # fp32, fp16 или int8
+# Каталог экспортированных моделей; экспорт выполняется один раз при первой загрузке
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", os.path.join(os.path.expanduser("~"), ".deepface", "onnx"))
+# Провайдеры ONNX Runtime по приоритету, например OpenVINOExecutionProvider,CPUExecutionProvider
+ONNX_PROVIDERS = os.environ.get("ONNX_PROVIDERS", "CPUExecutionProvider")
+INFERENCE_INTRA_OP_THREADS = int(os.environ.get("INFERENCE_INTRA_OP_THREADS", 0))  # 0 - по количеству ядер
+INFERENCE_INTER_OP_THREADS = int(os.environ.get("INFERENCE_INTER_OP_THREADS", 0))
+
+INFERENCE_BACKENDS = ("tf", "onnx")
+ONNX_PRECISIONS = ("fp32", "fp16", "int8")
+ONNX_OPSET = 13
+
+
+def onnx_model_path(model_name, precision=ONNX_PRECISION, model_dir=ONNX_MODEL_DIR):
+    """Путь к экспортированной модели нужной точности"""
+    return os.path.join(model_dir, f"{model_name.lower()}_{precision}.onnx")
+
+
+def export_onnx(keras_model, model_name, precision=ONNX_PRECISION, model_dir=ONNX_MODEL_DIR):
+    """
+    Экспортирует модель эмбеддингов Keras в ONNX
+
+    Сначала сохраняется модель fp32 (tf2onnx), модели fp16 и int8 получаются из нее:
+    fp16 - конвертацией весов (onnxconverter-common, вход и выход остаются float32),
+    int8 - динамической квантизацией весов ONNX Runtime (калибровочный набор не нужен).
+    Файлы пишутся во временный файл и переименовываются, поэтому воркеры, одновременно
+    выполнившие экспорт, не прочитают недописанную модель.
+
+    Args:
+        keras_model: Модель deepface (tf.keras)
+        model_name (str): Имя модели для файла
+        precision (str): fp32, fp16 или int8
+        model_dir (str): Каталог экспортированных моделей
+
+    Returns:
+        str: Путь к модели нужной точности
+    """
+    if precision not in ONNX_PRECISIONS:
+        raise ValueError(f"Неизвестная точность ONNX: {precision}")
+    os.makedirs(model_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    fp32_path = onnx_model_path(model_name, "fp32", model_dir)
+    if not os.path.exists(fp32_path):
+        import tensorflow as tf
+        import tf2onnx
+
+        signature = (tf.TensorSpec((None, *FACE_SIZE, 3), tf.float32, name="input"),)
+        tmp_path = f"{fp32_path}.{os.getpid()}.tmp"
+        tf2onnx.convert.from_keras(keras_model, input_signature=signature, opset=ONNX_OPSET, output_path=tmp_path)
+        os.replace(tmp_path, fp32_path)
+
+    path = onnx_model_path(model_name, precision, model_dir)
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        if precision == "fp16":
+            import onnx
+            from onnxconverter_common import float16
+
+            onnx.save(float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True), tmp_path)
+        else:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, path)
+
+    logger.info(f"Модель {model_name} экспортирована в ONNX ({precision}) за {time.perf_counter() - started:.2f} сек: {path}")
+    return path
+
+
+class OnnxEmbedder:
+    """
+    Модель эмбеддингов на ONNX Runtime с интерфейсом predict как у модели Keras.
+
+    На CPU у ONNX Runtime заметно меньше накладных расходов на вызов, чем у model.predict,
+    а количество потоков задается явно: при нескольких воркерах на одной машине их
+    стоит ограничить, чтобы процессы не делили ядра. Сессия потокобезопасна.
+    """
+
+    def __init__(self, path, intra_op_threads=INFERENCE_INTRA_OP_THREADS,
+                 inter_op_threads=INFERENCE_INTER_OP_THREADS, providers=ONNX_PROVIDERS):
+        """
+        Args:
+            path (str): Путь к модели ONNX
+            intra_op_threads (int): Потоки внутри одного оператора (0 - по количеству ядер)
+            inter_op_threads (int): Потоки между независимыми операторами (0 - по умолчанию)
+            providers (str): Провайдеры исполнения через запятую по приоритету
+        """
+        if onnxruntime is None:
+            raise RuntimeError("Для бэкенда инференса onnx нужна библиотека onnxruntime")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        available = onnxruntime.get_available_providers()
+        providers = [p for p in providers.split(",") if p in available] or ["CPUExecutionProvider"]
+        self.path = path
+        self._session = onnxruntime.InferenceSession(path, options, providers=providers)
+        self._input = self._session.get_inputs()[0].name
+        self.providers = self._session.get_providers()
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        """Эмбеддинги пакета лиц (n, 160, 160, 3) float32; batch_size и verbose - для совместимости с Keras"""
+        return self._session.run(None, {self._input: np.asarray(batch, dtype=np.float32)})[0]
+
+
+def load_onnx_embedder(model_name, precision=ONNX_PRECISION, model_dir=ONNX_MODEL_DIR, build_keras_model=None):
+    """
+    Загружает модель ONNX; если ее еще нет, один раз экспортирует модель Keras
+
+    Args:
+        model_name (str): Имя модели deepface
+        precision (str): fp32, fp16 или int8
+        model_dir (str): Каталог экспортированных моделей
+        build_keras_model (callable, optional): Строит модель Keras для экспорта
+
+    Returns:
+        OnnxEmbedder: Модель с интерфейсом predict
+    """
+    if precision not in ONNX_PRECISIONS:
+        raise ValueError(f"Неизвестная точность ONNX: {precision}")
+    path = onnx_model_path(model_name, precision, model_dir)
+    if not os.path.exists(path):
+        if build_keras_model is None:
+            raise RuntimeError(f"Не найдена модель ONNX {path}")
+        export_onnx(build_keras_model(), model_name, precision, model_dir)
+    return OnnxEmbedder(path)
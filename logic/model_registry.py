@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from deepface.DeepFace import build_model
+from deepface.detectors import FaceDetector
+
+from logic.inference_backends import INFERENCE_BACKEND, INFERENCE_BACKENDS, ONNX_PRECISION, load_onnx_embedder
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "Facenet"
+DETECTOR_BACKEND = "retinaface"
+
+
+class ModelRegistry:
+    """
+    Реестр моделей, общий для всех задач процесса.
+
+    Facenet и RetinaFace загружаются один раз при первом обращении (или при прогреве)
+    и затем переиспользуются всеми экземплярами FaceRecognitionLogic. Эмбеддинги
+    считает модель Keras (бэкенд tf) или ее экспорт в ONNX (бэкенд onnx).
+    """
+
+    def __init__(self, model_name=MODEL_NAME, detector_backend=DETECTOR_BACKEND,
+                 inference_backend=INFERENCE_BACKEND, precision=ONNX_PRECISION):
+        if inference_backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Неизвестный бэкенд инференса: {inference_backend}")
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        self.inference_backend = inference_backend
+        self.precision = precision if inference_backend == "onnx" else None
+        self._lock = threading.Lock()
+        # Один экземпляр RetinaFace (модель TF) на процесс: потокобезопасность одновременных вызовов
+        # не гарантируется, поэтому все детекции процесса выполняются под этой блокировкой
+        self.detector_lock = threading.Lock()
+        self._model = None
+        self._detector = None
+        self.cold_load_seconds = None  # Время холодной загрузки моделей
+        self.reuse_count = 0           # Сколько раз модели были выданы без загрузки
+
+    def _load(self):
+        """Загружает модели, если они еще не загружены. Возвращает True, если загрузка была выполнена."""
+        with self._lock:
+            if self._model is not None:
+                return False
+
+            started = time.perf_counter()
+            if self.inference_backend == "onnx":
+                self._model = load_onnx_embedder(self.model_name, self.precision,
+                                                 build_keras_model=lambda: build_model(self.model_name))
+            else:
+                self._model = build_model(self.model_name)
+            self._detector = FaceDetector.build_model(self.detector_backend)
+            self.cold_load_seconds = time.perf_counter() - started
+            logger.info(f"Модели {self.model_key}/{self.detector_backend} загружены за {self.cold_load_seconds:.2f} сек")
+            return True
+
+    def acquire(self):
+        """
+        Возвращает общие модели для новой задачи
+
+        Returns:
+            tuple: (модель эмбеддингов, детектор лиц)
+        """
+        if not self._load():
+            with self._lock:
+                self.reuse_count += 1
+        return self._model, self._detector
+
+    def warm_up(self):
+        """Загружает модели и выполняет пробный прогон, чтобы первая задача не платила за инициализацию"""
+        self._load()
+        self._model.predict(np.zeros((1, 160, 160, 3), dtype="float32"))
+        logger.info("Прогрев моделей завершен")
+
+    @property
+    def model(self):
+        self._load()
+        return self._model
+
+    @property
+    def detector(self):
+        self._load()
+        return self._detector
+
+    @property
+    def model_key(self):
+        """Имя модели эмбеддингов с бэкендом инференса: эмбеддинги ONNX fp16/int8 немного отличаются от Keras"""
+        if self.inference_backend == "tf":
+            return self.model_name
+        return f"{self.model_name}/{self.inference_backend}-{self.precision}"
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
+    def stats(self):
+        """Метрики реестра: время холодной загрузки и сэкономленное время"""
+        cold = self.cold_load_seconds or 0.0
+        return {
+            "model": self.model_key,
+            "detector": self.detector_backend,
+            "loaded": self.is_loaded,
+            "cold_load_seconds": round(cold, 3),
+            "reuse_count": self.reuse_count,
+            "saved_seconds": round(cold * self.reuse_count, 3),
+        }
+
+
+_registries = {}
+_registry_lock = threading.Lock()
+
+
+def get_registry(inference_backend=None, precision=None):
+    """
+    Возвращает реестр моделей текущего процесса
+
+    Args:
+        inference_backend (str, optional): tf или onnx, по умолчанию INFERENCE_BACKEND
+        precision (str, optional): Точность модели ONNX, по умолчанию ONNX_PRECISION
+    """
+    key = (inference_backend or INFERENCE_BACKEND, precision or ONNX_PRECISION)
+    with _registry_lock:
+        if key not in _registries:
+            _registries[key] = ModelRegistry(inference_backend=key[0], precision=key[1])
+        return _registries[key]
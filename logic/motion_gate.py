@@ -0,0 +1,128 @@
+import os
+
+import cv2
+import numpy as np
+
+# Отсев кадров без изменений сцены перед детекцией: none, diff, hist или phash
+MOTION_GATE = os.environ.get("MOTION_GATE", "none")
+# Порог изменения сцены; по умолчанию свой для каждого метода (DEFAULT_THRESHOLDS)
+MOTION_THRESHOLD = os.environ.get("MOTION_THRESHOLD")
+# Через сколько подряд отсеянных кадров выборки детекция все равно выполняется
+MOTION_MAX_SKIP = int(os.environ.get("MOTION_MAX_SKIP", 50))
+MOTION_WIDTH = int(os.environ.get("MOTION_WIDTH", 160))  # Ширина миниатюры для сравнения кадров
+
+DEFAULT_THRESHOLDS = {
+    "diff": 0.002,   # Доля изменившихся пикселей миниатюры
+    "hist": 0.05,    # Расстояние Бхаттачарьи между гистограммами яркости
+    "phash": 0.05,   # Доля различающихся битов перцептивного хэша (64 бита)
+}
+PIXEL_DELTA = 25     # Изменение яркости пикселя, которое считается движением, а не шумом сжатия
+
+
+def _thumbnail(frame, width):
+    """Уменьшенная размытая копия кадра в оттенках серого"""
+    height, frame_width = frame.shape[:2]
+    scale = min(1.0, width / float(frame_width))
+    small = cv2.resize(frame, (max(1, int(frame_width * scale)), max(1, int(height * scale))),
+                       interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+
+def _diff_signature(gray):
+    return gray
+
+
+def _diff_distance(a, b):
+    return float(np.count_nonzero(cv2.absdiff(a, b) > PIXEL_DELTA)) / a.size
+
+
+def _hist_signature(gray):
+    hist = cv2.calcHist([gray], [0], None, [64], [0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+
+def _hist_distance(a, b):
+    return float(cv2.compareHist(a, b, cv2.HISTCMP_BHATTACHARYYA))
+
+
+def _phash_signature(gray):
+    dct = cv2.dct(np.float32(cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA)))[:8, :8]
+    return (dct > np.median(dct)).flatten()
+
+
+def _phash_distance(a, b):
+    return float(np.count_nonzero(a != b)) / a.size
+
+
+SIGNATURES = {
+    "diff": (_diff_signature, _diff_distance),
+    "hist": (_hist_signature, _hist_distance),
+    "phash": (_phash_signature, _phash_distance),
+}
+
+
+class MotionGate:
+    """
+    Отсев кадров выборки, в которых сцена не изменилась.
+
+    На записях со статичной камеры тысячи кадров выборки почти одинаковы. Для каждого кадра
+    по миниатюре считается сигнатура (разность кадров, гистограмма яркости или перцептивный
+    хэш) и сравнивается с сигнатурой последнего кадра, который пошел на детекцию. Сравнение
+    идет с ним, а не с предыдущим кадром, поэтому медленные изменения накапливаются и
+    все равно превышают порог. Отсеянный кадр выдается без изображения: распознаватель
+    повторяет для него результат последней детекции, так что формат отчета не меняется.
+
+    Сигнатуры считаются в потоке декодирования, который читает кадры строго по порядку.
+    """
+
+    def __init__(self, method=MOTION_GATE, threshold=MOTION_THRESHOLD, max_skip=MOTION_MAX_SKIP, width=MOTION_WIDTH):
+        """
+        Args:
+            method (str): Сигнатура кадра: diff, hist или phash
+            threshold (float, optional): Порог изменения сцены, по умолчанию DEFAULT_THRESHOLDS[method]
+            max_skip (int): Сколько кадров подряд можно отсеять до принудительной детекции
+            width (int): Ширина миниатюры
+        """
+        if method not in SIGNATURES:
+            raise ValueError(f"Неизвестный метод отсева кадров: {method}")
+        self.method = method
+        self.threshold = float(threshold) if threshold not in (None, "") else DEFAULT_THRESHOLDS[method]
+        self.max_skip = max_skip
+        self.width = width
+        self._signature, self._distance = SIGNATURES[method]
+        self._reference = None
+        self._skipped_in_row = 0
+        self.frames_checked = 0
+        self.frames_gated = 0
+
+    def changed(self, frame):
+        """Изменилась ли сцена относительно последнего кадра, который пошел на детекцию"""
+        signature = self._signature(_thumbnail(frame, self.width))
+        self.frames_checked += 1
+        if (self._reference is not None and self._skipped_in_row < self.max_skip
+                and self._distance(self._reference, signature) < self.threshold):
+            self._skipped_in_row += 1
+            self.frames_gated += 1
+            return False
+        self._reference = signature
+        self._skipped_in_row = 0
+        return True
+
+    def frames(self, source):
+        """
+        Пропускает кадры источника через отсев
+
+        Args:
+            source (iterable): Кадры (frame_number, timestamp, frame)
+
+        Yields:
+            tuple: (frame_number, timestamp, кадр или None, если сцена не изменилась)
+        """
+        for frame_number, timestamp, frame in source:
+            yield frame_number, timestamp, frame if self.changed(frame) else None
+
+    def stats(self):
+        return {
+            "motion_gate": self.method,
+            "frames_gated": self.frames_gated,
+        }
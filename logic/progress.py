@@ -0,0 +1,40 @@
+import time
+
+DEFAULT_PROGRESS_INTERVAL = 1.0
+
+
+class ProgressReporter:
+    """
+    Отчет о ходе обработки видео: обработано кадров, всего кадров, совпадений и оценка оставшегося времени.
+
+    Колбэк вызывается не чаще одного раза в interval секунд и обязательно в конце обработки.
+    """
+
+    def __init__(self, callback, total_frames, interval=DEFAULT_PROGRESS_INTERVAL):
+        self.callback = callback
+        self.total_frames = max(int(total_frames or 0), 0)
+        self.interval = interval
+        self._started = time.monotonic()
+        self._last_report = None
+
+    def update(self, frames_processed, detections, done=False):
+        now = time.monotonic()
+        if not done and self._last_report is not None and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+
+        elapsed = now - self._started
+        eta = None
+        if done:
+            eta = 0.0
+        elif self.total_frames and frames_processed:
+            remaining = max(self.total_frames - frames_processed, 0)
+            eta = round(elapsed / frames_processed * remaining, 1)
+
+        self.callback({
+            "frames_processed": frames_processed,
+            "total_frames": self.total_frames,
+            "detections": detections,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta,
+        })
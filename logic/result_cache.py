@@ -0,0 +1,162 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from database.database import (
+    delete_result_cache_entry, get_result_cache_entry, get_result_cache_usage, put_result_cache_entry
+)
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", os.path.join("results", "cache"))
+RESULT_CACHE_MAX_MB = int(os.environ.get("RESULT_CACHE_MAX_MB", 1024))  # 0 отключает кэш
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 содержимого файла (если хеш не посчитан при загрузке)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source, destination):
+    """Жесткая ссылка на файл (без копирования данных), если ФС не позволяет - копия"""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class ResultCache:
+    """
+    Кэш результатов распознавания целых видео с адресацией по содержимому.
+
+    Ключ - SHA-256 от хеша видео, отсортированных хешей эмбеддингов эталонов (вместе с именами,
+    так как они попадают в отчет), порога, параметров выборки кадров и версии моделей.
+    Файлы результатов хранятся в RESULT_CACHE_DIR как жесткие ссылки на results/*.txt,
+    поэтому вытеснение записи не затрагивает результаты уже выполненных задач.
+    Суммарный размер ограничен max_bytes, вытесняются давно не использованные записи.
+    """
+
+    def __init__(self, directory=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(video_sha256, references, settings):
+        """
+        Ключ кэша для видео, набора эталонов и настроек распознавания
+
+        Args:
+            video_sha256 (str): SHA-256 содержимого видео
+            references (list): [(эмбеддинг, имя)] эталонов задачи
+            settings (dict): Порог, выборка кадров и версии моделей
+        """
+        reference_hashes = sorted(
+            hashlib.sha256(np.asarray(embedding, dtype=np.float32).tobytes() + f"|{name}".encode()).hexdigest()
+            for embedding, name in references
+        )
+        digest = hashlib.sha256()
+        digest.update(video_sha256.encode())
+        digest.update("|".join(reference_hashes).encode())
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _paths(self, cache_key):
+        base = os.path.join(self.directory, cache_key)
+        return base + ".txt", base + ".jsonl"
+
+    def lookup(self, cache_key, result_path, detections_path=None):
+        """
+        Подставляет сохраненный результат по ключу
+
+        Returns:
+            bool: True, если результат найден и связан с result_path (и detections_path)
+        """
+        if not self.enabled:
+            return False
+
+        entry = get_result_cache_entry(cache_key)
+        if entry and os.path.exists(entry["result_path"]):
+            link_or_copy(entry["result_path"], result_path)
+            if detections_path and entry["detections_path"] and os.path.exists(entry["detections_path"]):
+                link_or_copy(entry["detections_path"], detections_path)
+            with self._lock:
+                self.hits += 1
+            return True
+
+        if entry:
+            # Файлы удалены вручную: запись больше не действительна
+            delete_result_cache_entry(cache_key)
+        with self._lock:
+            self.misses += 1
+        return False
+
+    def store(self, cache_key, result_path, detections_path=None):
+        """Сохраняет результат задачи в кэш и вытесняет записи сверх бюджета"""
+        if not self.enabled:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        cached_result, cached_detections = self._paths(cache_key)
+        link_or_copy(result_path, cached_result)
+        size = os.path.getsize(cached_result)
+        if detections_path and os.path.exists(detections_path):
+            link_or_copy(detections_path, cached_detections)
+            size += os.path.getsize(cached_detections)
+        else:
+            cached_detections = None
+
+        evicted = put_result_cache_entry(cache_key, cached_result, cached_detections, size, self.max_bytes)
+        for entry in evicted:
+            for path in (entry["result_path"], entry["detections_path"]):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        if evicted:
+            with self._lock:
+                self.evictions += len(evicted)
+            logger.info(f"Из кэша результатов вытеснено записей: {len(evicted)}")
+
+    def stats(self):
+        """Метрики кэша: попадания, промахи, вытеснения и занятое место"""
+        entries, size = get_result_cache_usage()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Возвращает кэш результатов текущего процесса"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+DEFAULT_FLUSH_LINES = 20
+DEFAULT_FLUSH_SECONDS = 2.0
+
+
+def open_new(path):
+    """
+    Открывает файл на запись как новый файл
+
+    Существующий файл удаляется, а не усекается: он может быть жесткой ссылкой на запись
+    кэша результатов, и усечение испортило бы кэш и результаты других задач с тем же файлом.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    return open(path, "w", encoding="utf-8")
+
+
+class ResultLog:
+    """Лог распознавания в памяти: строки отчета собираются и возвращаются одной строкой"""
+
+    def __init__(self):
+        self.lines = []
+
+    def append(self, line):
+        self.lines.append(line)
+
+    def add_detection(self, detection):
+        """Структурированная запись о совпадении; в памяти не хранится"""
+
+    def close(self):
+        pass
+
+    def getvalue(self):
+        return "\n".join(self.lines)
+
+
+class StreamingResultLog(ResultLog):
+    """
+    Лог распознавания, который пишется в файл по мере обработки видео.
+
+    Строки сбрасываются на диск каждые flush_lines строк или flush_seconds секунд,
+    поэтому частичный результат доступен, пока задача еще выполняется. Совпадения
+    дополнительно пишутся в JSONL, если указан detections_path. Файлы всегда создаются
+    заново (open_new), поэтому запись не затрагивает жесткие ссылки кэша результатов.
+    """
+
+    def __init__(self, path, detections_path=None, flush_lines=DEFAULT_FLUSH_LINES, flush_seconds=DEFAULT_FLUSH_SECONDS):
+        super().__init__()
+        self.path = path
+        self.detections_path = detections_path
+        self.flush_lines = flush_lines
+        self.flush_seconds = flush_seconds
+        self.lines_written = 0
+        self.detections_written = 0
+        self._file = open_new(path)
+        self._detections_file = open_new(detections_path) if detections_path else None
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def append(self, line):
+        self._file.write(line + "\n")
+        self.lines_written += 1
+        self._unflushed += 1
+        self._maybe_flush()
+
+    def add_detection(self, detection):
+        if self._detections_file:
+            self._detections_file.write(json.dumps(detection, ensure_ascii=False) + "\n")
+            self.detections_written += 1
+
+    def _maybe_flush(self):
+        if self._unflushed >= self.flush_lines or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        if self._detections_file:
+            self._detections_file.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+        if self._detections_file:
+            self._detections_file.close()
+
+    def getvalue(self):
+        """Содержимое уже записано в файл и в памяти не хранится"""
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,19 @@
+# Допустимые значения параметров детекции задачи. Их проверяет веб-приложение при приеме задачи,
+# поэтому модуль не импортирует OpenCV, NumPy и модели.
+
+PREFILTER_BACKENDS = ("none", "haar", "ssd", "yunet")   # Быстрый детектор перед RetinaFace
+PREFILTER_MODES = ("frame", "roi")                       # RetinaFace на всем кадре или вокруг кандидатов
+MOTION_GATES = ("none", "diff", "hist", "phash")         # Отсев кадров без изменений сцены
+
+
+def parse_scale(value):
+    """Масштаб детекции из настройки: "auto" или число в (0, 1]; некорректное значение - 1"""
+    if value in (None, ""):
+        return 1.0
+    if value == "auto":
+        return "auto"
+    try:
+        scale = float(value)
+    except (TypeError, ValueError):
+        return 1.0
+    return scale if 0 < scale <= 1 else 1.0
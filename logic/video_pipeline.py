@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_DETECT_WORKERS = 1   # Один поток на экземпляр детектора: декодирование и детекция все равно идут параллельно
+DEFAULT_QUEUE_SIZE = 16
+
+_DONE = object()
+
+
+class FramePipeline:
+    """
+    Конвейер декодирование -> детекция для видео.
+
+    Отдельный поток читает кадры из источника и отправляет их на детекцию в пул потоков.
+    Ожидающие результаты складываются в ограниченную очередь: если потребитель
+    (пакетный инференс и сопоставление) не успевает, декодирование блокируется,
+    и в памяти находится не больше queue_size кадров. Результаты выдаются строго
+    в порядке кадров. Кадр None (отсеянный до детекции) передается дальше без детекции.
+    """
+
+    def __init__(self, detect, workers=DEFAULT_DETECT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            detect (callable): Функция детекции, принимает кадр и возвращает список лиц
+            workers (int): Количество потоков детекции; detect должна допускать одновременные вызовы
+                (детекторы из реестра моделей сериализуют их блокировкой)
+            queue_size (int): Максимальное количество кадров в очереди между стадиями
+        """
+        self.detect = detect
+        self.workers = workers
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self.frames_decoded = 0
+        self.frames_detected = 0
+        self.decode_seconds = 0.0
+        self.detect_seconds = 0.0
+        self.wait_seconds = 0.0   # Время, которое потребитель ждал результатов детекции
+        self.max_queue_depth = 0
+        self._queue_depth_sum = 0
+
+    def _timed_detect(self, frame):
+        started = time.perf_counter()
+        try:
+            return self.detect(frame)
+        finally:
+            with self._lock:
+                self.detect_seconds += time.perf_counter() - started
+
+    @staticmethod
+    def _put(tasks, item, stop):
+        """Кладет элемент в очередь, пока потребитель не остановил конвейер"""
+        while not stop.is_set():
+            try:
+                tasks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def run(self, frames):
+        """
+        Запускает конвейер
+
+        Args:
+            frames (iterable): Источник кадров (frame_number, timestamp, frame); читается в отдельном потоке
+
+        Yields:
+            tuple: (frame_number, timestamp, faces), где faces - список лиц, исключение детекции
+                или None для кадра, отсеянного без детекции
+        """
+        tasks = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="detect")
+
+        def produce():
+            try:
+                iterator = iter(frames)
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    item = next(iterator, None)
+                    self.decode_seconds += time.perf_counter() - started
+                    if item is None:
+                        break
+
+                    frame_number, timestamp, frame = item
+                    self.frames_decoded += 1
+                    future = executor.submit(self._timed_detect, frame) if frame is not None else None
+                    self._put(tasks, (frame_number, timestamp, future), stop)
+            except Exception as e:
+                self._put(tasks, e, stop)
+            finally:
+                self._put(tasks, _DONE, stop)
+
+        producer = threading.Thread(target=produce, name="decode", daemon=True)
+        producer.start()
+        try:
+            while True:
+                depth = tasks.qsize()
+                self.max_queue_depth = max(self.max_queue_depth, depth)
+                self._queue_depth_sum += depth
+
+                started = time.perf_counter()
+                item = tasks.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                frame_number, timestamp, future = item
+                if future is None:
+                    yield frame_number, timestamp, None
+                    continue
+                try:
+                    faces = future.result()
+                except Exception as e:
+                    faces = e
+                self.wait_seconds += time.perf_counter() - started
+                self.frames_detected += 1
+                yield frame_number, timestamp, faces
+        finally:
+            stop.set()
+            producer.join()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        """Пропускная способность стадий (кадров в секунду занятого времени) и глубина очереди"""
+        polls = self.frames_detected + 1
+        return {
+            "frames_decoded": self.frames_decoded,
+            "frames_detected": self.frames_detected,
+            "decode_fps": round(self.frames_decoded / self.decode_seconds, 1) if self.decode_seconds else 0.0,
+            "detect_fps": round(self.frames_detected * self.workers / self.detect_seconds, 1) if self.detect_seconds else 0.0,
+            "consumer_wait_seconds": round(self.wait_seconds, 2),
+            "max_queue_depth": self.max_queue_depth,
+            "avg_queue_depth": round(self._queue_depth_sum / polls, 1),
+        }
@@ -0,0 +1,70 @@
+import json
+import os
+
+import cv2
+
+# Количество отрезков, на которые делится длинное видео (1 - видео обрабатывается одним воркером)
+VIDEO_SEGMENTS = int(os.environ.get("VIDEO_SEGMENTS", 1))
+# Минимальная длительность отрезка: короткие видео не делятся, запуск отрезка дороже выигрыша
+SEGMENT_MIN_SECONDS = float(os.environ.get("SEGMENT_MIN_SECONDS", 120))
+SEGMENT_TRACK_IDS = 1000000  # Номера треков отрезка k начинаются с k * SEGMENT_TRACK_IDS + 1
+
+
+def plan_segments(video_path, segments=VIDEO_SEGMENTS, min_seconds=SEGMENT_MIN_SECONDS):
+    """
+    Делит видео на отрезки примерно равной длины
+
+    Args:
+        video_path (str): Путь к видео
+        segments (int): Желаемое количество отрезков
+        min_seconds (float): Минимальная длительность отрезка в секундах
+
+    Returns:
+        list: [(первый кадр, кадр после последнего)] - у последнего отрезка None (до конца файла,
+        количество кадров в контейнере бывает неточным); пустой список, если делить не нужно
+    """
+    if segments <= 1:
+        return []
+
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    if total_frames <= 0:
+        return []
+
+    if fps and min_seconds:
+        segments = min(segments, int(total_frames / fps // min_seconds))
+    if segments <= 1:
+        return []
+
+    bounds = [total_frames * i // segments for i in range(segments)] + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def segment_paths(result_path, detections_path, segment):
+    """Файлы частичного результата отрезка рядом с итоговыми файлами задачи"""
+    part_path = f"{os.path.splitext(result_path)[0]}.part{segment}.txt"
+    part_detections = f"{os.path.splitext(detections_path)[0]}.part{segment}.jsonl" if detections_path else None
+    return part_path, part_detections
+
+
+def merge_segments(result_log, parts):
+    """
+    Склеивает результаты отрезков в один отчет
+
+    Отрезки не пересекаются и идут по возрастанию времени, а внутри отрезка строки записаны
+    в порядке кадров, поэтому склейка по порядку отрезков дает отчет в порядке времени.
+
+    Args:
+        result_log (ResultLog): Итоговый отчет (заголовок уже записан)
+        parts (list): [(путь к строкам отрезка, путь к JSONL отрезка или None)] по порядку отрезков
+    """
+    for part_path, part_detections in parts:
+        with open(part_path, encoding="utf-8") as f:
+            for line in f:
+                result_log.append(line.rstrip("\n"))
+        if part_detections and os.path.exists(part_detections):
+            with open(part_detections, encoding="utf-8") as f:
+                for line in f:
+                    result_log.add_detection(json.loads(line))
@@ -1,23 +1,35 @@
+import asyncio
 import uuid
 from typing import List, Optional
-from urllib.parse import urlencode
+from urllib.parse import quote, urlencode
 
-from fastapi import FastAPI, Request, UploadFile, File, BackgroundTasks, Form, Depends, HTTPException, status, Cookie, Response
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse
+from fastapi import FastAPI, Request, Form, Depends, HTTPException, status, Cookie, Response
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from database.database import (
-    add_task, add_task_image, update_task_by_user_key, get_task, update_task, get_task_images,
-    register_user, authenticate_user, get_user_by_id, get_user_tasks
+from database.async_database import (
+    submit_task, register_user, authenticate_user, get_user_by_id, get_user_tasks, enqueue_job, count_jobs, get_worker_metrics,
+    get_task_state, get_task_with_user_check,
+    create_upload, get_upload, update_upload_received, delete_upload, delete_expired_uploads,
+    create_gallery, get_user_galleries, get_gallery, delete_gallery, add_gallery_items, get_gallery_items,
+    delete_gallery_item
 )
-import shutil
 import os
 import json
 import secrets
-import sqlite3
 from starlette.middleware.sessions import SessionMiddleware
-from logic.face_recognition_logic import FaceRecognitionLogic
+from starlette.requests import ClientDisconnect
+from database.user_cache import UserCache
+from task_events import TaskEventBroadcaster
+from uploads import (
+    StreamingFormParser, UploadError, receive_chunk, forget_upload, pending_uploads, safe_filename,
+    MAX_VIDEO_BYTES, MAX_IMAGE_BYTES, UPLOAD_TTL_HOURS
+)
+# Веб-процесс не импортирует модули распознавания (DeepFace, TensorFlow, OpenCV):
+# они загружаются только в процессах-воркерах
+from logic.task_options import MOTION_GATES, PREFILTER_BACKENDS, PREFILTER_MODES, parse_scale
+from worker_pool import WorkerPool
 
 app = FastAPI()
 SECRET_KEY = secrets.token_urlsafe(32)
@@ -36,75 +48,78 @@ logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
     handlers=[
-        logging.FileHandler("server.log", encoding="utf-8"),
+        logging.FileHandler(os.environ.get("LOG_FILE", "server.log"), encoding="utf-8"),
         logging.StreamHandler()  # Также выводим в консоль
     ]
 )
 logger = logging.getLogger(__name__)
 
-# Добавляем путь к базе данных (предполагаем, что он определен в database.py)
-DB_PATH = "database/recognition.db"  # Укажите правильный путь к вашей БД
+# Запуск пула воркеров вместе с веб-приложением (EMBEDDED_WORKERS=0, если воркеры запущены отдельно: python worker.py)
+EMBEDDED_WORKERS = os.environ.get("EMBEDDED_WORKERS", "1") == "1"
+worker_pool = None
+task_broadcaster = TaskEventBroadcaster()
+user_cache = UserCache()
+upload_locks = {}  # Блокировки возобновляемых загрузок: части одной загрузки пишутся по очереди
 
-# Функции для работы с базой данных с проверкой принадлежности пользователю
-def get_task_by_id_with_user_check(task_id: str, user_id: str):
-    """Получение информации о задаче по ID с проверкой принадлежности пользователю."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+# Рекомендуемый размер части возобновляемой загрузки
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+UPLOAD_EXPIRE_INTERVAL = 600  # Как часто удаляются просроченные загрузки, сек
+upload_expiry = None
 
-    try:
-        logger.info(f"Запрос информации о задаче по ID: {task_id} для пользователя: {user_id}")
-        cursor.execute('''
-            SELECT id, status, result_path, user_key, user_id 
-            FROM recognition_tasks 
-            WHERE id = ? AND (user_id = ? OR user_id IS NULL)
-        ''', (task_id, user_id))
-        row = cursor.fetchone()
-
-        if row:
-            logger.info(f"Найдена задача: id={row[0]}, status={row[1]}, принадлежит пользователю: {row[4] == user_id}")
-            return {
-                "id": row[0],
-                "status": row[1],
-                "result_path": row[2],
-                "user_key": row[3],
-                "user_id": row[4]
-            }
-        else:
-            logger.info(f"Задача с ID {task_id} не найдена или не принадлежит пользователю {user_id}")
-            return None
-    except Exception as e:
-        logger.error(f"Ошибка при запросе задачи по ID {task_id}: {e}")
-        return None
-    finally:
-        conn.close()
 
+@app.on_event("startup")
+def start_workers():
+    global worker_pool
+    if EMBEDDED_WORKERS:
+        worker_pool = WorkerPool()
+        worker_pool.start()
 
-def get_task_with_user_check(user_key: str, user_id: str):
-    """Получение информации о задаче по ключу пользователя с проверкой принадлежности."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
-    try:
-        logger.info(f"Запрос информации о задаче по ключу: {user_key} для пользователя: {user_id}")
-        cursor.execute('''
-            SELECT id, status, result_path 
-            FROM recognition_tasks 
-            WHERE user_key = ? AND (user_id = ? OR user_id IS NULL)
-        ''', (user_key, user_id))
-        row = cursor.fetchone()
-
-        if row:
-            logger.info(f"Найдена задача: id={row[0]}, status={row[1]}")
-        else:
-            logger.info(f"Задача с ключом {user_key} не найдена или не принадлежит пользователю {user_id}")
-
-        return row
-    except Exception as e:
-        logger.error(f"Ошибка при запросе задачи по ключу {user_key}: {e}")
-        return None
-    finally:
-        conn.close()
+@app.on_event("shutdown")
+def stop_workers():
+    if worker_pool:
+        worker_pool.stop()
+
+
+async def expire_uploads():
+    """
+    Удаляет брошенные возобновляемые загрузки: записи, файлы и состояние в памяти процесса.
+
+    Записи могли удалить другие веб-процессы, поэтому блокировки и состояние хешей
+    остаются только для загрузок, которые еще есть в базе.
+    """
+    for upload in await delete_expired_uploads(UPLOAD_TTL_HOURS * 3600):
+        if os.path.exists(upload["path"]):
+            os.remove(upload["path"])
+        forget_upload(upload["id"])
+        upload_locks.pop(upload["id"], None)
+
+    for upload_id in set(upload_locks) | set(pending_uploads()):
+        lock = upload_locks.get(upload_id)
+        if (lock is None or not lock.locked()) and not await get_upload(upload_id):
+            forget_upload(upload_id)
+            upload_locks.pop(upload_id, None)
+
 
+async def expire_uploads_periodically():
+    while True:
+        await asyncio.sleep(UPLOAD_EXPIRE_INTERVAL)
+        try:
+            await expire_uploads()
+        except Exception as e:
+            logger.error(f"Ошибка при удалении просроченных загрузок: {e}")
+
+
+@app.on_event("startup")
+async def start_upload_expiry():
+    global upload_expiry
+    upload_expiry = asyncio.create_task(expire_uploads_periodically())
+
+
+@app.on_event("shutdown")
+async def stop_upload_expiry():
+    if upload_expiry:
+        upload_expiry.cancel()
 
 # Функция для проверки аутентификации пользователя
 async def get_current_user(request: Request):
@@ -112,7 +127,12 @@ async def get_current_user(request: Request):
     if not user_id:
         return None
 
-    user = get_user_by_id(user_id)
+    # Запись пользователя берется из кэша процесса, чтобы опрос статуса не ходил в базу
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await get_user_by_id(user_id)
+        if user:
+            user_cache.put(user_id, user)
     return user
 
 # Функция для проверки аутентификации с перенаправлением
@@ -132,7 +152,7 @@ async def login(request: Request, response: Response):
     username = form_data.get("username")
     password = form_data.get("password")
 
-    success, result = authenticate_user(username, password)
+    success, result = await authenticate_user(username, password)
 
     if success:
         # Установка сессии
@@ -167,9 +187,11 @@ async def register(request: Request):
         })
 
     # Регистрация пользователя
-    success, result = register_user(username, email, password)
+    success, result = await register_user(username, email, password)
 
     if success:
+        user_cache.invalidate(result)
+
         # Автоматический вход после регистрации
         request.session["user_id"] = result
         request.session["username"] = username
@@ -189,14 +211,17 @@ async def logout(request: Request):
     return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
 @app.post("/recognize/")
-async def recognize_face(
-        background_tasks: BackgroundTasks,
-        request: Request,
-        video: UploadFile = File(...),
-        images: List[UploadFile] = File(...),
-        image_names: str = Form(None),  # Принимаем строку JSON с именами
-        current_user = Depends(get_current_user)
-):
+async def recognize_face(request: Request, current_user = Depends(get_current_user)):
+    """
+    Прием задачи распознавания.
+
+    Поля формы: images (несколько файлов) и/или gallery_id (сохраненная галерея эталонов),
+    video (файл) или video_upload_id (завершенная возобновляемая загрузка),
+    image_names (JSON с именами), frame_stride, sample_fps, prefilter и prefilter_mode
+    (быстрый детектор перед RetinaFace), detection_scale (масштаб кадра для детекции или auto),
+    motion_gate (отсев кадров без изменений сцены).
+    Файлы пишутся из потока запроса сразу в temp/ без промежуточного копирования.
+    """
     # Создаем временную директорию, если она не существует
     temp_dir = "temp"
     os.makedirs(temp_dir, exist_ok=True)
@@ -204,110 +229,332 @@ async def recognize_face(
     task_id = str(uuid.uuid4())
     logger.info(f"Создана новая задача распознавания: {task_id}")
 
-    # Сохраняем видеофайл
-    video_path = os.path.join(temp_dir, f"{task_id}_{video.filename}")
-    with open(video_path, "wb") as f:
-        shutil.copyfileobj(video.file, f)
-    logger.info(f"Видео сохранено по пути: {video_path}")
+    def path_for(field, filename, index):
+        if field == "video" and index == 0:
+            return os.path.join(temp_dir, f"{task_id}_{filename}"), MAX_VIDEO_BYTES
+        if field == "images":
+            return os.path.join(temp_dir, f"{task_id}_{index}_{filename}"), MAX_IMAGE_BYTES
+        return None
+
+    try:
+        fields, files = await StreamingFormParser(request, path_for).parse()
+    except UploadError as e:
+        logger.error(f"Ошибка при приеме файлов задачи {task_id}: {e}")
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+
+    # Пустые части формы (поле файла без выбранного файла) не нужны
+    cleanup_stored_files([f for stored in files.values() for f in stored if f.size == 0])
+    form_value = lambda name: (fields.get(name) or [None])[0]
+    images = [image for image in files.get("images", []) if image.size > 0]
+    videos = [video for video in files.get("video", []) if video.size > 0]
+    video_upload_id = form_value("video_upload_id")
+
+    # Эталоны можно взять из сохраненной галереи пользователя вместо загрузки изображений
+    gallery_id = form_value("gallery_id") or None
+    if gallery_id and not (current_user and await get_gallery(gallery_id, current_user["id"])):
+        cleanup_stored_files(images + videos)
+        return JSONResponse({"error": "Галерея не найдена"}, status_code=400)
+
+    if not images and not gallery_id:
+        cleanup_stored_files(videos)
+        return JSONResponse({"error": "Не переданы эталонные изображения"}, status_code=400)
+
+    if videos:
+        video_path = videos[0].path
+        video_hash = videos[0].sha256
+    elif video_upload_id:
+        # Видео загружено заранее по частям через /uploads/
+        upload = await get_upload(video_upload_id)
+        if not upload or upload["user_id"] != (current_user["id"] if current_user else None) \
+                or upload["received"] != upload["size"]:
+            cleanup_stored_files(images)
+            return JSONResponse({"error": "Загрузка видео не найдена или не завершена"}, status_code=400)
+        video_path = upload["path"]
+        video_hash = upload["sha256"]
+    else:
+        cleanup_stored_files(images)
+        return JSONResponse({"error": "Не передано видео для анализа"}, status_code=400)
+
+    logger.info(f"Видео сохранено по пути: {video_path}, sha256: {video_hash}")
+
+    image_names = form_value("image_names")
+    frame_stride = parse_number(form_value("frame_stride"), int)
+    sample_fps = parse_number(form_value("sample_fps"), float)
 
     # Парсим имена из JSON строки
-    names_dict = {}
-    if image_names:
-        try:
-            names_dict = json.loads(image_names)
-            logger.info(f"Получены имена для изображений: {names_dict}")
-        except json.JSONDecodeError:
-            logger.error(f"Ошибка при парсинге JSON имен: {image_names}")
+    names_dict = parse_names(image_names)
+    if names_dict:
+        logger.info(f"Получены имена для изображений: {names_dict}")
 
-    # Создаем запись о задаче в базе данных с привязкой к пользователю, если он авторизован
+    # Задача привязывается к пользователю, если он авторизован
     user_id = None
     if current_user:
         user_id = current_user["id"]
 
-    add_task(user_key=task_id, user_id=user_id)
-
-    # Сохраняем все загруженные изображения и добавляем их в базу данных
     image_paths = []
     for i, image in enumerate(images):
-        image_path = os.path.join(temp_dir, f"{task_id}_{i}_{image.filename}")
-        with open(image_path, "wb") as f:
-            shutil.copyfileobj(image.file, f)
+        image_path = image.path
 
         # Получаем имя для текущего изображения из словаря по индексу
         name = names_dict.get(str(i), None)
         if not name or name.strip() == "":
             name = f"Лицо {i+1}"
 
-        # Добавляем информацию об изображении в базу данных
-        add_task_image(task_id, image_path, name)
         image_paths.append({"path": image_path, "name": name})
 
         logger.info(f"Изображение сохранено: {image_path}, имя: {name}")
 
-    # Запускаем задачу распознавания в фоновом режиме
-    background_tasks.add_task(process_video_task, task_id, image_paths, video_path)
+    # Параметры выборки кадров задачи
+    sampling = {
+        "stride": frame_stride if frame_stride and frame_stride > 0 else None,
+        "fps": sample_fps if sample_fps and sample_fps > 0 else None,
+    }
+    logger.info(f"Выборка кадров для задачи {task_id}: {sampling}")
+
+    # Предфильтр детекции задачи; без указания действуют настройки воркеров
+    detection = {}
+    prefilter = form_value("prefilter")
+    prefilter_mode = form_value("prefilter_mode")
+    if prefilter in PREFILTER_BACKENDS:
+        detection["prefilter"] = prefilter
+    if prefilter_mode in PREFILTER_MODES:
+        detection["prefilter_mode"] = prefilter_mode
+    if form_value("detection_scale"):
+        detection["detection_scale"] = parse_scale(form_value("detection_scale"))
+    if form_value("motion_gate") in MOTION_GATES:
+        detection["motion_gate"] = form_value("motion_gate")
+
+    # Задача, ее изображения и задание для воркеров создаются одной транзакцией
+    await submit_task(task_id, user_id, [(image["path"], image["name"]) for image in image_paths], {
+        "task_id": task_id,
+        "image_paths": image_paths,
+        "video_path": video_path,
+        "video_sha256": video_hash,
+        "sampling": sampling,
+        "gallery_id": gallery_id,
+        "detection": detection
+    })
+    if video_upload_id and not videos:
+        # Запись загрузки удаляется только после постановки задачи: при ошибке загрузку можно использовать снова
+        await delete_upload(video_upload_id)
+        forget_upload(video_upload_id)
 
     # Перенаправляем на главную с task_id в параметрах URL
     query_string = urlencode({"task_id": task_id})
     return RedirectResponse(url=f"/?{query_string}", status_code=303)
 
 
-def process_video_task(task_id, image_paths, video_path):
+def parse_names(image_names):
+    """Имена изображений из JSON строки {номер: имя}"""
+    if not image_names:
+        return {}
     try:
-        logger.info(f"Начало обработки задачи {task_id}")
-        os.makedirs("results", exist_ok=True)
-
-        # Инициализируем класс распознавания
-        recognizer = FaceRecognitionLogic()
-
-        # Добавляем все целевые изображения
-        for i, image_info in enumerate(image_paths):
-            image_id = f"image_{i}"
-            image_path = image_info["path"]
-            name = image_info["name"] if image_info["name"] else f"Лицо {i+1}"
-
-            try:
-                recognizer.add_target_image(image_path, image_id, name)
-                logger.info(f"Добавлено изображение {image_id} с именем '{name}'")
-            except Exception as e:
-                logger.error(f"Ошибка при добавлении изображения {image_path}: {e}")
-
-        # Если нет добавленных изображений, завершаем с ошибкой
-        if not recognizer.target_embeddings:
-            logger.error(f"Не удалось добавить ни одного изображения для задачи {task_id}")
-            update_task_by_user_key(user_key=task_id, status="error")
-            return
-
-        # Запускаем распознавание
-        logger.info(f"Распознавание видео для задачи {task_id}")
-        log_output = recognizer.recognize_in_video(video_path)
-
-        # Сохраняем результат
-        result_path = os.path.join("results", f"{task_id}.txt")
-        with open(result_path, "w", encoding="utf-8") as f:
-            f.write(log_output)
-
-        logger.info(f"Обработка видео завершена для задачи {task_id}, обновляем статус на 'done'")
-        update_task_by_user_key(user_key=task_id, status="done", result_path=result_path)
-        logger.info(f"Статус задачи {task_id} обновлен на 'done'")
-    except Exception as e:
-        logger.error(f"Ошибка обработки {task_id}: {e}")
-        update_task_by_user_key(user_key=task_id, status="error")
-        logger.error(f"Статус задачи {task_id} обновлен на 'error'")
-    finally:
+        return json.loads(image_names)
+    except json.JSONDecodeError:
+        logger.error(f"Ошибка при парсинге JSON имен: {image_names}")
+        return {}
+
+
+def parse_number(value, kind):
+    """Число из поля формы; пустое или некорректное значение - None"""
+    try:
+        return kind(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def cleanup_stored_files(stored_files):
+    for stored in stored_files:
+        if os.path.exists(stored.path):
+            os.remove(stored.path)
+
+
+@app.post("/uploads/")
+async def create_video_upload(filename: str = Form(...), size: int = Form(...),
+                              current_user = Depends(get_current_user_or_redirect)):
+    """Начало возобновляемой загрузки видео: дальше файл передается частями через PUT /uploads/{id}."""
+    if isinstance(current_user, RedirectResponse):
+        return current_user
+    if size <= 0 or size > MAX_VIDEO_BYTES:
+        return JSONResponse({"error": f"Допустимый размер видео до {MAX_VIDEO_BYTES // (1024 * 1024)} МБ"},
+                            status_code=413)
+
+    os.makedirs("temp", exist_ok=True)
+    upload_id = str(uuid.uuid4())
+    path = os.path.join("temp", f"{upload_id}_{safe_filename(filename)}")
+    if not await create_upload(current_user["id"], safe_filename(filename), path, size, upload_id):
+        return JSONResponse({"error": "Не удалось создать загрузку"}, status_code=500)
+    open(path, "wb").close()
+    return JSONResponse({"upload_id": upload_id, "offset": 0, "size": size, "chunk_size": UPLOAD_CHUNK_BYTES})
+
+
+@app.get("/uploads/{upload_id}")
+async def get_video_upload(upload_id: str, current_user = Depends(get_current_user_or_redirect)):
+    """Сколько байт уже принято: с этого смещения клиент продолжает загрузку."""
+    if isinstance(current_user, RedirectResponse):
+        return current_user
+
+    upload = await get_upload(upload_id)
+    if not upload or upload["user_id"] != current_user["id"]:
+        return JSONResponse({"error": "Загрузка не найдена"}, status_code=404)
+    return JSONResponse({"upload_id": upload_id, "offset": upload["received"], "size": upload["size"],
+                         "complete": upload["received"] == upload["size"]})
+
+
+@app.put("/uploads/{upload_id}")
+async def put_video_chunk(request: Request, upload_id: str, offset: int,
+                          current_user = Depends(get_current_user_or_redirect)):
+    """Прием очередной части видео; offset должен совпадать с уже принятым размером."""
+    if isinstance(current_user, RedirectResponse):
+        return current_user
+
+    lock = upload_locks.setdefault(upload_id, asyncio.Lock())
+    async with lock:
+        upload = await get_upload(upload_id)
+        if not upload or upload["user_id"] != current_user["id"]:
+            if not upload:
+                upload_locks.pop(upload_id, None)
+            return JSONResponse({"error": "Загрузка не найдена"}, status_code=404)
+        if offset != upload["received"]:
+            return JSONResponse({"error": "Неверное смещение части", "offset": upload["received"]},
+                                status_code=409)
+
+        # При любой ошибке файл уже обрезан до принятого размера: клиент продолжает с offset
         try:
-            # Очищаем временные файлы
-            for image_info in image_paths:
-                image_path = image_info["path"]
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-                    logger.info(f"Удален временный файл изображения: {image_path}")
-
-            if os.path.exists(video_path):
-                os.remove(video_path)
-                logger.info(f"Удален временный файл видео: {video_path}")
-        except Exception as e:
-            logger.error(f"Ошибка при удалении временных файлов: {e}")
+            received, sha256 = await receive_chunk(request, upload)
+        except UploadError as e:
+            return JSONResponse({"error": str(e), "offset": upload["received"]}, status_code=e.status_code)
+        except ClientDisconnect:
+            logger.info(f"Передача части загрузки {upload_id} прервана клиентом")
+            return JSONResponse({"error": "Передача части прервана", "offset": upload["received"]},
+                                status_code=400)
+        except OSError as e:
+            logger.error(f"Ошибка записи части загрузки {upload_id}: {e}")
+            return JSONResponse({"error": "Не удалось сохранить часть", "offset": upload["received"]},
+                                status_code=400)
+
+        await update_upload_received(upload_id, received, sha256)
+        if sha256:
+            upload_locks.pop(upload_id, None)
+            logger.info(f"Загрузка {upload_id} завершена: {received} байт, sha256: {sha256}")
+        return JSONResponse({"upload_id": upload_id, "offset": received, "size": upload["size"],
+                             "complete": sha256 is not None})
+
+
+@app.get("/galleries/")
+async def list_galleries(current_user = Depends(get_current_user_or_redirect)):
+    """Сохраненные галереи эталонов пользователя."""
+    if isinstance(current_user, RedirectResponse):
+        return current_user
+    return JSONResponse({"galleries": await get_user_galleries(current_user["id"])})
+
+
+@app.post("/galleries/")
+async def create_user_gallery(name: str = Form(...), current_user = Depends(get_current_user_or_redirect)):
+    """Создание именованной галереи эталонов, которую можно использовать в нескольких задачах."""
+    if isinstance(current_user, RedirectResponse):
+        return current_user
+    if not name.strip():
+        return JSONResponse({"error": "Не указано имя галереи"}, status_code=400)
+
+    success, result = await create_gallery(current_user["id"], name.strip())
+    if not success:
+        return JSONResponse({"error": result}, status_code=409)
+    return JSONResponse({"gallery_id": result, "name": name.strip()})
+
+
+@app.get("/galleries/{gallery_id}")
+async def get_user_gallery(gallery_id: str, current_user = Depends(get_current_user_or_redirect)):
+    """Эталоны галереи и состояние расчета их эмбеддингов (pending, ready, error)."""
+    if isinstance(current_user, RedirectResponse):
+        return current_user
+
+    gallery = await get_gallery(gallery_id, current_user["id"])
+    if not gallery:
+        return JSONResponse({"error": "Галерея не найдена"}, status_code=404)
+    return JSONResponse(dict(gallery, items=await get_gallery_items(gallery_id)))
+
+
+@app.delete("/galleries/{gallery_id}")
+async def delete_user_gallery(gallery_id: str, current_user = Depends(get_current_user_or_redirect)):
+    if isinstance(current_user, RedirectResponse):
+        return current_user
+
+    if not await delete_gallery(gallery_id, current_user["id"]):
+        return JSONResponse({"error": "Галерея не найдена"}, status_code=404)
+    return JSONResponse({"deleted": gallery_id})
+
+
+@app.post("/galleries/{gallery_id}/items")
+async def add_user_gallery_items(request: Request, gallery_id: str,
+                                 current_user = Depends(get_current_user_or_redirect)):
+    """
+    Добавление эталонов в галерею: поля формы images (несколько файлов) и image_names (JSON с именами).
+
+    Эмбеддинги считаются воркером только для новых изображений, остальные эталоны галереи не пересчитываются.
+    """
+    if isinstance(current_user, RedirectResponse):
+        return current_user
+
+    if not await get_gallery(gallery_id, current_user["id"]):
+        return JSONResponse({"error": "Галерея не найдена"}, status_code=404)
+
+    os.makedirs("temp", exist_ok=True)
+    item_ids = []
+
+    def path_for(field, filename, index):
+        if field != "images":
+            return None
+        item_ids.append(str(uuid.uuid4()))
+        return os.path.join("temp", f"{item_ids[-1]}_{filename}"), MAX_IMAGE_BYTES
+
+    try:
+        fields, files = await StreamingFormParser(request, path_for).parse()
+    except UploadError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+
+    names_dict = parse_names((fields.get("image_names") or [None])[0])
+    items = []
+    for i, (item_id, image) in enumerate(zip(item_ids, files.get("images", []))):
+        if image.size == 0:
+            cleanup_stored_files([image])
+            continue
+        name = names_dict.get(str(i)) or os.path.splitext(image.filename)[0]
+        items.append({"id": item_id, "path": image.path, "name": name.strip() or f"Лицо {i + 1}"})
+
+    if not items:
+        return JSONResponse({"error": "Не переданы эталонные изображения"}, status_code=400)
+
+    await add_gallery_items(gallery_id, [(item["id"], item["name"]) for item in items])
+    await enqueue_job(f"gallery:{gallery_id}", {"kind": "gallery", "gallery_id": gallery_id, "items": items})
+    return JSONResponse({"gallery_id": gallery_id,
+                         "items": [{"id": item["id"], "name": item["name"], "status": "pending"} for item in items]})
+
+
+@app.delete("/galleries/{gallery_id}/items/{item_id}")
+async def delete_user_gallery_item(gallery_id: str, item_id: str,
+                                   current_user = Depends(get_current_user_or_redirect)):
+    """Удаление эталона из галереи; эмбеддинги остальных эталонов остаются без изменений."""
+    if isinstance(current_user, RedirectResponse):
+        return current_user
+
+    if not await get_gallery(gallery_id, current_user["id"]) or not await delete_gallery_item(gallery_id, item_id):
+        return JSONResponse({"error": "Эталон не найден"}, status_code=404)
+    return JSONResponse({"deleted": item_id})
+
+
+@app.get("/metrics")
+async def metrics(current_user = Depends(get_current_user_or_redirect)):
+    # Метрики очереди и воркеров доступны только авторизованным пользователям
+    if isinstance(current_user, RedirectResponse):
+        return current_user
+
+    return JSONResponse({
+        "jobs": await count_jobs(),
+        "workers": await get_worker_metrics(),
+        "event_watchers": task_broadcaster.watchers(),
+        "user_cache": user_cache.stats()
+    })
 
 
 @app.get("/status/{task_id}")
@@ -316,16 +563,37 @@ async def check_status(task_id: str, current_user = Depends(get_current_user_or_
     if isinstance(current_user, RedirectResponse):
         return current_user
 
-    import time
-    time.sleep(0.2)  # Задержка 200 мс для наглядности
-
     # task_id используется как user_key с проверкой принадлежности пользователю
-    task = get_task_with_user_check(task_id, current_user["id"])
+    task = await get_task_with_user_check(task_id, current_user["id"])
     if not task:
         return JSONResponse({"error": "Задача не найдена или у вас нет доступа к ней"})
 
-    task_id_db, status, result_path = task
-    return JSONResponse({"status": status})
+    try:
+        state = await get_task_state(task_id)
+    except Exception as e:
+        logger.error(f"Ошибка при запросе состояния задачи {task_id}: {e}")
+        state = None
+    return JSONResponse(state or {"status": task[1]})
+
+
+@app.get("/events/{task_id}")
+async def task_events(request: Request, task_id: str, current_user = Depends(get_current_user_or_redirect)):
+    """Ход выполнения задачи через Server-Sent Events: событие отправляется при каждом изменении."""
+    if isinstance(current_user, RedirectResponse):
+        return current_user
+
+    task = await get_task_with_user_check(task_id, current_user["id"])
+    if not task:
+        return JSONResponse({"error": "Задача не найдена или у вас нет доступа к ней"})
+
+    async def stream():
+        async for state in task_broadcaster.subscribe(task_id):
+            if await request.is_disconnected():
+                break
+            yield f"event: progress\ndata: {json.dumps(state or {'status': 'error'})}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.get("/download/{task_id}")
@@ -334,13 +602,37 @@ async def download_result(task_id: str, current_user = Depends(get_current_user_
     if isinstance(current_user, RedirectResponse):
         return current_user
 
-    task = get_task_with_user_check(task_id, current_user["id"])
-    if not task or task[1] != "done" or not task[2]:
+    task = await get_task_with_user_check(task_id, current_user["id"])
+    if not task or task[1] not in ("done", "in_progress") or not task[2] or not os.path.exists(task[2]):
         return JSONResponse({"error": "Результат недоступен или у вас нет доступа к нему"})
 
+    if task[1] == "in_progress":
+        # Файл еще дописывается воркером: отдаем снимок уже записанной части
+        return StreamingResponse(
+            read_file_snapshot(task[2]),
+            media_type="text/plain; charset=utf-8",
+            headers={"Content-Disposition": content_disposition("результат_распознавания_частичный.txt")}
+        )
+
     return FileResponse(task[2], media_type="text/plain", filename="результат_распознавания.txt")
 
 
+def read_file_snapshot(path, chunk_size=64 * 1024):
+    """Читает файл до размера на момент вызова, не захватывая строки, дописанные позже."""
+    remaining = os.path.getsize(path)
+    with open(path, "rb") as f:
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def content_disposition(filename):
+    return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request, task_id: str = None, current_user = Depends(get_current_user)):
     # Проверяем аутентификацию
@@ -350,17 +642,19 @@ async def index(request: Request, task_id: str = None, current_user = Depends(ge
     task_status = None
     if task_id:
         # Используем функцию с проверкой принадлежности пользователю
-        task = get_task_with_user_check(task_id, current_user["id"])
+        task = await get_task_with_user_check(task_id, current_user["id"])
         if task:
             task_status = task[1]  # Статус из базы данных
 
     # Получаем список задач пользователя
-    user_tasks = get_user_tasks(current_user["id"])
+    user_tasks = await get_user_tasks(current_user["id"])
+    user_galleries = await get_user_galleries(current_user["id"])
 
     return templates.TemplateResponse("index.html", {
         "request": request,
         "task_id": task_id,
         "task_status": task_status,
         "user": current_user,
-        "user_tasks": user_tasks
+        "user_tasks": user_tasks,
+        "user_galleries": user_galleries
     })
\ No newline at end of file
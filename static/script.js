@@ -125,6 +125,8 @@ function updateNamesField() {
 let taskStatusIsInProgress = false;
 // Идентификатор таймера для возможности его отмены
 let statusCheckTimer = null;
+// Подписка на события хода выполнения задачи (Server-Sent Events)
+let statusEventSource = null;
 
 async function checkStatus(event) {
     if (event) {
@@ -151,11 +153,8 @@ async function checkStatus(event) {
 
         const data = await response.json();
 
-        // Очищаем предыдущий таймер, если он был установлен
-        if (statusCheckTimer) {
-            clearTimeout(statusCheckTimer);
-            statusCheckTimer = null;
-        }
+        // Очищаем предыдущий таймер и подписку, если они были установлены
+        stopStatusUpdates();
 
         if (data.error) {
             taskStatusIsInProgress = false;
@@ -171,11 +170,17 @@ async function checkStatus(event) {
         } else if (data.status === "in_progress") {
             taskStatusIsInProgress = true;
             statusElement.innerHTML = `<p class="progress-text">Статус задачи: <strong>В процессе</strong></p>
+                                      <p id="task_progress">${formatProgress(data)}</p>
                                       <p>Обработка может занять несколько минут в зависимости от размера видео.</p>
+                                      <a href="/download/${taskId}" class="download-btn">Скачать частичный результат</a>
                                       <button onclick="checkStatusAgain()" class="refresh-btn">Проверить снова</button>`;
 
-            // Запускаем автоматическую проверку статуса через 60 секунд только если задача еще в процессе
-            statusCheckTimer = setTimeout(checkStatusAgain, 60000);
+            // Подписываемся на обновления хода выполнения; без поддержки SSE проверяем раз в 60 секунд
+            if (window.EventSource) {
+                subscribeToProgress(taskId);
+            } else {
+                statusCheckTimer = setTimeout(checkStatusAgain, 60000);
+            }
         } else {
             taskStatusIsInProgress = false;
             statusElement.innerHTML = `<p>Статус задачи: <strong>${data.status}</strong></p>`;
@@ -187,6 +192,51 @@ async function checkStatus(event) {
     }
 }
 
+function formatProgress(data) {
+    if (!data.total_frames) {
+        return 'Ожидание обработки...';
+    }
+    const percent = Math.min(100, Math.round(data.frames_processed * 100 / data.total_frames));
+    let text = `Обработано кадров: ${data.frames_processed} из ${data.total_frames} (${percent}%), совпадений: ${data.detections}`;
+    if (data.eta_seconds !== null && data.eta_seconds !== undefined) {
+        text += `, осталось примерно ${Math.ceil(data.eta_seconds)} сек`;
+    }
+    return text;
+}
+
+function subscribeToProgress(taskId) {
+    statusEventSource = new EventSource(`/events/${taskId}`);
+    statusEventSource.addEventListener('progress', function(event) {
+        const data = JSON.parse(event.data);
+        if (data.status === 'in_progress') {
+            const progressElement = document.getElementById('task_progress');
+            if (progressElement) {
+                progressElement.textContent = formatProgress(data);
+            }
+        } else {
+            // Задача завершилась: показываем итоговый статус
+            stopStatusUpdates();
+            checkStatus();
+        }
+    });
+    statusEventSource.onerror = function() {
+        // Соединение потеряно: переходим на редкую проверку статуса
+        stopStatusUpdates();
+        statusCheckTimer = setTimeout(checkStatusAgain, 60000);
+    };
+}
+
+function stopStatusUpdates() {
+    if (statusCheckTimer) {
+        clearTimeout(statusCheckTimer);
+        statusCheckTimer = null;
+    }
+    if (statusEventSource) {
+        statusEventSource.close();
+        statusEventSource = null;
+    }
+}
+
 function checkStatusAgain() {
     // Проверяем статус только если задача еще в процессе обработки
     // или если функция вызвана напрямую (например, по нажатию кнопки)
@@ -197,15 +247,124 @@ function checkStatusAgain() {
 document.addEventListener('DOMContentLoaded', function() {
     // Сброс статуса при отправке новой формы распознавания
     const recognizeForm = document.getElementById('recognize_form');
+
+    // При выборе сохраненной галереи эталонные изображения не обязательны
+    const gallerySelect = document.getElementById('gallery-select');
+    if (gallerySelect) {
+        gallerySelect.addEventListener('change', function() {
+            document.getElementById('images-input').required = !gallerySelect.value;
+        });
+    }
+
     if (recognizeForm) {
-        recognizeForm.addEventListener('submit', function() {
+        recognizeForm.addEventListener('submit', function(event) {
             // Сбрасываем статус отслеживания задачи при начале новой
             taskStatusIsInProgress = false;
-            // Очищаем таймер, если он был установлен
-            if (statusCheckTimer) {
-                clearTimeout(statusCheckTimer);
-                statusCheckTimer = null;
+            // Очищаем таймер и подписку, если они были установлены
+            stopStatusUpdates();
+
+            // Большое видео отправляем частями с возможностью продолжить после обрыва
+            const videoFile = document.getElementById('video-input').files[0];
+            if (videoFile && videoFile.size > CHUNKED_UPLOAD_THRESHOLD) {
+                event.preventDefault();
+                submitWithChunkedVideo(recognizeForm, videoFile);
             }
         });
     }
-});
\ No newline at end of file
+});
+
+// Видео больше этого размера загружается частями через /uploads/
+const CHUNKED_UPLOAD_THRESHOLD = 64 * 1024 * 1024;
+const CHUNK_RETRIES = 5;
+
+function showUploadProgress(text) {
+    const progressElement = document.getElementById('upload-progress');
+    if (progressElement) {
+        progressElement.textContent = text;
+    }
+}
+
+// Ключ для сохранения загрузки между перезагрузками страницы
+function uploadStorageKey(file) {
+    return `upload:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+async function startOrResumeUpload(file) {
+    const savedId = localStorage.getItem(uploadStorageKey(file));
+    if (savedId) {
+        const response = await fetch(`/uploads/${savedId}`);
+        if (response.ok) {
+            const data = await response.json();
+            if (data.upload_id) {
+                return data;
+            }
+        }
+        localStorage.removeItem(uploadStorageKey(file));
+    }
+
+    const formData = new FormData();
+    formData.append('filename', file.name);
+    formData.append('size', file.size);
+    const response = await fetch('/uploads/', { method: 'POST', body: formData });
+    const data = await response.json();
+    if (!response.ok || !data.upload_id) {
+        throw new Error(data.error || 'Не удалось начать загрузку видео');
+    }
+    localStorage.setItem(uploadStorageKey(file), data.upload_id);
+    return data;
+}
+
+async function uploadVideoInChunks(file) {
+    const upload = await startOrResumeUpload(file);
+    const chunkSize = upload.chunk_size || 8 * 1024 * 1024;
+    let offset = upload.offset;
+    let retries = 0;
+
+    while (offset < file.size) {
+        showUploadProgress(`Загрузка видео: ${Math.floor(offset * 100 / file.size)}%`);
+        try {
+            const chunk = file.slice(offset, offset + chunkSize);
+            const response = await fetch(`/uploads/${upload.upload_id}?offset=${offset}`, { method: 'PUT', body: chunk });
+            const data = await response.json();
+            if (response.status === 409 || response.ok) {
+                // При несовпадении смещения продолжаем с позиции, которую знает сервер
+                offset = data.offset;
+                retries = 0;
+                continue;
+            }
+            throw new Error(data.error || `Ошибка загрузки части видео (${response.status})`);
+        } catch (error) {
+            retries++;
+            if (retries > CHUNK_RETRIES) {
+                throw error;
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+        }
+    }
+
+    return upload.upload_id;
+}
+
+async function submitWithChunkedVideo(form, videoFile) {
+    const submitButton = form.querySelector('button[type="submit"]');
+    submitButton.disabled = true;
+    try {
+        const uploadId = await uploadVideoInChunks(videoFile);
+        showUploadProgress('Видео загружено, создаем задачу...');
+
+        const formData = new FormData(form);
+        formData.delete('video');
+        formData.append('video_upload_id', uploadId);
+        const response = await fetch(form.action, { method: 'POST', body: formData });
+        if (!response.redirected) {
+            const data = await response.json();
+            throw new Error(data.error || 'Не удалось создать задачу');
+        }
+        localStorage.removeItem(uploadStorageKey(videoFile));
+        window.location.href = response.url;
+    } catch (error) {
+        console.error('Ошибка при загрузке видео:', error);
+        showUploadProgress(`Ошибка: ${error.message}. Отправьте форму еще раз, загрузка продолжится.`);
+        submitButton.disabled = false;
+    }
+}
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+
+from database.async_database import get_task_state
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1.0
+FINAL_STATUSES = ("done", "error")
+
+
+class TaskEventBroadcaster:
+    """
+    Рассылка хода выполнения задач подписчикам Server-Sent Events.
+
+    На каждую задачу работает один опрос базы, сколько бы клиентов за ней ни следило;
+    подписчики получают состояние только при его изменении.
+    """
+
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._subscribers = {}  # {task_key: set(asyncio.Queue)}
+        self._pollers = {}      # {task_key: asyncio.Task}
+        self._last_state = {}   # {task_key: последнее состояние}
+
+    async def subscribe(self, task_key):
+        """Асинхронный генератор состояний задачи; завершается, когда задача выполнена или упала"""
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(task_key, set()).add(queue)
+        if task_key in self._last_state:
+            queue.put_nowait(self._last_state[task_key])
+
+        poller = self._pollers.get(task_key)
+        if poller is None or poller.done():
+            self._pollers[task_key] = asyncio.create_task(self._poll(task_key))
+
+        try:
+            while True:
+                state = await queue.get()
+                yield state
+                if state is None or state["status"] in FINAL_STATUSES:
+                    break
+        finally:
+            subscribers = self._subscribers.get(task_key, set())
+            subscribers.discard(queue)
+            if not subscribers:
+                self._subscribers.pop(task_key, None)
+                self._last_state.pop(task_key, None)
+                poller = self._pollers.pop(task_key, None)
+                if poller:
+                    poller.cancel()
+
+    async def _poll(self, task_key):
+        while True:
+            try:
+                state = await get_task_state(task_key)
+            except Exception as e:
+                # Временная ошибка базы не означает, что задача завершилась: повторяем опрос
+                logger.error(f"Ошибка при опросе состояния задачи {task_key}: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            if state != self._last_state.get(task_key, ...):
+                self._last_state[task_key] = state
+                for queue in self._subscribers.get(task_key, ()):
+                    queue.put_nowait(state)
+
+            if state is None or state["status"] in FINAL_STATUSES:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def watchers(self):
+        """Количество подписчиков и задач, за которыми они следят (без ключей задач: метрики видны всем пользователям)"""
+        return {
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "tasks": len(self._subscribers),
+        }
@@ -0,0 +1,30 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Тесты запускаются из корня проекта: python -m pytest tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.database при импорте создает базу и лог: в тестах они пишутся во временный каталог,
+# а не в database/recognition.db и server.log проекта
+_TEST_DIR = tempfile.mkdtemp(prefix="face-recognition-tests-")
+os.environ["DB_PATH"] = os.path.join(_TEST_DIR, "recognition.db")
+os.environ["LOG_FILE"] = os.path.join(_TEST_DIR, "server.log")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Модуль database.database с пулом соединений к новой базе во временном каталоге"""
+    from database import database as db
+    from database.connection import ConnectionPool
+
+    monkeypatch.setattr(db, "pool", ConnectionPool(str(tmp_path / "recognition.db"), size=2))
+    db.init_db()
+    return db
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from logic.detection_scale import ScaledDetector
+
+BOXES = [[40, 40, 400, 400], [600, 100, 60, 60]]   # Крупное и мелкое лицо в исходном кадре
+
+
+class CountingDetector:
+    """Находит лица BOXES в любом кадре: для уменьшенного кадра - в его масштабе, для области - по ее размеру"""
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.calls = []
+
+    def __call__(self, frame):
+        self.calls.append(frame.shape[:2])
+        if len(self.calls) == 1:
+            return [(("small", i), [int(v * self.scale) for v in box]) for i, box in enumerate(BOXES)]
+        height, width = frame.shape[:2]
+        return [(("refined", width), [10, 10, width - 20, height - 20])]
+
+
+@pytest.mark.parametrize("refine, refined", [("auto", 1), ("always", 2), ("never", 0)])
+def test_refine_runs_only_for_faces_smaller_than_model_input(refine, refined):
+    detect = CountingDetector(0.5)
+    detector = ScaledDetector(detect, 0.5, refine=refine)
+    faces = detector(np.zeros((1000, 1000, 3), dtype=np.uint8))
+
+    assert [box for _, box in faces] == BOXES
+    assert len(detect.calls) == 1 + refined
+    assert detector.faces_reused == 2 - refined
+    assert detector.faces_refined == refined
+    # Крупное лицо в режиме auto берется выровненным с первого прохода
+    assert faces[0][0][0] == ("refined" if refine == "always" else "small")
+
+
+def test_unknown_refine_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ScaledDetector(CountingDetector(0.5), 0.5, refine="sometimes")
@@ -0,0 +1,55 @@
+from logic.face_tracking import FaceTracker, box_iou
+
+
+def test_box_iou():
+    assert box_iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1.0
+    assert box_iou([0, 0, 10, 10], [20, 20, 10, 10]) == 0.0
+    assert abs(box_iou([0, 0, 10, 10], [5, 0, 10, 10]) - 50 / 150) < 1e-9
+
+
+def test_track_reused_while_face_stays_in_place():
+    tracker = FaceTracker(refresh_interval=100)
+    (track, needs_embedding), = tracker.update([[10, 10, 50, 50]])
+    assert needs_embedding
+
+    for _ in range(5):
+        (same, needs_embedding), = tracker.update([[12, 11, 50, 50]])
+        assert same is track
+        assert not needs_embedding
+
+
+def test_embedding_refreshed_by_interval():
+    tracker = FaceTracker(refresh_interval=3)
+    flags = [tracker.update([[10, 10, 50, 50]])[0][1] for _ in range(7)]
+    assert flags == [True, False, False, True, False, False, True]
+
+
+def test_embedding_refreshed_when_box_moves():
+    tracker = FaceTracker(refresh_interval=100, iou_threshold=0.3, move_iou=0.8)
+    (track, _), = tracker.update([[10, 10, 50, 50]])
+    # Рамка осталась в треке (IoU выше iou_threshold), но сместилась сильнее move_iou
+    (same, needs_embedding), = tracker.update([[20, 10, 50, 50]])
+    assert same is track
+    assert needs_embedding
+    # Смещение считается от рамки последнего эмбеддинга
+    (same, needs_embedding), = tracker.update([[21, 10, 50, 50]])
+    assert not needs_embedding
+
+
+def test_new_track_for_distant_face_and_track_expiry():
+    tracker = FaceTracker(max_missed=1)
+    (first, _), = tracker.update([[10, 10, 50, 50]])
+    (second, needs_embedding), = tracker.update([[200, 200, 50, 50]])
+    assert second is not first
+    assert needs_embedding
+
+    tracker.update([])
+    assert [track.track_id for track in tracker.tracks] == [second.track_id]
+    tracker.update([])
+    assert tracker.tracks == []
+
+
+def test_first_id():
+    tracker = FaceTracker(first_id=1000001)
+    (track, _), = tracker.update([[0, 0, 10, 10]])
+    assert track.track_id == 1000001
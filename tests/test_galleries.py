@@ -0,0 +1,89 @@
+import pytest
+
+
+def make_gallery_job(database, max_attempts=3):
+    _, gallery_id = database.create_gallery("user", "Сотрудники")
+    database.add_gallery_items(gallery_id, [("item_1", "А"), ("item_2", "Б")])
+    database.update_gallery_item("item_1", "ready", b"\0" * 16, "model")
+    items = [{"id": "item_1", "path": "a.png", "name": "А"}, {"id": "item_2", "path": "b.png", "name": "Б"}]
+    database.enqueue_job(f"gallery:{gallery_id}", {"kind": "gallery", "gallery_id": gallery_id, "items": items},
+                         max_attempts=max_attempts)
+    return gallery_id
+
+
+def statuses(database, gallery_id):
+    return {item["id"]: item["status"] for item in database.get_gallery_items(gallery_id)}
+
+
+def test_exhausted_gallery_job_fails_its_pending_items(database):
+    gallery_id = make_gallery_job(database, max_attempts=1)
+    assert database.claim_job("worker", lease_seconds=-1)  # Воркер взял задание и пропал
+
+    database.fail_exhausted_jobs()
+    assert database.count_jobs() == {"failed": 1}
+    assert statuses(database, gallery_id) == {"item_1": "ready", "item_2": "error"}
+
+
+def test_failed_gallery_job_fails_its_pending_items(database, monkeypatch):
+    pytest.importorskip("deepface")
+    import worker
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("модель не загрузилась")
+
+    gallery_id = make_gallery_job(database)
+    monkeypatch.setattr(worker, "FaceRecognitionLogic", fail)
+    job = database.claim_job("worker", 60)
+    worker.run_job(job, "worker")
+
+    assert database.count_jobs() == {"failed": 1}
+    assert statuses(database, gallery_id) == {"item_1": "ready", "item_2": "error"}
+
+
+def test_gallery_index_is_saved_once_per_gallery_version(database, tmp_path, monkeypatch):
+    pytest.importorskip("deepface")
+    import numpy as np
+    from logic import galleries
+    from logic.face_recognition_logic import FaceRecognitionLogic
+    from test_video_segments import TestRegistry
+
+    monkeypatch.setattr(galleries, "GALLERY_INDEX_DIR", str(tmp_path / "galleries"))
+    loads = []
+    load_gallery_index = galleries.load_gallery_index
+
+    def load_saved_index(path):
+        loads.append(path)
+        return load_gallery_index(path)
+
+    monkeypatch.setattr(galleries, "load_gallery_index", load_saved_index)
+
+    def recognizer():
+        return FaceRecognitionLogic(registry=TestRegistry(), embedding_cache=False, gallery_kind="ivf")
+
+    vectors = np.eye(8, dtype=np.float32)
+    _, gallery_id = database.create_gallery("user", "Сотрудники")
+    database.add_gallery_items(gallery_id, [(f"item_{i}", f"Лицо {i}") for i in range(4)])
+    key = galleries.model_key(recognizer())
+    for i in range(4):
+        database.update_gallery_item(f"item_{i}", "ready", vectors[i].tobytes(), key)
+
+    def match(queries, loaded=4):
+        r = recognizer()
+        r.add_target_embeddings([{"id": "image_0", "name": "Эталон задачи"}], vectors[7:8])
+        assert galleries.load_gallery(r, gallery_id) == loaded
+        return [image_id for image_id, _ in r.match_embeddings(queries)]
+
+    gallery_dir = tmp_path / "galleries" / gallery_id
+    assert match(vectors[[0, 3, 7]]) == ["item_0", "item_3", "image_0"]
+    assert not loads and len(list(gallery_dir.iterdir())) == 1
+
+    # Вторая задача загружает сохраненный индекс, эталон задачи в сохраненный индекс не попадает
+    assert match(vectors[[1, 7]]) == ["item_1", "image_0"]
+    assert len(loads) == 1 and len(list(gallery_dir.iterdir())) == 1
+
+    # Изменение галереи меняет версию: индекс строится заново, прежняя версия удаляется
+    versions = set(gallery_dir.iterdir())
+    assert database.delete_gallery_item(gallery_id, "item_3")
+    assert match(vectors[[2, 3]], loaded=3)[0] == "item_2"
+    assert len(loads) == 1 and set(gallery_dir.iterdir()).isdisjoint(versions)
+    assert len(list(gallery_dir.iterdir())) == 1
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from logic import gallery_index
+from logic.gallery_index import ExactIndex, HnswIndex, IvfIndex, create_gallery_index, load_gallery_index
+
+DIM = 64
+SIZE = 2000
+
+
+def make_index(kind):
+    if kind == "hnsw":
+        pytest.importorskip("hnswlib")
+        return HnswIndex(DIM)
+    if kind == "ivf":
+        return IvfIndex(DIM, nprobe=8, train_size=500)  # Обучается на части набора, остальное раскладывается
+    return ExactIndex(DIM)
+
+
+@pytest.fixture(scope="module")
+def gallery():
+    rng = np.random.default_rng(1)
+    ids = [f"ref_{i}" for i in range(SIZE)]
+    vectors = rng.normal(size=(SIZE, DIM)).astype(np.float32)
+    queries = vectors + rng.normal(scale=0.05, size=vectors.shape).astype(np.float32)
+    return ids, vectors, queries
+
+
+@pytest.mark.parametrize("kind", ["exact", "ivf", "hnsw"])
+def test_search_finds_nearest_reference(kind, gallery):
+    ids, vectors, queries = gallery
+    index = make_index(kind)
+    for start in range(0, SIZE, 250):
+        index.add(ids[start:start + 250], vectors[start:start + 250])
+    assert len(index) == SIZE
+
+    found, scores = index.search(queries)
+    recall = np.mean([a == b for a, b in zip(found, ids)])
+    assert recall == 1.0 if kind == "exact" else recall >= 0.95
+    assert scores.dtype == np.float32
+    assert np.all(scores[np.array(found) == np.array(ids)] > 0.99)
+
+
+@pytest.mark.parametrize("kind", ["exact", "ivf", "hnsw"])
+def test_remove_and_replace(kind, gallery):
+    ids, vectors, queries = gallery
+    index = make_index(kind)
+    index.add(ids[:600], vectors[:600])
+
+    index.remove(["ref_0", "missing"])
+    assert len(index) == 599
+    found, _ = index.search(queries[:1])
+    assert found[0] != "ref_0"
+
+    # Повторное добавление ID заменяет эмбеддинг, а не дублирует запись
+    index.add(["ref_1"], vectors[2:3])
+    assert len(index) == 599
+    found, _ = index.search(vectors[2:3])
+    assert found[0] in ("ref_1", "ref_2")
+    found, _ = index.search(queries[1:2])
+    assert found[0] != "ref_1"
+
+
+@pytest.mark.parametrize("kind", ["exact", "ivf", "hnsw"])
+def test_save_and_load(kind, gallery, tmp_path):
+    ids, vectors, queries = gallery
+    index = make_index(kind)
+    index.add(ids[:800], vectors[:800])
+    path = str(tmp_path / "gallery")
+    index.save(path)
+
+    loaded = load_gallery_index(path)
+    assert type(loaded) is type(index)
+    assert len(loaded) == len(index)
+    assert loaded.search(queries[:800])[0] == index.search(queries[:800])[0]
+
+
+@pytest.mark.parametrize("kind", ["exact", "ivf", "hnsw"])
+def test_empty_index(kind):
+    found, scores = make_index(kind).search(np.ones((2, DIM), dtype=np.float32))
+    assert found == [None, None]
+    assert scores.tolist() == [0.0, 0.0]
+
+
+def test_auto_kind(monkeypatch):
+    assert create_gallery_index(DIM, "auto", expected_size=10).kind == "exact"
+    monkeypatch.setattr(gallery_index, "hnswlib", None)
+    assert create_gallery_index(DIM, "auto", expected_size=10 ** 6).kind == "ivf"
+    assert create_gallery_index(DIM, "hnsw").kind == "ivf"
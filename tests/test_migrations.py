@@ -0,0 +1,64 @@
+import sqlite3
+
+from database.connection import ConnectionPool
+
+
+def tables(db):
+    with db.session() as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def schema_version(db):
+    with db.session() as conn:
+        return db.get_schema_version(conn.cursor())
+
+
+def test_versions_increase():
+    from database.database import MIGRATIONS
+
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == sorted(set(versions))
+    assert versions[0] == 1
+
+
+def test_fresh_database_has_latest_version_and_all_tables(database):
+    assert schema_version(database) == database.MIGRATIONS[-1][0]
+    assert {
+        "users", "recognition_tasks", "task_images", "uploads", "result_cache", "video_indexes",
+        "galleries", "gallery_items", "task_segments", "reference_embeddings", "jobs", "task_progress",
+        "worker_metrics",
+    } <= tables(database)
+
+
+def test_init_db_is_idempotent(database):
+    before = tables(database)
+    database.init_db()
+    assert tables(database) == before
+    assert schema_version(database) == database.MIGRATIONS[-1][0]
+
+
+def test_upgrade_database_created_before_migration_8(tmp_path, monkeypatch):
+    """База версии 7, где очередь заданий и метрики создавал init_db, обновляется без потери данных"""
+    from database import database as db
+
+    path = str(tmp_path / "legacy.db")
+    monkeypatch.setattr(db, "pool", ConnectionPool(path, size=2))
+    monkeypatch.setattr(db, "MIGRATIONS", [m for m in db.MIGRATIONS if m[0] <= 7])
+    db.init_db()
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, task_key TEXT NOT NULL, payload TEXT NOT NULL, "
+                 "status TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, "
+                 "max_attempts INTEGER NOT NULL DEFAULT 3, worker_id TEXT, lease_until REAL, error TEXT, "
+                 "created_at REAL NOT NULL, updated_at REAL NOT NULL)")
+    conn.execute("INSERT INTO jobs (id, task_key, payload, status, created_at, updated_at) "
+                 "VALUES ('j1', 'k1', '{}', 'queued', 0, 0)")
+    conn.commit()
+    conn.close()
+    assert schema_version(db) == 7
+
+    monkeypatch.undo()
+    monkeypatch.setattr(db, "pool", ConnectionPool(path, size=2))
+    db.init_db()
+    assert schema_version(db) == db.MIGRATIONS[-1][0]
+    assert {"reference_embeddings", "task_progress", "worker_metrics"} <= tables(db)
+    assert db.count_jobs()["queued"] == 1
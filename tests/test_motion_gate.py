@@ -0,0 +1,58 @@
+import re
+
+import cv2
+import numpy as np
+import pytest
+
+from logic.motion_gate import MotionGate
+from test_video_segments import TestRegistry, detect_bright_faces, draw_face, write_video
+
+
+def still(i):
+    return draw_face(0)
+
+
+@pytest.mark.parametrize("method", ["diff", "hist", "phash"])
+def test_gate_skips_unchanged_frames(method):
+    gate = MotionGate(method, max_skip=3)
+    frames = [(i, i / 25, still(i)) for i in range(1, 9)]
+    gated = [frame is None for _, _, frame in gate.frames(frames)]
+    # Первый кадр идет на детекцию, затем не больше max_skip отсеянных подряд
+    assert gated == [False, True, True, True, False, True, True, True]
+    assert gate.stats() == {"motion_gate": method, "frames_gated": 6}
+
+
+def test_gate_passes_changed_frames():
+    gate = MotionGate("diff")
+    frames = [(i, i / 25, draw_face(10 * i)) for i in range(1, 6)]
+    assert all(frame is not None for _, _, frame in gate.frames(frames))
+
+
+@pytest.mark.parametrize("tracking", [True, False])
+def test_gated_frames_reuse_previous_result_without_embedding(tracking, tmp_path, monkeypatch):
+    pytest.importorskip("deepface")
+    import logic.face_recognition_logic as face_recognition_logic
+    from logic.frame_sampling import FrameSampler
+
+    monkeypatch.setattr(face_recognition_logic.FaceDetector, "detect_faces", detect_bright_faces)
+    video = write_video(str(tmp_path / "still.avi"), draw=still)
+    reference = str(tmp_path / "reference.png")
+    cv2.imwrite(reference, draw_face(0)[30:90, 10:70])
+
+    def recognize(motion_gate):
+        recognizer = face_recognition_logic.FaceRecognitionLogic(
+            registry=TestRegistry(), embedding_cache=False, tracking=tracking, motion_gate=motion_gate)
+        recognizer.add_target_image(reference, "image_0", "A")
+        lines = recognizer.recognize_in_video(video, FrameSampler(stride=5)).splitlines()
+        return recognizer, [re.sub(r"^\S+ \S+ - ", "", line) for line in lines[3:]]
+
+    plain, plain_lines = recognize("none")
+    gated, gated_lines = recognize("diff")
+    assert any("обнаружено лицо 'A'" in line for line in plain_lines)
+    assert gated.frames_gated > 0
+    assert gated_lines[:-1] == plain_lines
+    assert gated.last_run_stats["faces_embedded"] <= plain.last_run_stats["faces_embedded"]
+    if not tracking:
+        # Эмбеддинги считаются только для лиц кадров с детекцией
+        assert gated.last_run_stats["faces_embedded"] == gated.last_run_stats["frames_detected"]
+        assert gated.last_run_stats["faces_embedded"] < plain.last_run_stats["faces_embedded"]
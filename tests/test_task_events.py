@@ -0,0 +1,34 @@
+import asyncio
+
+import task_events
+from task_events import TaskEventBroadcaster
+
+
+def collect(broadcaster, task_key):
+    async def run():
+        return [state async for state in broadcaster.subscribe(task_key)]
+    return asyncio.run(run())
+
+
+def test_database_error_does_not_end_stream(monkeypatch):
+    responses = [RuntimeError("database is locked"), {"status": "in_progress"}, RuntimeError("database is locked"),
+                 {"status": "done"}]
+
+    async def get_task_state(task_key):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(task_events, "get_task_state", get_task_state)
+    assert collect(TaskEventBroadcaster(poll_interval=0), "task") == [{"status": "in_progress"}, {"status": "done"}]
+
+
+def test_missing_task_ends_stream(monkeypatch):
+    async def get_task_state(task_key):
+        return None
+
+    monkeypatch.setattr(task_events, "get_task_state", get_task_state)
+    broadcaster = TaskEventBroadcaster(poll_interval=0)
+    assert collect(broadcaster, "task") == [None]
+    assert broadcaster.watchers() == {"subscribers": 0, "tasks": 0}
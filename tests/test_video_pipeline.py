@@ -0,0 +1,34 @@
+import threading
+
+from logic.video_pipeline import FramePipeline
+
+
+def numbered_frames(count):
+    for i in range(1, count + 1):
+        yield i, i / 10, i
+
+
+def test_results_in_frame_order_and_gated_frames_pass_through():
+    frames = ((number, timestamp, None if number % 3 == 0 else frame)
+              for number, timestamp, frame in numbered_frames(20))
+    results = list(FramePipeline(lambda frame: [frame], workers=2, queue_size=4).run(frames))
+    assert [number for number, _, _ in results] == list(range(1, 21))
+    assert [faces for number, _, faces in results] == [None if n % 3 == 0 else [n] for n in range(1, 21)]
+
+
+def test_detection_error_is_returned_for_its_frame():
+    def detect(frame):
+        if frame == 2:
+            raise ValueError("ошибка")
+        return []
+
+    results = list(FramePipeline(detect).run(numbered_frames(3)))
+    assert isinstance(results[1][2], ValueError)
+    assert results[0][2] == results[2][2] == []
+
+
+def test_close_stops_decoding_thread():
+    stages = FramePipeline(lambda frame: [], queue_size=2).run(numbered_frames(10 ** 6))
+    next(stages)
+    stages.close()
+    assert not [thread for thread in threading.enumerate() if thread.name == "decode"]
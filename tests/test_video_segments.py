@@ -0,0 +1,234 @@
+import json
+import os
+import re
+import shutil
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from logic.frame_sampling import FrameSampler
+from logic.result_writer import ResultLog
+from logic.video_segments import merge_segments, plan_segments, segment_paths
+
+FPS = 25
+FRAMES = 100
+
+
+def draw_number(i):
+    """Кадр с номером i в двоичном виде: 8 вертикальных полос, белая полоса - единичный бит"""
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    for bit in range(8):
+        if i >> bit & 1:
+            frame[:, bit * 40:(bit + 1) * 40] = 255
+    return frame
+
+
+def read_number(frame):
+    return sum(1 << bit for bit in range(8) if frame[:, bit * 40 + 10:(bit + 1) * 40 - 10].mean() > 127)
+
+
+def write_video(path, frames=FRAMES, draw=draw_number):
+    """Видео MJPG 320x240 из кадров draw(i)"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (320, 240))
+    for i in range(frames):
+        writer.write(draw(i))
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def numbered_video(tmp_path):
+    return write_video(str(tmp_path / "numbered.avi"))
+
+
+def sample(video_path, **kwargs):
+    sampler = FrameSampler(**kwargs)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        # Номера кадров выборки начинаются с 1, номера в изображении - с 0
+        frames = [(number, read_number(frame) + 1) for number, _, frame in sampler.frames(cap)]
+    finally:
+        cap.release()
+    return frames, sampler.frames_seen
+
+
+@pytest.mark.parametrize("stride, seek", [(5, False), (7, False), (50, True)])
+def test_sampler_decodes_the_frames_it_reports(numbered_video, stride, seek):
+    frames, frames_seen = sample(numbered_video, stride=stride, seek=seek)
+    assert [number for number, _ in frames] == list(range(stride, FRAMES + 1, stride))
+    assert all(number == decoded for number, decoded in frames)
+    assert frames_seen >= frames[-1][0]
+
+
+@pytest.mark.parametrize("stride", [5, 7])
+def test_segments_sample_the_same_frames_as_whole_video(numbered_video, stride):
+    whole, _ = sample(numbered_video, stride=stride)
+    parts = []
+    for start, end in plan_segments(numbered_video, 3, min_seconds=1):
+        frames, frames_seen = sample(numbered_video, stride=stride, start_frame=start, end_frame=end)
+        assert all(start < number <= (end or FRAMES) for number, _ in frames)
+        if end is not None:
+            assert frames_seen == end
+        parts.extend(frames)
+    assert parts == whole
+
+
+def test_plan_segments(numbered_video):
+    # 100 кадров при 25 кадрах/сек - 4 секунды
+    assert plan_segments(numbered_video, 3, min_seconds=1) == [(0, 33), (33, 66), (66, None)]
+    assert plan_segments(numbered_video, 3, min_seconds=2) == [(0, 50), (50, None)]
+    assert plan_segments(numbered_video, 3, min_seconds=3) == []
+    assert plan_segments(numbered_video, 1, min_seconds=0) == []
+
+
+def test_merge_segments_keeps_segment_order(tmp_path):
+    result_path, detections_path = str(tmp_path / "task.txt"), str(tmp_path / "task.jsonl")
+    parts = [segment_paths(result_path, detections_path, segment) for segment in range(3)]
+    for segment, (part_path, part_detections) in enumerate(parts):
+        with open(part_path, "w", encoding="utf-8") as f:
+            f.write("".join(f"отрезок {segment} строка {line}\n" for line in range(2)))
+        if segment != 1:  # У отрезка без совпадений файла JSONL может не быть
+            with open(part_detections, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"frame": segment * 10}) + "\n")
+
+    class Log(ResultLog):
+        def __init__(self):
+            super().__init__()
+            self.detections = []
+
+        def add_detection(self, detection):
+            self.detections.append(detection)
+
+    log = Log()
+    merge_segments(log, parts)
+    assert log.lines == [f"отрезок {segment} строка {line}" for segment in range(3) for line in range(2)]
+    assert log.detections == [{"frame": 0}, {"frame": 20}]
+
+
+def test_segment_finished_twice_is_reported_once(database):
+    database.create_task_segments("task", [(0, 50), (50, None)])
+    assert database.finish_task_segment("task", 0, "done", 50) == 1
+    assert database.finish_task_segment("task", 0, "done", 50) is None
+    assert database.finish_task_segment("task", 1, "done", 100) == 0
+    assert database.finish_task_segment("task", 1, "done", 100) is None
+
+    database.delete_task_segments("task")
+    assert database.finish_task_segment("task", 1, "done", 100) is None
+
+
+# Распознавание целиком: детектор и модель эмбеддингов заменены простыми функциями, чтобы не
+# загружать RetinaFace и Facenet. Лицо - светлый квадрат с полосой, модель - уменьшенная копия лица.
+
+def detect_bright_faces(detector, backend, img, align=True):
+    gray = img.mean(axis=2)
+    count, _, stats, _ = cv2.connectedComponentsWithStats((gray > 200).astype(np.uint8))
+    return [(img[y:y + h, x:x + w], [int(x), int(y), int(w), int(h)])
+            for x, y, w, h, _ in stats[1:count] if w >= 4 and h >= 4]
+
+
+class PixelModel:
+    def predict(self, batch, batch_size=None, verbose=0):
+        return np.array([cv2.resize(face, (16, 8)).mean(axis=2).reshape(-1) - 0.3 for face in np.asarray(batch)],
+                        dtype=np.float32)
+
+
+class TestRegistry:
+    detector_backend = "test"
+    model_key = "pixels"
+    detector_lock = threading.Lock()
+
+    def acquire(self):
+        return PixelModel(), None
+
+    def stats(self):
+        return {"model": self.model_key}
+
+
+def draw_face(i):
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    x = 20 + 2 * i
+    frame[40:80, x:x + 40] = 255
+    frame[52:56, x + 4:x + 36] = 120
+    return frame
+
+
+@pytest.fixture
+def worker(database, tmp_path, monkeypatch):
+    pytest.importorskip("deepface")
+    import logic.face_recognition_logic as face_recognition_logic
+    import worker
+    from logic.result_cache import ResultCache
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(face_recognition_logic.FaceDetector, "detect_faces", detect_bright_faces)
+    monkeypatch.setattr(face_recognition_logic, "get_registry", lambda *args, **kwargs: TestRegistry())
+    monkeypatch.setattr(worker, "get_result_cache", lambda: ResultCache(max_bytes=0))
+    os.makedirs("temp")
+    write_video("video.avi", draw=draw_face)
+    cv2.imwrite("reference.png", draw_face(10)[30:90, 30:110])
+    return worker
+
+
+def run_task(worker, database, monkeypatch, key, segments):
+    """Выполняет задачу и все ее задания; возвращает (статус, строки отчета, совпадения, задания)"""
+    monkeypatch.setattr(worker, "plan_segments", lambda path: plan_segments(path, segments, min_seconds=1))
+    shutil.copy("video.avi", f"temp/{key}.avi")
+    shutil.copy("reference.png", f"temp/{key}.png")
+    database.add_task(key)
+    worker.process_video_task(key, [{"path": f"temp/{key}.png", "name": "A"}], f"temp/{key}.avi", {"stride": 5})
+
+    payloads = []
+    while True:
+        job = database.claim_job("test", 60)
+        if not job:
+            break
+        payloads.append(job["payload"])
+        worker.run_job(job, "test")
+
+    with open(f"results/{key}.txt", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    with open(f"results/{key}.jsonl", encoding="utf-8") as f:
+        detections = [json.loads(line) for line in f]
+    return database.get_task(key)[1], lines, detections, payloads
+
+
+def report_body(lines):
+    """Строки отчета без заголовка с датой и без времени записи строк"""
+    return [re.sub(r"^\S+ \S+ - ", "", line) for line in lines[3:]]
+
+
+def test_segmented_result_matches_single_pass(worker, database, monkeypatch):
+    status, single, single_detections, _ = run_task(worker, database, monkeypatch, "single", 1)
+    assert status == "done"
+    assert any("обнаружено лицо 'A'" in line for line in single)
+
+    status, segmented, segmented_detections, payloads = run_task(worker, database, monkeypatch, "segmented", 3)
+    assert status == "done"
+    assert [payload["segment"] for payload in payloads] == [0, 1, 2]
+    assert report_body(segmented) == report_body(single)
+    without_tracks = lambda detections: [dict(d, track=None) for d in detections]
+    assert without_tracks(segmented_detections) == without_tracks(single_detections)
+    assert not [name for name in os.listdir("results") if ".part" in name]
+    assert not os.path.exists("temp/segmented.avi")
+
+
+def test_segment_job_replayed_after_merge_is_ignored(worker, database, monkeypatch):
+    status, lines, _, payloads = run_task(worker, database, monkeypatch, "replayed", 3)
+    assert status == "done"
+
+    # Аренда задания истекла после сборки результата, и отрезок взял другой воркер
+    worker.process_segment_job(payloads[1])
+    assert database.get_task("replayed")[1] == "done"
+    with open("results/replayed.txt", encoding="utf-8") as f:
+        assert f.read().splitlines() == lines
+
+
+def test_segments_created_together_with_their_jobs(database):
+    payloads = [{"kind": "segment", "task_id": "task", "segment": i} for i in range(2)]
+    assert database.create_task_segments("task", [(0, 50), (50, None)], payloads)
+    assert database.count_jobs() == {"queued": 2}
+    # Повтор задания разбиения не создает ни отрезков, ни заданий
+    assert not database.create_task_segments("task", [(0, 50), (50, None)], payloads)
+    assert database.count_jobs() == {"queued": 2}
@@ -0,0 +1,278 @@
+import hashlib
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:
+    from multipart.multipart import MultipartParser, parse_options_header
+
+CHUNK_SIZE = 1024 * 1024           # Файлы пишутся на диск блоками по 1 МБ
+MAX_VIDEO_BYTES = int(os.environ.get("UPLOAD_MAX_VIDEO_MB", 4096)) * 1024 * 1024
+MAX_IMAGE_BYTES = int(os.environ.get("UPLOAD_MAX_IMAGE_MB", 20)) * 1024 * 1024
+MAX_FIELD_BYTES = 64 * 1024        # Обычные поля формы (имена, параметры выборки)
+# Незавершенная или неиспользованная загрузка удаляется, если в нее ничего не писали дольше этого
+UPLOAD_TTL_HOURS = float(os.environ.get("UPLOAD_TTL_HOURS", 24))
+
+
+class UploadError(Exception):
+    """Ошибка приема загрузки; status_code уходит в ответ клиенту"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadTooLarge(UploadError):
+    def __init__(self, message):
+        super().__init__(message, status_code=413)
+
+
+class StoredFile:
+    """Файл, записанный на диск при приеме запроса"""
+
+    def __init__(self, path, filename, size, sha256):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+
+
+def safe_filename(filename):
+    """Имя файла без компонентов пути"""
+    return os.path.basename((filename or "").replace("\\", "/")) or "upload"
+
+
+class FileSink:
+    """
+    Запись потока байтов в файл: буферизация до CHUNK_SIZE, SHA-256 по ходу записи
+    и ограничение размера. Запись и хеширование выполняются в пуле потоков.
+    """
+
+    def __init__(self, path, max_bytes, offset=0, digest=None, name=None):
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self.max_bytes = max_bytes
+        self.size = offset
+        self.digest = digest or hashlib.sha256()
+        self._buffer = bytearray()
+        if offset:
+            self._file = open(path, "r+b")
+            self._file.seek(offset)
+            self._file.truncate()
+        else:
+            self._file = open(path, "wb")
+
+    async def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Файл {self.name} превышает допустимый размер "
+                                 f"{self.max_bytes // (1024 * 1024)} МБ")
+        self._buffer.extend(data)
+        if len(self._buffer) >= CHUNK_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        if self._buffer:
+            chunk = bytes(self._buffer)
+            self._buffer.clear()
+            await run_in_threadpool(self._write_chunk, chunk)
+
+    def _write_chunk(self, chunk):
+        self._file.write(chunk)
+        self.digest.update(chunk)
+
+    async def close(self):
+        await self.flush()
+        self._file.close()
+
+    def abort(self, remove=True):
+        self._file.close()
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class StreamingFormParser:
+    """
+    Разбор multipart/form-data прямо из потока запроса.
+
+    В отличие от разбора Starlette, файлы не складываются во временные SpooledTemporaryFile,
+    а сразу пишутся по итоговому пути, который выбирает path_for. Поэтому видео попадает
+    на диск один раз, а хеш и размер известны к концу запроса.
+    """
+
+    def __init__(self, request, path_for):
+        """
+        Args:
+            request (Request): Входящий запрос
+            path_for (callable): (имя поля, имя файла, номер файла в поле) -> (путь, лимит байт)
+        """
+        self.request = request
+        self.path_for = path_for
+        self.fields = {}   # {имя поля: [значения]}
+        self.files = {}    # {имя поля: [StoredFile]}
+        self._events = []
+        self._sinks = []
+        self._headers = []
+        self._header_name = b""
+        self._header_value = b""
+
+    # Обработчики python-multipart синхронные: события копятся и разбираются после каждого блока
+    def _on_part_begin(self):
+        self._headers = []
+
+    def _on_header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers.append((self._header_name.lower(), self._header_value))
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        self._events.append(("begin", dict(self._headers).get(b"content-disposition", b"")))
+
+    def _on_part_data(self, data, start, end):
+        self._events.append(("data", data[start:end]))
+
+    def _on_part_end(self):
+        self._events.append(("end", None))
+
+    async def _handle(self, event, payload, state):
+        if event == "begin":
+            _, options = parse_options_header(payload)
+            name = options.get(b"name", b"").decode("utf-8", "replace")
+            if b"filename" not in options:
+                state.update(name=name, sink=None, data=bytearray(), filename=None)
+                return
+
+            filename = safe_filename(options[b"filename"].decode("utf-8", "replace"))
+            index = len(self.files.get(name, []))
+            target = self.path_for(name, filename, index)
+            if target is None:
+                raise UploadError(f"Неожиданный файл в поле {name}")
+            path, max_bytes = target
+            sink = FileSink(path, max_bytes, name=filename)
+            self._sinks.append(sink)
+            state.update(name=name, sink=sink, data=None, filename=filename)
+        elif event == "data":
+            if state["sink"] is not None:
+                await state["sink"].write(payload)
+            else:
+                state["data"].extend(payload)
+                if len(state["data"]) > MAX_FIELD_BYTES:
+                    raise UploadTooLarge(f"Поле {state['name']} слишком большое")
+        elif event == "end":
+            sink = state["sink"]
+            if sink is None:
+                self.fields.setdefault(state["name"], []).append(state["data"].decode("utf-8", "replace"))
+            else:
+                await sink.close()
+                self.files.setdefault(state["name"], []).append(
+                    StoredFile(sink.path, state["filename"], sink.size, sink.digest.hexdigest())
+                )
+
+    async def parse(self):
+        _, params = parse_options_header(self.request.headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise UploadError("Ожидается multipart/form-data")
+
+        parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+        state = {}
+        try:
+            async for chunk in self.request.stream():
+                parser.write(chunk)
+                events, self._events = self._events, []
+                for event, payload in events:
+                    await self._handle(event, payload, state)
+            parser.finalize()
+        except Exception as e:
+            # Запрос не принят целиком: частично записанные файлы удаляются
+            for sink in self._sinks:
+                sink.abort()
+            if isinstance(e, UploadError):
+                raise
+            raise UploadError(f"Некорректные данные формы: {e}") from e
+        return self.fields, self.files
+
+
+# Состояние SHA-256 незавершенных возобновляемых загрузок: {upload_id: (принято байт, хеш)}.
+# Если процесс перезапустился или кусок пришел в другой процесс, хеш пересчитывается по файлу.
+_upload_digests = {}
+
+
+def _hash_prefix(path, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining = size
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+
+async def receive_chunk(request, upload):
+    """
+    Дописывает тело запроса в файл возобновляемой загрузки с позиции upload["received"].
+
+    Кусок применяется целиком или не применяется: при обрыве файл обрезается до прежней
+    длины, и клиент повторяет кусок с того же смещения.
+
+    Args:
+        request (Request): Запрос с телом куска
+        upload (dict): Запись загрузки (id, path, size, received)
+
+    Returns:
+        tuple: (принято байт всего, SHA-256 файла или None, если загрузка не завершена)
+    """
+    offset = upload["received"]
+    cached = _upload_digests.get(upload["id"])
+    if cached and cached[0] == offset:
+        digest = cached[1].copy()
+    elif offset:
+        digest = await run_in_threadpool(_hash_prefix, upload["path"], offset)
+    else:
+        digest = None
+
+    sink = FileSink(upload["path"], upload["size"], offset=offset, digest=digest, name=upload["filename"])
+    try:
+        async for chunk in request.stream():
+            await sink.write(chunk)
+        await sink.close()
+    except Exception:
+        sink.abort(remove=False)
+        with open(upload["path"], "r+b") as f:
+            f.truncate(offset)
+        raise
+
+    if sink.size == upload["size"]:
+        _upload_digests.pop(upload["id"], None)
+        return sink.size, sink.digest.hexdigest()
+
+    _upload_digests[upload["id"]] = (sink.size, sink.digest)
+    return sink.size, None
+
+
+def forget_upload(upload_id):
+    _upload_digests.pop(upload_id, None)
+
+
+def pending_uploads():
+    """ID загрузок, для которых в процессе хранится состояние хеша"""
+    return list(_upload_digests)
@@ -0,0 +1,362 @@
+import argparse
+import logging
+import os
+import threading
+import time
+
+from database.database import (
+    claim_job, heartbeat_job, finish_job, save_worker_metrics, update_task_by_user_key,
+    save_task_progress, get_video_index, put_video_index, delete_video_index, create_task_segments,
+    save_segment_progress, finish_task_segment, get_task_segments, delete_task_segments, fail_pending_gallery_items
+)
+from logic.embedding_cache import get_embedding_cache
+from logic.face_recognition_logic import FaceRecognitionLogic
+from logic.frame_index import FRAME_INDEX_DIR, FrameIndex, FrameIndexWriter, make_index_key
+from logic.frame_sampling import FrameSampler
+from logic.galleries import embed_gallery_items, load_gallery
+from logic.model_registry import get_registry
+from logic.result_cache import file_sha256, get_result_cache
+from logic.result_writer import StreamingResultLog
+from logic.video_segments import SEGMENT_TRACK_IDS, merge_segments, plan_segments, segment_paths
+from worker_pool import WORKERS, WorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Время аренды задания
+LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "60"))
+POLL_INTERVAL = 1.0        # Пауза между попытками взять задание из пустой очереди
+# Дополнительно писать совпадения в results/{task_id}.jsonl
+WRITE_DETECTIONS_JSONL = os.environ.get("RESULT_DETECTIONS_JSONL", "1") == "1"
+# Сохранять эмбеддинги всех найденных лиц видео, чтобы задачи с другими эталонами отвечались без повторной обработки
+FRAME_INDEX_ENABLED = os.environ.get("FRAME_INDEX", "0") == "1"
+
+
+def load_references(recognizer, image_paths, gallery_id=None):
+    """Добавляет эталоны задачи: загруженные изображения (эмбеддинги одним пакетом) и сохраненную галерею"""
+    targets = []
+    for i, image_info in enumerate(image_paths):
+        name = image_info["name"] if image_info["name"] else f"Лицо {i+1}"
+        targets.append({"path": image_info["path"], "id": f"image_{i}", "name": name})
+
+    errors = recognizer.add_target_images(targets)
+    for target in targets:
+        if target["id"] in errors:
+            logger.error(f"Ошибка при добавлении изображения {target['path']}: {errors[target['id']]}")
+        else:
+            logger.info(f"Добавлено изображение {target['id']} с именем '{target['name']}'")
+
+    # Эталоны сохраненной галереи загружаются готовой матрицей эмбеддингов
+    if gallery_id:
+        loaded = load_gallery(recognizer, gallery_id)
+        logger.info(f"Из галереи {gallery_id} загружено эталонов: {loaded}")
+
+
+def cleanup_task_files(image_paths, video_path):
+    """Удаляет временные файлы задачи"""
+    try:
+        for image_info in image_paths:
+            image_path = image_info["path"]
+            if os.path.exists(image_path):
+                os.remove(image_path)
+                logger.info(f"Удален временный файл изображения: {image_path}")
+
+        if os.path.exists(video_path):
+            os.remove(video_path)
+            logger.info(f"Удален временный файл видео: {video_path}")
+    except Exception as e:
+        logger.error(f"Ошибка при удалении временных файлов: {e}")
+
+
+def process_video_task(task_id, image_paths, video_path, sampling=None, video_sha256=None, gallery_id=None,
+                       detection=None):
+    keep_files = False  # Файлы задачи нужны отрезкам видео, их удалит сборка результата
+    try:
+        logger.info(f"Начало обработки задачи {task_id}")
+        os.makedirs("results", exist_ok=True)
+
+        # Инициализируем распознаватель задачи, модели берутся из общего реестра
+        # detection - параметры детекции задачи (предфильтр перед RetinaFace)
+        recognizer = FaceRecognitionLogic(**(detection or {}))
+        logger.info(f"Реестр моделей для задачи {task_id}: {recognizer.registry.stats()}")
+
+        # Добавляем все эталоны, эмбеддинги изображений считаются одним пакетом
+        load_references(recognizer, image_paths, gallery_id)
+
+        # Если нет добавленных изображений, завершаем с ошибкой
+        if not recognizer.target_embeddings:
+            logger.error(f"Не удалось добавить ни одного изображения для задачи {task_id}")
+            update_task_by_user_key(user_key=task_id, status="error")
+            return
+
+        sampler = FrameSampler(**(sampling or {}))
+        result_path = os.path.join("results", f"{task_id}.txt")
+        detections_path = os.path.join("results", f"{task_id}.jsonl") if WRITE_DETECTIONS_JSONL else None
+
+        if (get_result_cache().enabled or FRAME_INDEX_ENABLED) and not video_sha256:
+            video_sha256 = file_sha256(video_path)
+
+        # То же видео с теми же эталонами и настройками уже распознавалось: берем готовый результат
+        result_cache = get_result_cache()
+        cache_key = None
+        if result_cache.enabled:
+            references = [(recognizer.target_embeddings[i], recognizer.target_names[i])
+                          for i in recognizer.target_embeddings]
+            settings = dict(recognizer.result_settings(), sampling=sampler.settings())
+            cache_key = result_cache.make_key(video_sha256, references, settings)
+            if result_cache.lookup(cache_key, result_path, detections_path):
+                logger.info(f"Результат задачи {task_id} взят из кэша результатов")
+                update_task_by_user_key(user_key=task_id, status="done", result_path=result_path)
+                return
+
+        # Видео уже обрабатывалось с другими эталонами: отвечаем поиском по сохраненным эмбеддингам
+        index_key = None
+        frame_index = None
+        if FRAME_INDEX_ENABLED:
+            index_settings = dict(recognizer.result_settings(), sampling=sampler.settings())
+            index_settings.pop("threshold")
+            index_key = make_index_key(video_sha256, index_settings)
+            entry = get_video_index(index_key)
+            frame_index = FrameIndex.open(entry) if entry else None
+            if entry and frame_index is None:
+                delete_video_index(index_key)
+
+        # Длинное видео делится на отрезки, которые параллельно обрабатывают разные воркеры
+        if frame_index is None:
+            segments = plan_segments(video_path)
+            if segments:
+                keep_files = True
+                start_segments(task_id, segments, {
+                    "image_paths": image_paths,
+                    "video_path": video_path,
+                    "sampling": sampling,
+                    "gallery_id": gallery_id,
+                    "detection": detection,
+                    "cache_key": cache_key,
+                })
+                return
+
+        # Результат пишется в файл по мере обработки, частичный результат доступен для скачивания
+        with StreamingResultLog(result_path, detections_path) as result_log:
+            update_task_by_user_key(user_key=task_id, status="in_progress", result_path=result_path)
+            if frame_index is not None:
+                logger.info(f"Распознавание задачи {task_id} по индексу лиц видео задачи {entry['task_id']}")
+                recognizer.recognize_from_index(frame_index, result_log)
+            else:
+                logger.info(f"Распознавание видео для задачи {task_id}")
+                index_writer = FrameIndexWriter(os.path.join(FRAME_INDEX_DIR, index_key)) if index_key else None
+                try:
+                    recognizer.recognize_in_video(
+                        video_path, sampler, result_log,
+                        on_progress=lambda progress: save_task_progress(task_id, progress),
+                        frame_index=index_writer
+                    )
+                except Exception:
+                    if index_writer:
+                        index_writer.abort()
+                    raise
+                if index_writer:
+                    index = index_writer.finish(sampler.frames_seen)
+                    if index:
+                        put_video_index(index_key, video_sha256, task_id, index)
+
+        if cache_key:
+            result_cache.store(cache_key, result_path, detections_path)
+
+        logger.info(f"Обработка видео завершена для задачи {task_id}, обновляем статус на 'done'")
+        update_task_by_user_key(user_key=task_id, status="done", result_path=result_path)
+        logger.info(f"Статус задачи {task_id} обновлен на 'done'")
+    except Exception as e:
+        keep_files = False
+        logger.error(f"Ошибка обработки {task_id}: {e}")
+        update_task_by_user_key(user_key=task_id, status="error")
+        logger.error(f"Статус задачи {task_id} обновлен на 'error'")
+    finally:
+        if not keep_files:
+            # Очищаем временные файлы
+            cleanup_task_files(image_paths, video_path)
+
+
+def start_segments(task_id, segments, task_payload):
+    """
+    Ставит в очередь задания отрезков видео; каждый отрезок обрабатывает свой воркер с прогретыми моделями
+
+    Args:
+        task_id (str): Ключ задачи
+        segments (list): [(первый кадр, кадр после последнего)]
+        task_payload (dict): Общие параметры отрезков: эталоны, видео, выборка, детекция, ключ кэша результатов
+    """
+    payloads = [dict(task_payload, kind="segment", task_id=task_id, segment=segment,
+                     start_frame=start_frame, end_frame=end_frame)
+                for segment, (start_frame, end_frame) in enumerate(segments)]
+    # Отрезки и их задания создаются одной транзакцией
+    if not create_task_segments(task_id, segments, payloads):
+        logger.info(f"Отрезки задачи {task_id} уже поставлены в очередь")
+        return
+
+    update_task_by_user_key(user_key=task_id, status="in_progress")
+    logger.info(f"Видео задачи {task_id} разбито на {len(segments)} отрезков: {segments}")
+
+
+def process_segment_job(payload):
+    """
+    Обработка одного отрезка видео задачи
+
+    Совпадения отрезка пишутся в отдельные файлы без заголовка и итога. Воркер,
+    завершивший последний отрезок, склеивает результат задачи и удаляет временные файлы.
+    """
+    task_id = payload["task_id"]
+    segment = payload["segment"]
+    result_path = os.path.join("results", f"{task_id}.txt")
+    detections_path = os.path.join("results", f"{task_id}.jsonl") if WRITE_DETECTIONS_JSONL else None
+    part_path, part_detections = segment_paths(result_path, detections_path, segment)
+
+    # Задание могло быть взято повторно после истечения аренды, когда отрезок уже завершен
+    # или результат задачи уже собран
+    if not any(item["segment"] == segment and item["status"] not in ("done", "error")
+               for item in get_task_segments(task_id)):
+        logger.info(f"Отрезок {segment} задачи {task_id} уже обработан, повторное задание пропущено")
+        return
+
+    recognizer = None
+    status = "error"
+    frames_seen = None
+    frames_gated = 0
+    try:
+        recognizer = FaceRecognitionLogic(**(payload.get("detection") or {}))
+        load_references(recognizer, payload["image_paths"], payload.get("gallery_id"))
+        if recognizer.target_embeddings:
+            sampler = FrameSampler(**(payload.get("sampling") or {}), start_frame=payload["start_frame"],
+                                   end_frame=payload["end_frame"])
+            logger.info(f"Распознавание отрезка {segment} задачи {task_id}: кадры "
+                        f"{payload['start_frame']}..{payload['end_frame'] or 'конец'}")
+            with StreamingResultLog(part_path, part_detections) as result_log:
+                recognizer.recognize_in_video(
+                    payload["video_path"], sampler, result_log,
+                    on_progress=lambda progress: save_segment_progress(task_id, segment, progress),
+                    summary=False, first_track_id=segment * SEGMENT_TRACK_IDS + 1
+                )
+            status = "done"
+            frames_seen = sampler.frames_seen
+            frames_gated = recognizer.frames_gated
+        else:
+            logger.error(f"Не удалось добавить эталоны для отрезка {segment} задачи {task_id}")
+    except Exception as e:
+        logger.error(f"Ошибка обработки отрезка {segment} задачи {task_id}: {e}")
+
+    remaining = finish_task_segment(task_id, segment, status, frames_seen, frames_gated)
+    if remaining is None:
+        logger.info(f"Отрезок {segment} задачи {task_id} уже был завершен другим воркером")
+    elif remaining == 0:
+        merge_task_segments(recognizer, payload, result_path, detections_path)
+
+
+def merge_task_segments(recognizer, payload, result_path, detections_path):
+    """Собирает отчет задачи из результатов отрезков в порядке времени"""
+    task_id = payload["task_id"]
+    segments = get_task_segments(task_id)
+    if not segments:
+        logger.info(f"Результат задачи {task_id} уже собран")
+        return
+    parts = [segment_paths(result_path, detections_path, segment["segment"]) for segment in segments]
+    try:
+        if any(segment["status"] != "done" for segment in segments):
+            logger.error(f"Отрезки задачи {task_id} завершились с ошибкой")
+            update_task_by_user_key(user_key=task_id, status="error")
+            return
+
+        recognizer.frame_counter = max(segment["frames_seen"] or 0 for segment in segments)
+        recognizer.frames_gated = sum(segment["frames_gated"] for segment in segments)
+        with StreamingResultLog(result_path, detections_path) as result_log:
+            recognizer.write_report_header(result_log)
+            merge_segments(result_log, parts)
+            recognizer.write_report_footer(result_log)
+
+        if payload.get("cache_key"):
+            get_result_cache().store(payload["cache_key"], result_path, detections_path)
+
+        update_task_by_user_key(user_key=task_id, status="done", result_path=result_path)
+        logger.info(f"Результат задачи {task_id} собран из {len(segments)} отрезков, статус 'done'")
+    except Exception as e:
+        logger.error(f"Ошибка сборки результата задачи {task_id}: {e}")
+        update_task_by_user_key(user_key=task_id, status="error")
+    finally:
+        for part in parts:
+            for path in part:
+                if path and os.path.exists(path):
+                    os.remove(path)
+        delete_task_segments(task_id)
+        cleanup_task_files(payload["image_paths"], payload["video_path"])
+
+
+def process_gallery_job(gallery_id, items):
+    """Расчет эмбеддингов эталонов, добавленных в галерею"""
+    logger.info(f"Расчет эмбеддингов галереи {gallery_id}: {len(items)} эталонов")
+    try:
+        embed_gallery_items(FaceRecognitionLogic(), gallery_id, items)
+    except Exception as e:
+        # Задание не повторяется: эталоны без результата иначе навсегда остались бы в pending
+        fail_pending_gallery_items([item["id"] for item in items], str(e))
+        raise
+
+
+def run_job(job, worker_id):
+    """Выполняет задание, продлевая его аренду из отдельного потока"""
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(LEASE_SECONDS / 3):
+            heartbeat_job(job["id"], worker_id, LEASE_SECONDS)
+
+    heartbeat_thread = threading.Thread(target=heartbeat, name="heartbeat", daemon=True)
+    heartbeat_thread.start()
+    try:
+        payload = job["payload"]
+        logger.info(f"Воркер {worker_id} взял задание {job['id']} (попытка {job['attempt']})")
+        if payload.get("kind") == "gallery":
+            process_gallery_job(payload["gallery_id"], payload["items"])
+        elif payload.get("kind") == "segment":
+            process_segment_job(payload)
+        else:
+            process_video_task(payload["task_id"], payload["image_paths"], payload["video_path"],
+                               payload.get("sampling"), payload.get("video_sha256"), payload.get("gallery_id"),
+                               payload.get("detection"))
+        finish_job(job["id"], worker_id)
+    except Exception as e:
+        logger.error(f"Ошибка выполнения задания {job['id']}: {e}")
+        finish_job(job["id"], worker_id, str(e))
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+
+
+def run_worker(worker_id):
+    """Цикл процесса-воркера: прогрев моделей, затем выполнение заданий из очереди"""
+    logger.info(f"Запуск воркера {worker_id}, pid {os.getpid()}")
+    get_registry().warm_up()
+
+    while True:
+        job = claim_job(worker_id, LEASE_SECONDS)
+        if not job:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        run_job(job, worker_id)
+        save_worker_metrics(worker_id, {
+            "pid": os.getpid(),
+            "models": get_registry().stats(),
+            "embedding_cache": get_embedding_cache().stats(),
+            "result_cache": get_result_cache().stats()
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пул воркеров распознавания лиц")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Количество процессов-воркеров")
+    args = parser.parse_args()
+
+    pool = WorkerPool(args.workers)
+    pool.start()
+    try:
+        pool.join()
+    except KeyboardInterrupt:
+        pool.stop()
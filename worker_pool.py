@@ -0,0 +1,75 @@
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+
+from database.database import fail_exhausted_jobs
+
+logger = logging.getLogger(__name__)
+
+# Количество процессов-воркеров
+WORKERS = int(os.environ.get("RECOGNITION_WORKERS", "1"))
+SUPERVISE_INTERVAL = 5.0   # Период проверки живости воркеров и зависших заданий
+
+
+def _run_worker(worker_id):
+    """
+    Точка входа процесса-воркера. Модули распознавания (DeepFace, TensorFlow, OpenCV)
+    импортируются уже в дочернем процессе, веб-процесс с пулом их не загружает.
+    """
+    from worker import run_worker
+
+    run_worker(worker_id)
+
+
+class WorkerPool:
+    """
+    Пул процессов-воркеров с ограниченной параллельностью.
+
+    Каждый воркер держит свои прогретые модели и берет задания из очереди в SQLite.
+    Супервизор перезапускает упавшие процессы; их задания возвращаются в очередь
+    по истечении аренды.
+    """
+
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self.processes = {}
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = threading.Event()
+        self._supervisor = None
+
+    def _spawn(self, worker_id):
+        process = self._context.Process(target=_run_worker, args=(worker_id,), name=worker_id, daemon=True)
+        process.start()
+        self.processes[worker_id] = process
+
+    def start(self):
+        fail_exhausted_jobs()
+        prefix = uuid.uuid4().hex[:6]
+        for i in range(self.workers):
+            self._spawn(f"worker-{prefix}-{i}")
+
+        self._supervisor = threading.Thread(target=self._supervise, name="worker-supervisor", daemon=True)
+        self._supervisor.start()
+        logger.info(f"Запущен пул из {self.workers} воркеров распознавания")
+
+    def _supervise(self):
+        while not self._stop.wait(SUPERVISE_INTERVAL):
+            for worker_id, process in list(self.processes.items()):
+                if not process.is_alive():
+                    logger.error(f"Воркер {worker_id} завершился с кодом {process.exitcode}, перезапуск")
+                    self._spawn(worker_id)
+            fail_exhausted_jobs()
+
+    def join(self):
+        while not self._stop.is_set():
+            self._stop.wait(SUPERVISE_INTERVAL)
+
+    def stop(self):
+        self._stop.set()
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            process.join()
+        logger.info("Пул воркеров распознавания остановлен")